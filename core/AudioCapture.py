@@ -8,6 +8,7 @@ class AudioCapture:
     def __init__(self, config, projectm_wrapper):
         self.config = config
         self.projectm_wrapper = projectm_wrapper
+        self.direct_capture = False
 
         self.audio_capture_impl = AudioCaptureImpl(self.config , projectm_wrapper)
         deviceList = self.audio_capture_impl.audio_device_list()
@@ -15,6 +16,15 @@ class AudioCapture:
 
         self.output_device_list(deviceList)
 
+        # Direct mode captures the selected sources in-process instead of through the null sink's loopbacks
+        if self.config.audio_ctrl.get('capture_mode', 'loopback') == 'direct':
+            captureDevices = self.config.audio_ctrl.get('capture_devices', list())
+            if captureDevices and self.audio_capture_impl.start_mixed_recording(captureDevices):
+                self.direct_capture = True
+                return
+
+            log.warning('Direct capture is enabled but no capture devices could be opened; using the default capturing device')
+
         self.audio_capture_impl.start_recording(audioDeviceIndex)
 
     def __del__(self):
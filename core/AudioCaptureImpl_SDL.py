@@ -5,8 +5,22 @@ import logging
 import numpy as np
 import threading
 
+from core.AudioMixer import AudioMixer
+
 log = logging.getLogger()
 
+class MixedCaptureDevice:
+    """An SDL capture device feeding the audio mixer.
+    @param name: the SDL capture device name
+    @param mixer: the audio mixer receiving the samples
+    """
+    def __init__(self, name, mixer):
+        self.name       = name
+        self.mixer      = mixer
+        self.channels   = 2
+        self.device_id  = 0
+        self.user_data  = ctypes.py_object(self)
+
 class AudioCaptureImpl:
     def __init__(self, config, projectm_wrapper):
         self.projectm_wrapper = projectm_wrapper
@@ -20,6 +34,9 @@ class AudioCaptureImpl:
 
         self.audio_callback_event       = threading.Event()
 
+        self.mixer                      = None
+        self.mixed_devices              = list()
+
         targetFps = config.projectm.get('projectm.fps', 60)
         if targetFps > 0:
             self.requestedSampleCount = min(self.requestedSampleFrequency // targetFps, self.requestedSampleCount)
@@ -79,7 +96,85 @@ class AudioCaptureImpl:
 
         self.start_recording(self.currentAudioDeviceIndex)
 
+    """Open several capture devices directly and mix them into a single PCM feed.
+    Each configured name selects every capture device whose name contains it.
+    @param device_names: the (partial) names of the capture devices to mix
+    @returns True if at least one device was opened
+    """
+    def start_mixed_recording(self, device_names):
+        self.mixer = AudioMixer(self.projectm_wrapper, self.channels, self.requestedSampleFrequency)
+
+        for index, name in self.audio_device_list().items():
+            if index < 0 or not any(device_name.lower() in name.decode('utf-8', 'replace').lower() for device_name in device_names):
+                continue
+
+            device = MixedCaptureDevice(name, self.mixer)
+            try:
+                self.open_mixed_device(device)
+            except Exception as e:
+                log.error(f'Failed to open capture device {name!r} for mixing: {e}')
+                continue
+
+            self.mixer.add_source(device.device_id)
+            self.mixed_devices.append(device)
+            sdl2.SDL_PauseAudioDevice(device.device_id, False)
+
+        if not self.mixed_devices:
+            log.warning(f'No capture devices matched {device_names}')
+            self.mixer = None
+            return False
+
+        log.info(f'Mixing {len(self.mixed_devices)} capture devices: {[device.name for device in self.mixed_devices]}')
+        return True
+
+    """Open a capture device for the mixer.
+    @param device: the mixed capture device
+    """
+    def open_mixed_device(self, device):
+        user_data_ptr = ctypes.cast(ctypes.pointer(device.user_data), ctypes.c_void_p)
+
+        requestedSpecs = sdl2.SDL_AudioSpec(
+            self.requestedSampleFrequency, 
+            sdl2.AUDIO_F32SYS, 
+            self.channels, 
+            int(self.requestedSampleCount),
+            mixed_audio_callback,
+            user_data_ptr
+            )
+
+        actualSpecs = sdl2.SDL_AudioSpec(
+            freq=0,
+            aformat=0,
+            channels=0,
+            samples=0
+            )
+
+        # Channel changes are allowed but not frequency changes so every source shares the mixer's rate
+        device.device_id = sdl2.SDL_OpenAudioDevice(
+            device.name, True,
+            requestedSpecs,
+            actualSpecs,
+            sdl2.SDL_AUDIO_ALLOW_CHANNELS_CHANGE
+            )
+
+        if device.device_id == 0:
+            raise Exception(sdl2.SDL_GetError())
+
+        device.channels = actualSpecs.channels
+        log.debug(f'Opened capture device name={device.name!r} deviceID={device.device_id} channels={device.channels} for mixing')
+
+    """Close the mixed capture devices"""
+    def stop_mixed_recording(self):
+        for device in self.mixed_devices:
+            sdl2.SDL_PauseAudioDevice(device.device_id, True)
+            sdl2.SDL_CloseAudioDevice(device.device_id)
+            self.mixer.remove_source(device.device_id)
+
+        self.mixed_devices = list()
+
     def stop_recording(self):
+        self.stop_mixed_recording()
+
         if self.currentAudioDeviceID:
             sdl2.SDL_PauseAudioDevice(self.currentAudioDeviceID, True)
             sdl2.SDL_CloseAudioDevice(self.currentAudioDeviceID)
@@ -167,4 +262,15 @@ def audio_callback(userdata, stream, length_bytes):
     float_ptr = ctypes.cast(stream, ctypes.POINTER(ctypes.c_float))
     samples = np.ctypeslib.as_array(float_ptr, shape=(total_samples,)).copy()
 
-    instance.projectm_wrapper.add_pcm(samples, frame_count, channels=instance.channels)
\ No newline at end of file
+    instance.projectm_wrapper.add_pcm(samples, frame_count, channels=instance.channels)
+
+@ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8), ctypes.c_int)
+def mixed_audio_callback(userdata, stream, length_bytes):
+    device = ctypes.cast(userdata, ctypes.POINTER(ctypes.py_object)).contents.value
+
+    total_samples = length_bytes // ctypes.sizeof(ctypes.c_float)
+
+    float_ptr = ctypes.cast(stream, ctypes.POINTER(ctypes.c_float))
+    samples = np.ctypeslib.as_array(float_ptr, shape=(total_samples,)).copy()
+
+    device.mixer.write(device.device_id, samples, device.channels)
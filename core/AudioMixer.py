@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger()
+
+class AudioSourceBuffer:
+    """Fixed capacity FIFO of interleaved float32 frames for a single capture source.
+    @param channels: the number of channels per frame
+    @param capacity: the maximum number of buffered frames (the oldest frames are dropped on overflow)
+    """
+    def __init__(self, channels, capacity):
+        self.channels       = channels
+        self.capacity       = capacity
+
+        self.available      = 0
+        self.overflows      = 0
+        self.last_write     = 0
+
+        self._buffer        = np.zeros((capacity, channels), dtype=np.float32)
+        self._read          = 0
+
+    """Append frames to the buffer.
+    @param frames: a (frame count, channels) array
+    """
+    def write(self, frames):
+        self.last_write = time.monotonic()
+
+        if len(frames) > self.capacity:
+            frames = frames[-self.capacity:]
+
+        overflow = self.available + len(frames) - self.capacity
+        if overflow > 0:
+            self._read = (self._read + overflow) % self.capacity
+            self.available -= overflow
+            self.overflows += 1
+
+        start = (self._read + self.available) % self.capacity
+        first = min(len(frames), self.capacity - start)
+        self._buffer[start:start + first] = frames[:first]
+        self._buffer[:len(frames) - first] = frames[first:]
+        self.available += len(frames)
+
+    """Discard the buffered frames"""
+    def clear(self):
+        self._read = 0
+        self.available = 0
+
+    """Remove frames from the buffer and add them to a mix.
+    @param mix: the (frame count, channels) array to accumulate into
+    """
+    def read_into(self, mix):
+        count = len(mix)
+        first = min(count, self.capacity - self._read)
+        mix[:first] += self._buffer[self._read:self._read + first]
+        mix[first:] += self._buffer[:count - first]
+
+        self._read = (self._read + count) % self.capacity
+        self.available -= count
+
+class AudioMixer:
+    """Mix several capture sources into a single PCM feed for projectM.
+    Each capture callback writes into its own buffer and whenever every live source has frames
+    available the common span is summed, clipped and handed to projectM.  A source that has not
+    delivered anything for stall_timeout seconds no longer holds back the others.
+    @param projectm_wrapper: the projectM wrapper receiving the mixed PCM
+    @param channels: the number of channels of the mixed feed
+    @param sample_rate: the sample rate shared by the sources
+    @param max_latency: the seconds of audio buffered per source before the oldest frames are dropped
+    @param stall_timeout: the seconds without data after which a source is skipped
+    """
+    def __init__(self, projectm_wrapper, channels=2, sample_rate=44100, max_latency=0.1, stall_timeout=0.1):
+        self.projectm_wrapper   = projectm_wrapper
+        self.channels           = channels
+        self.stall_timeout      = stall_timeout
+
+        self.mixed_frames       = 0
+
+        self._capacity          = max(int(sample_rate * max_latency), 1)
+        self._sources           = dict()
+        self._lock              = threading.Lock()
+
+    """Register a capture source.
+    @param source_id: a unique identifier for the source
+    """
+    def add_source(self, source_id):
+        with self._lock:
+            self._sources[source_id] = AudioSourceBuffer(self.channels, self._capacity)
+
+    """Unregister a capture source.
+    @param source_id: the source identifier
+    """
+    def remove_source(self, source_id):
+        with self._lock:
+            self._sources.pop(source_id, None)
+
+    """Convert interleaved samples to frames with the mixer's channel count.
+    @param samples: the interleaved samples
+    @param channels: the number of channels in the samples
+    """
+    def _to_frames(self, samples, channels):
+        frames = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+        if channels == self.channels:
+            return frames
+        elif channels == 1:
+            return np.repeat(frames, self.channels, axis=1)
+        elif channels > self.channels:
+            return frames[:, :self.channels]
+
+        return np.pad(frames, ((0, 0), (0, self.channels - channels)), mode='edge')
+
+    """Add captured samples from a source and feed projectM with any frames ready to mix.
+    @param source_id: the source identifier
+    @param samples: the interleaved float32 samples
+    @param channels: the number of channels in the samples
+    """
+    def write(self, source_id, samples, channels):
+        with self._lock:
+            source = self._sources.get(source_id)
+            if source is None:
+                return
+
+            source.write(self._to_frames(samples, channels))
+
+            now = time.monotonic()
+            live = list()
+            for buffer in self._sources.values():
+                if now - buffer.last_write < self.stall_timeout:
+                    live.append(buffer)
+                else:
+                    # Drop stale audio so a stalled source rejoins the mix in sync
+                    buffer.clear()
+
+            count = min(buffer.available for buffer in live)
+            if count == 0:
+                return
+
+            mix = np.zeros((count, self.channels), dtype=np.float32)
+            for buffer in live:
+                buffer.read_into(mix)
+
+            np.clip(mix, -1.0, 1.0, out=mix)
+            self.mixed_frames += count
+
+            # projectM is fed under the lock so the capture threads never call it concurrently
+            self.projectm_wrapper.add_pcm(mix.reshape(-1), count, channels=self.channels)
+
+    """Get the mixer statistics"""
+    def get_stats(self):
+        with self._lock:
+            return {
+                'sources': len(self._sources),
+                'mixed_frames': self.mixed_frames,
+                'overflows': {source_id: buffer.overflows for source_id, buffer in self._sources.items()}
+                }
@@ -0,0 +1,180 @@
+import ctypes
+import logging
+import threading
+
+import numpy as np
+import sdl2
+import vlc
+
+from core.AudioMixer import AudioSourceBuffer
+
+log = logging.getLogger()
+
+class MediaAudioTap:
+    """Play VLC's decoded audio through SDL and feed the same samples to projectM.
+    VLC's audio callbacks replace its audio output, so decoded PCM is queued here and played
+    through an SDL output device.  Every block handed to the device is passed to projectM from
+    the device callback, keeping the visuals sample-aligned with playback and skipping the
+    PulseAudio monitor, loopback and capture hops.
+    @param pcm_consumer: a callable accepting (samples, frame count, channels), ie: ProjectMWrapper.add_pcm
+    @param sample_rate: the sample rate VLC is asked to decode to
+    @param channels: the number of channels VLC is asked to decode to
+    @param buffer_seconds: the seconds of decoded audio queued ahead of playback
+    @param sample_count: the number of frames per SDL output callback
+    """
+    def __init__(self, pcm_consumer, sample_rate=44100, channels=2, buffer_seconds=2.5, sample_count=512):
+        self.pcm_consumer   = pcm_consumer
+        self.sample_rate    = sample_rate
+        self.channels       = channels
+        self.sample_count   = sample_count
+
+        self.underruns      = 0
+
+        self._buffer        = AudioSourceBuffer(channels, int(sample_rate * buffer_seconds))
+        self._condition     = threading.Condition()
+        self._device_id     = 0
+        self._paused        = True
+        self._closed        = False
+        self._user_data     = ctypes.py_object(self)
+
+    """Open the SDL output device and route a VLC media player's audio through the tap.
+    @param media_player: the VLC media player
+    """
+    def attach(self, media_player):
+        user_data_ptr = ctypes.cast(ctypes.pointer(self._user_data), ctypes.c_void_p)
+
+        sdl2.SDL_InitSubSystem(sdl2.SDL_INIT_AUDIO)
+        requestedSpecs = sdl2.SDL_AudioSpec(
+            self.sample_rate,
+            sdl2.AUDIO_F32SYS,
+            self.channels,
+            self.sample_count,
+            tap_output_callback,
+            user_data_ptr
+            )
+
+        actualSpecs = sdl2.SDL_AudioSpec(
+            freq=0,
+            aformat=0,
+            channels=0,
+            samples=0
+            )
+
+        # No changes are allowed so SDL converts to the device format and the buffer layout holds
+        self._device_id = sdl2.SDL_OpenAudioDevice(None, False, requestedSpecs, actualSpecs, 0)
+        if self._device_id == 0:
+            raise Exception(f'Failed to open audio output device: {sdl2.SDL_GetError()}')
+
+        media_player.audio_set_format('FL32', self.sample_rate, self.channels)
+        media_player.audio_set_callbacks(
+            tap_play_callback,
+            tap_pause_callback,
+            tap_resume_callback,
+            tap_flush_callback,
+            tap_drain_callback,
+            user_data_ptr
+            )
+
+        log.info(f'Tapping media playback audio at {self.sample_rate}Hz with {self.channels} channels (deviceID={self._device_id})')
+
+    """Pause or resume the SDL output device.
+    @param paused: whether playback is paused
+    """
+    def set_paused(self, paused):
+        if self._device_id and paused != self._paused:
+            sdl2.SDL_PauseAudioDevice(self._device_id, paused)
+            self._paused = paused
+
+    """Queue decoded audio, waiting for room when playback has fallen behind the decoder.
+    @param samples: the interleaved float32 samples
+    """
+    def queue(self, samples):
+        frames = samples.reshape(-1, self.channels)
+        with self._condition:
+            while not self._closed and self._buffer.available + len(frames) > self._buffer.capacity:
+                if self._paused or not self._condition.wait(timeout=1):
+                    # Nothing is draining the queue, so drop the oldest audio rather than stalling VLC
+                    break
+
+            self._buffer.write(frames)
+
+        self.set_paused(False)
+
+    """Discard the queued audio"""
+    def flush(self):
+        with self._condition:
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    """Wait until the queued audio has been played"""
+    def drain(self):
+        with self._condition:
+            while not self._closed and not self._paused and self._buffer.available:
+                if not self._condition.wait(timeout=1):
+                    break
+
+    """Fill an output block from the queue and hand it to projectM.
+    @param frame_count: the number of frames requested by the device
+    @returns the interleaved float32 samples
+    """
+    def render(self, frame_count):
+        block = np.zeros((frame_count, self.channels), dtype=np.float32)
+        with self._condition:
+            available = min(self._buffer.available, frame_count)
+            if available:
+                self._buffer.read_into(block[:available])
+                self._condition.notify_all()
+
+        if available < frame_count:
+            self.underruns += 1
+
+        samples = block.reshape(-1)
+        if available:
+            self.pcm_consumer(samples, frame_count, channels=self.channels)
+
+        return samples
+
+    """Close the SDL output device"""
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if self._device_id:
+            sdl2.SDL_CloseAudioDevice(self._device_id)
+            self._device_id = 0
+            sdl2.SDL_QuitSubSystem(sdl2.SDL_INIT_AUDIO)
+
+"""Get the tap instance from callback user data"""
+def get_tap(opaque):
+    return ctypes.cast(opaque, ctypes.POINTER(ctypes.py_object)).contents.value
+
+@vlc.CallbackDecorators.AudioPlayCb
+def tap_play_callback(opaque, samples, count, pts):
+    tap = get_tap(opaque)
+    float_ptr = ctypes.cast(samples, ctypes.POINTER(ctypes.c_float))
+    tap.queue(np.ctypeslib.as_array(float_ptr, shape=(count * tap.channels,)).copy())
+
+@vlc.CallbackDecorators.AudioPauseCb
+def tap_pause_callback(opaque, pts):
+    get_tap(opaque).set_paused(True)
+
+@vlc.CallbackDecorators.AudioResumeCb
+def tap_resume_callback(opaque, pts):
+    get_tap(opaque).set_paused(False)
+
+@vlc.CallbackDecorators.AudioFlushCb
+def tap_flush_callback(opaque, pts):
+    get_tap(opaque).flush()
+
+@vlc.CallbackDecorators.AudioDrainCb
+def tap_drain_callback(opaque):
+    get_tap(opaque).drain()
+
+@ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8), ctypes.c_int)
+def tap_output_callback(userdata, stream, length_bytes):
+    tap = get_tap(userdata)
+    frame_count = length_bytes // (ctypes.sizeof(ctypes.c_float) * tap.channels)
+
+    samples = tap.render(frame_count)
+    ctypes.memmove(stream, samples.ctypes.data, samples.nbytes)
@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import vlc
+
+log = logging.getLogger()
+
+# Number of newly indexed files between saves while a refresh is in progress
+SAVE_INTERVAL = 500
+
+MUTAGEN_INSTALLED = False
+try:
+    import mutagen
+    MUTAGEN_INSTALLED = True
+except ImportError:
+    pass
+
+# Index tag names and the matching mutagen (easy) and VLC tags
+MEDIA_TAGS = {
+    'Title': ('title', vlc.Meta.Title),
+    'Artist': ('artist', vlc.Meta.Artist),
+    'Album': ('album', vlc.Meta.Album),
+    'Genre': ('genre', vlc.Meta.Genre),
+    'Track Number': ('tracknumber', vlc.Meta.TrackNumber)
+    }
+
+"""Read the tags and duration of an audio file with mutagen.
+@param path: the audio file path
+@returns a tuple of the duration in seconds and a dict of tags
+"""
+def read_tags_mutagen(path):
+    audio = mutagen.File(path, easy=True)
+    if audio is None:
+        return None, dict()
+
+    tags = dict()
+    for name, (mutagen_tag, vlc_tag) in MEDIA_TAGS.items():
+        values = (audio.tags or dict()).get(mutagen_tag)
+        if values:
+            tags[name] = str(values[0])
+
+    duration = getattr(audio.info, 'length', None)
+    return duration, tags
+
+"""Read the tags and duration of an audio file by parsing it with VLC.
+@param vlc_instance: the VLC instance
+@param path: the audio file path
+@param timeout: the seconds to wait for VLC to parse the file
+@returns a tuple of the duration in seconds and a dict of tags
+"""
+def read_tags_vlc(vlc_instance, path, timeout=5):
+    media = vlc_instance.media_new_path(path)
+    try:
+        media.parse_with_options(vlc.MediaParseFlag.local, int(timeout * 1000))
+
+        deadline = time.monotonic() + timeout
+        while media.get_parsed_status() == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        tags = dict()
+        for name, (mutagen_tag, vlc_tag) in MEDIA_TAGS.items():
+            value = media.get_meta(vlc_tag)
+            if value:
+                tags[name] = value
+
+        duration = media.get_duration()
+        return (duration / 1000 if duration and duration > 0 else None), tags
+
+    finally:
+        media.release()
+
+class MediaLibraryIndex:
+    """Persistent index of audio file durations and tags.
+    Entries are keyed by path and refreshed in a background thread pool only when a file's size
+    or mtime changed, so now-playing metadata and playlist construction never parse media on
+    the playback path.  The index is saved once each batch of refreshes completes.
+    @param cache_path: the path to the JSON index
+    @param vlc_instance: the VLC instance used to parse files when mutagen is not installed
+    @param workers: the number of parallel tag readers
+    """
+    def __init__(self, cache_path, vlc_instance, workers=2):
+        self.cache_path     = cache_path
+        self.vlc_instance   = vlc_instance
+
+        self.entries        = dict()
+        self.indexed        = 0
+
+        self._executor      = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='MediaIndex')
+        self._lock          = threading.Lock()
+        self._save_lock     = threading.Lock()
+        self._pending       = set()
+        self._dirty         = False
+
+        # Warned here rather than on import, which happens before logging is initialized
+        if not MUTAGEN_INSTALLED:
+            log.warning('mutagen is not installed and therefore media tags will be read with VLC!')
+
+    """Load the index from disk"""
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, 'r') as infile:
+                self.entries = json.load(infile)
+        except Exception as e:
+            log.warning(f'Unable to load media index {self.cache_path}: {e}')
+            self.entries = dict()
+
+        log.info(f'Loaded media index with {len(self.entries)} files')
+
+    """Write the index to disk"""
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self.entries)
+                self._dirty = False
+
+            try:
+                tmp_path = self.cache_path + '.tmp'
+                with open(tmp_path, 'w') as outfile:
+                    outfile.write(data)
+                os.replace(tmp_path, self.cache_path)
+            except Exception as e:
+                log.warning(f'Unable to save media index {self.cache_path}: {e}')
+
+    """Get the indexed entry of a file.
+    @param path: the audio file path
+    @returns a dict with the duration and tags, or None if the file has not been indexed
+    """
+    def get(self, path):
+        with self._lock:
+            return self.entries.get(path)
+
+    """Index a file if it is new or has changed since it was indexed.
+    @param path: the audio file path
+    """
+    def _index_file(self, path):
+        try:
+            stat = os.stat(path)
+            entry = self.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                return
+
+            if MUTAGEN_INSTALLED:
+                duration, tags = read_tags_mutagen(path)
+            else:
+                duration, tags = read_tags_vlc(self.vlc_instance, path)
+
+            with self._lock:
+                self.entries[path] = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'duration': duration,
+                    'tags': tags
+                    }
+                self.indexed += 1
+                self._dirty = True
+
+        except FileNotFoundError:
+            self.remove([path])
+        except Exception as e:
+            log.error(f'Failed to index {path}: {e}')
+
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+                # Save periodically as well so a large first scan is not lost if interrupted
+                finished = self._dirty and (not self._pending or self.indexed % SAVE_INTERVAL == 0)
+
+            if finished:
+                log.debug(f'Media index updated ({len(self.entries)} files, {self.indexed} indexed)')
+                self.save()
+
+    """Queue files to be indexed in the background.
+    @param paths: the audio file paths
+    """
+    def refresh(self, paths):
+        for path in paths:
+            with self._lock:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+
+            self._executor.submit(self._index_file, path)
+
+    """Remove files from the index.
+    @param paths: the audio file paths
+    """
+    def remove(self, paths):
+        with self._lock:
+            for path in paths:
+                if self.entries.pop(path, None) is not None:
+                    self._dirty = True
+
+    """Drop entries for files under a directory that are no longer present.
+    @param root: the library root directory
+    @param paths: the audio file paths currently under the root
+    """
+    def prune(self, root, paths):
+        prefix = os.path.join(root, '')
+        present = set(paths)
+        with self._lock:
+            stale = [path for path in self.entries if path.startswith(prefix) and path not in present]
+
+        if stale:
+            self.remove(stale)
+            self.save()
+
+    """Stop the background indexing and save the index"""
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._dirty:
+            self.save()
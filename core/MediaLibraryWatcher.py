@@ -0,0 +1,312 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import re
+import select
+import struct
+import time
+
+log = logging.getLogger()
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_MOVE_SELF    = 0x00000800
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_ISDIR        = 0x40000000
+
+IN_NONBLOCK     = 0o4000
+IN_CLOEXEC      = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# struct inotify_event header: wd, mask, cookie, name length
+INOTIFY_EVENT = struct.Struct('iIII')
+
+MOUNTS_PATH = '/proc/self/mounts'
+MOUNT_ESCAPE_PATTERN = re.compile(r'\\([0-7]{3})')
+
+class MediaLibraryWatcher:
+    """Watch a music library with inotify and report added and removed audio files.
+    Every directory is watched so an idle library costs no I/O; only directories that appear
+    after the watch was set up are walked.  Changes are debounced so a copy of an album is
+    reported as a single batch once the library has been quiet for the debounce period.
+    @param root: the library root directory
+    @param extensions: the supported audio file extensions (lowercase)
+    @param debounce: the seconds without events before pending changes are reported
+    @param max_delay: the maximum seconds changes are held back during continuous activity
+    """
+    def __init__(self, root, extensions, debounce=1.0, max_delay=5.0):
+        self.root           = os.path.abspath(root)
+        self.extensions     = extensions
+        self.debounce       = debounce
+        self.max_delay      = max_delay
+
+        self.rescan_needed  = False
+
+        self._fd            = None
+        self._libc          = None
+        self._watches       = dict()
+        self._added         = set()
+        self._removed       = set()
+        self._first_event   = None
+        self._last_event    = None
+
+    """Check whether inotify is available on this platform"""
+    @staticmethod
+    def is_available():
+        libc_path = ctypes.util.find_library('c')
+        if not libc_path:
+            return False
+
+        return hasattr(ctypes.CDLL(libc_path), 'inotify_init1')
+
+    """Create the inotify instance and watch every directory of the library"""
+    def open(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f'inotify_init1 failed: {os.strerror(err)}')
+
+        for path in self._walk_directories(self.root):
+            self._add_watch(path)
+
+        log.info(f'Watching {len(self._watches)} directories under {self.root} for audio file changes')
+
+    """Walk the directories of a tree.
+    @param path: the tree root
+    """
+    def _walk_directories(self, path):
+        for root, dirs, files in os.walk(path):
+            yield root
+
+    """Watch a directory.
+    @param path: the directory path
+    """
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                log.error(f'Unable to watch {path}: the inotify watch limit was reached (see fs.inotify.max_user_watches)')
+            elif err not in (errno.ENOENT, errno.ENOTDIR):
+                log.warning(f'Unable to watch {path}: {os.strerror(err)}')
+            return
+
+        self._watches[wd] = path
+
+    """Check whether a path is a supported audio file.
+    @param path: the file path
+    """
+    def is_supported(self, path):
+        return path.lower().endswith(self.extensions)
+
+    """Record a file as added.
+    @param path: the file path
+    """
+    def _file_added(self, path):
+        if self.is_supported(path):
+            self._removed.discard(path)
+            self._added.add(path)
+
+    """Record a file as removed.
+    @param path: the file path
+    """
+    def _file_removed(self, path):
+        if self.is_supported(path):
+            self._added.discard(path)
+            self._removed.add(path)
+
+    """Record every supported file of a directory that appeared as added.
+    @param path: the directory path
+    """
+    def _directory_added(self, path):
+        for root, dirs, files in os.walk(path):
+            self._add_watch(root)
+            for file in files:
+                self._file_added(os.path.join(root, file))
+
+    """Record every file known under a directory that disappeared as removed.
+    @param path: the directory path
+    @param known_files: the paths currently in the playlist
+    """
+    def _directory_removed(self, path, known_files):
+        prefix = path + os.sep
+        for wd, watched in list(self._watches.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._watches.pop(wd, None)
+
+        self._added = {added for added in self._added if not added.startswith(prefix)}
+        self._removed.update(known for known in known_files if known.startswith(prefix))
+
+    """Read and apply the queued inotify events.
+    @param known_files: the paths currently in the playlist
+    """
+    def _read_events(self, known_files):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                log.warning('inotify event queue overflowed; the library will be rescanned')
+                self.rescan_needed = True
+                continue
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._directory_added(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._directory_removed(path, known_files)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._file_added(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._file_removed(path)
+
+            now = time.monotonic()
+            self._first_event = self._first_event or now
+            self._last_event = now
+
+    """Wait for library changes.
+    @param timeout: the seconds to wait for events
+    @param known_files: the paths currently in the playlist (used to resolve removed directories)
+    @returns a tuple of the added and removed paths once the debounce period has passed, otherwise None
+    """
+    def poll(self, timeout, known_files=()):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if ready:
+            self._read_events(known_files)
+
+        if self._last_event is None:
+            return None
+
+        now = time.monotonic()
+        if now - self._last_event < self.debounce and now - self._first_event < self.max_delay:
+            return None
+
+        added, removed = sorted(self._added), sorted(self._removed)
+        self._added, self._removed = set(), set()
+        self._first_event = self._last_event = None
+
+        return added, removed
+
+    """Rewatch the library after an event queue overflow"""
+    def reset(self):
+        for wd in list(self._watches):
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+        self._watches.clear()
+        self._added, self._removed = set(), set()
+        self._first_event = self._last_event = None
+        self.rescan_needed = False
+
+        for path in self._walk_directories(self.root):
+            self._add_watch(path)
+
+    """Close the inotify instance"""
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+"""Walk a directory tree and yield supported audio files as they are found.
+@param root: the directory to scan
+@param extensions: the supported audio file extensions (lowercase)
+"""
+def iter_audio_files(root, extensions):
+    for path, dirs, files in os.walk(root):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(extensions):
+                yield os.path.join(path, file)
+
+"""Decode the octal escapes used for whitespace and backslashes in /proc/self/mounts.
+@param field: the escaped field
+"""
+def unescape_mount_field(field):
+    return MOUNT_ESCAPE_PATTERN.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+class MountWatcher:
+    """Report filesystems mounted and unmounted below a directory.
+    The kernel flags /proc/self/mounts with POLLPRI whenever the mount table changes, so new
+    mounts are picked up the moment they happen without polling or fixed sleeps.
+    @param root: the directory mounts are reported under (ie: /media)
+    """
+    def __init__(self, root):
+        self.root           = os.path.abspath(root)
+
+        self.mounts         = dict()
+
+        self._file          = None
+
+    """Open the mount table and read the current mounts"""
+    def open(self):
+        self._file = open(MOUNTS_PATH, 'r')
+        self.mounts = self._read_mounts()
+
+    """Get the file descriptor to poll for POLLPRI"""
+    def fileno(self):
+        return self._file.fileno()
+
+    """Read the mounts below the root directory.
+    @returns a dict of mount points to their source devices
+    """
+    def _read_mounts(self):
+        self._file.seek(0)
+        mounts = dict()
+        for line in self._file.read().splitlines():
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+
+            mount_point = unescape_mount_field(fields[1])
+            if mount_point.startswith(self.root + os.sep):
+                mounts[mount_point] = unescape_mount_field(fields[0])
+
+        return mounts
+
+    """Re-read the mount table after a change was signalled.
+    @returns a tuple of the added and removed mounts (each a dict of mount points to devices)
+    """
+    def get_changes(self):
+        mounts = self._read_mounts()
+        added = {mount: device for mount, device in mounts.items() if self.mounts.get(mount) != device}
+        removed = {mount: device for mount, device in self.mounts.items() if mounts.get(mount) != device}
+        self.mounts = mounts
+
+        return added, removed
+
+    """Close the mount table"""
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,168 @@
+import logging
+import random
+import threading
+
+from array import array
+
+log = logging.getLogger()
+
+class MediaQueue:
+    """Windowed play queue over a VLC media list for very large libraries.
+    The library is held as a compact list of paths and the play order as a permutation of
+    their indexes, so only the next window_size tracks are materialized as libVLC media.
+    Tracks that have played are left in the media list because the list player tracks its
+    position by index and removing earlier items would make it skip ahead.
+    @param media_list: the VLC media list played by the list player
+    @param media_player: the VLC media player (used to find the current track)
+    @param create_media: a callable creating a VLC media item from a path
+    @param window_size: the number of upcoming tracks to keep materialized
+    @param shuffle: whether the play order is randomized
+    """
+    def __init__(self, media_list, media_player, create_media, window_size=20, shuffle=False):
+        self.media_list     = media_list
+        self.media_player   = media_player
+        self.create_media   = create_media
+        self.window_size    = max(window_size, 1)
+        self.shuffle        = shuffle
+
+        self.paths          = list()
+        self.indexes        = dict()
+        self.order          = array('L')
+        self.position       = 0
+
+        self._items         = list()
+        self._lock          = threading.RLock()
+
+    def __len__(self):
+        return len(self.indexes)
+
+    """Get the media list index of the current track (the media list must be locked).
+    @returns the index or -1 if nothing has been played from the list
+    """
+    def _get_current_index(self):
+        media = self.media_player.get_media()
+        if media is None:
+            return -1
+
+        return self.media_list.index_of_item(media)
+
+    """Remove every item from the media list and reload the queue.
+    @param paths: the audio file paths
+    """
+    def reset(self, paths):
+        with self._lock:
+            self.media_list.lock()
+            try:
+                for index in range(self.media_list.count() - 1, -1, -1):
+                    self.media_list.remove_index(index)
+            finally:
+                self.media_list.unlock()
+
+            self.paths = list(paths)
+            self.indexes = {path: index for index, path in enumerate(self.paths)}
+            self.order = array('L', range(len(self.paths)))
+            if self.shuffle:
+                random.shuffle(self.order)
+
+            self.position = 0
+            self._items = list()
+            self.fill()
+
+    """Materialize upcoming tracks until the window is full"""
+    def fill(self):
+        with self._lock:
+            self.media_list.lock()
+            try:
+                upcoming = len(self._items) - self._get_current_index() - 1
+                while upcoming < self.window_size and self.position < len(self.order):
+                    index = self.order[self.position]
+                    self.position += 1
+
+                    path = self.paths[index]
+                    if path is None:
+                        continue
+
+                    self.media_list.add_media(self.create_media(path))
+                    self._items.append(index)
+                    upcoming += 1
+            finally:
+                self.media_list.unlock()
+
+    """Add tracks to the queue, at random positions among the unplayed tracks when shuffling.
+    @param paths: the audio file paths
+    @returns the paths that were not already queued
+    """
+    def add(self, paths):
+        added = list()
+        with self._lock:
+            for path in paths:
+                if path in self.indexes:
+                    continue
+
+                index = len(self.paths)
+                self.paths.append(path)
+                self.indexes[path] = index
+
+                position = len(self.order)
+                if self.shuffle:
+                    position = random.randint(self.position, len(self.order))
+
+                self.order.insert(position, index)
+                added.append(path)
+
+            self.fill()
+
+        return added
+
+    """Remove tracks from the queue, including any materialized upcoming tracks.
+    @param paths: the audio file paths
+    @returns the paths that were queued
+    """
+    def remove(self, paths):
+        removed = set()
+        removed_paths = list()
+        with self._lock:
+            for path in paths:
+                index = self.indexes.pop(path, None)
+                if index is not None:
+                    self.paths[index] = None
+                    removed.add(index)
+                    removed_paths.append(path)
+
+            if not removed:
+                return removed_paths
+
+            self.media_list.lock()
+            try:
+                current = self._get_current_index()
+                for item in range(len(self._items) - 1, current, -1):
+                    if self._items[item] in removed:
+                        self.media_list.remove_index(item)
+                        del self._items[item]
+            finally:
+                self.media_list.unlock()
+
+            if len(self.paths) > 2 * len(self.indexes) + self.window_size:
+                self._compact()
+
+            self.fill()
+
+        return removed_paths
+
+    """Drop removed paths from the path list and renumber the permutation"""
+    def _compact(self):
+        renumbered = dict()
+        paths = list()
+        for index, path in enumerate(self.paths):
+            if path is not None:
+                renumbered[index] = len(paths)
+                paths.append(path)
+
+        position = sum(1 for index in self.order[:self.position] if index in renumbered)
+        self.order = array('L', (renumbered[index] for index in self.order if index in renumbered))
+        self.position = position
+        self._items = [renumbered.get(index, -1) for index in self._items]
+
+        self.paths = paths
+        self.indexes = {path: index for index, path in enumerate(paths)}
+        log.debug(f'Compacted the media queue to {len(paths)} tracks')
@@ -0,0 +1,195 @@
+import logging
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+from core.PresetPlaylist import PRESET_EXTENSIONS
+
+log = logging.getLogger()
+
+ARCHIVE_EXTENSIONS = ('.zip', '.pmpack')
+
+# Indexed pack layout (little-endian):
+#   header:     magic, version, preset count, table of contents offset
+#   presets:    raw preset data
+#   toc entry:  data offset, data size, name length, followed by the UTF-8 name
+PACK_MAGIC = b'PMPK'
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct('<4sHIQ')
+PACK_ENTRY = struct.Struct('<QIH')
+
+# Fixed size portion of a zip local file header (the name and extra field lengths are at the end)
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_LOCAL_MAGIC = b'PK\x03\x04'
+
+"""Create an indexed preset pack from a list of preset files.
+Presets with a name already in the pack are skipped so earlier entries are never shadowed.
+@param presets: a list of (name, path) tuples where name is the path within the pack
+@param pack_path: the pack file to create
+@returns the number of presets written
+"""
+def create_pack(presets, pack_path):
+    entries = list()
+    names = dict()
+    tmp = pack_path + '.tmp'
+    with open(tmp, 'wb') as outfile:
+        outfile.write(b'\0' * PACK_HEADER.size)
+
+        for name, path in presets:
+            if name in names:
+                log.warning(f'Skipping {path} as {names[name]} is already packed as {name}')
+                continue
+            names[name] = path
+
+            with open(path, 'rb') as infile:
+                data = infile.read()
+
+            entries.append((outfile.tell(), len(data), name.encode('utf-8')))
+            outfile.write(data)
+
+        toc_offset = outfile.tell()
+        for offset, size, name in entries:
+            outfile.write(PACK_ENTRY.pack(offset, size, len(name)))
+            outfile.write(name)
+
+        outfile.seek(0)
+        outfile.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(entries), toc_offset))
+
+    os.replace(tmp, pack_path)
+    return len(entries)
+
+class PresetArchive:
+    """A memory-mapped preset pack (uncompressed zip or indexed .pmpack).
+    Only the table of contents is read when the archive is opened; preset data is sliced
+    out of the mapping on demand and handed to projectM as in-memory data.
+    @param path: the archive file path
+    """
+    def __init__(self, path):
+        self.path           = os.path.normpath(path)
+
+        self._file          = None
+        self._mmap          = None
+        self._members       = dict()
+
+    """Check whether a preset path refers to a supported archive.
+    @param path: the configured preset path
+    """
+    @staticmethod
+    def is_archive(path):
+        return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+    """Open and memory-map the archive and read its table of contents"""
+    def open(self):
+        self._file = open(self.path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            if self._mmap[:len(PACK_MAGIC)] == PACK_MAGIC:
+                self._read_pack_index()
+            else:
+                self._read_zip_index()
+
+        except (OSError, ValueError, struct.error, zipfile.BadZipFile) as e:
+            self.close()
+            raise ValueError(f'Invalid preset archive {self.path}: {e}')
+
+        log.debug(f'Opened preset archive {self.path} with {len(self._members)} presets')
+
+    """Read the table of contents of an indexed pack"""
+    def _read_pack_index(self):
+        magic, version, count, toc_offset = PACK_HEADER.unpack_from(self._mmap, 0)
+        if version != PACK_VERSION:
+            raise ValueError(f'unsupported pack version {version}')
+
+        position = toc_offset
+        for i in range(count):
+            offset, size, name_length = PACK_ENTRY.unpack_from(self._mmap, position)
+            position += PACK_ENTRY.size
+            name = self._mmap[position:position + name_length].decode('utf-8')
+            position += name_length
+
+            self._members[name] = (offset, size, zipfile.ZIP_STORED, None)
+
+    """Read the central directory of a zip archive.
+    The local header of each member is only parsed when the member is first read.
+    """
+    def _read_zip_index(self):
+        skipped = 0
+        with zipfile.ZipFile(self._file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(PRESET_EXTENSIONS):
+                    continue
+
+                if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    skipped += 1
+                    continue
+
+                self._members[info.filename] = (None, info.compress_size, info.compress_type, info.header_offset)
+
+        if skipped:
+            log.warning(f'Skipped {skipped} presets in {self.path} with an unsupported compression method')
+
+    """Get the names of the presets in the archive"""
+    def names(self):
+        return list(self._members)
+
+    """Get the playlist path of a preset within the archive.
+    @param name: the preset name within the archive
+    """
+    def get_member_path(self, name):
+        return os.path.join(self.path, name)
+
+    """Get the location of a preset's data within the mapping.
+    @param name: the preset name within the archive
+    @returns a tuple of the data offset, data size and compression method
+    """
+    def _locate(self, name):
+        offset, size, compress_type, header_offset = self._members[name]
+        if offset is None:
+            fields = ZIP_LOCAL_HEADER.unpack_from(self._mmap, header_offset)
+            if fields[0] != ZIP_LOCAL_MAGIC:
+                raise ValueError(f'Invalid local header for {name} in {self.path}')
+
+            offset = header_offset + ZIP_LOCAL_HEADER.size + fields[-2] + fields[-1]
+            self._members[name] = (offset, size, compress_type, header_offset)
+
+        return offset, size, compress_type
+
+    """Read a preset from the archive.
+    @param name: the preset name within the archive
+    @returns the preset data
+    """
+    def read(self, name):
+        offset, size, compress_type = self._locate(name)
+        data = self._mmap[offset:offset + size]
+        if compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+
+        return data
+
+    """Advise the kernel that a preset will be read soon.
+    @param name: the preset name within the archive
+    """
+    def advise(self, name):
+        if not hasattr(self._mmap, 'madvise'):
+            return
+
+        try:
+            offset, size, compress_type = self._locate(name)
+
+            # madvise requires a page aligned start
+            start = offset - (offset % mmap.PAGESIZE)
+            self._mmap.madvise(mmap.MADV_WILLNEED, start, offset + size - start)
+        except (OSError, ValueError) as e:
+            log.debug(f'Failed to advise {name} in {self.path}: {e}')
+
+    """Unmap and close the archive"""
+    def close(self):
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+        if self._file:
+            self._file.close()
+            self._file = None
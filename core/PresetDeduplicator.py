@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+
+log = logging.getLogger()
+
+PRESET_EXTENSIONS = ('.milk', '.prjm')
+
+class PresetDeduplicator:
+    """Collapse byte-identical and whitespace-only-different presets.
+    Hashes are cached by inode, size and mtime so only new or modified presets are read
+    on subsequent runs (the cache survives the shuffle index renaming).
+    @param preset_paths: the configured preset paths (directories or files)
+    @param cache_path: the path to the JSON hash cache
+    """
+    def __init__(self, preset_paths, cache_path):
+        self.preset_paths   = preset_paths
+        self.cache_path     = cache_path
+
+        self.cache          = dict()
+        self.hashed         = 0
+        self.cached         = 0
+
+    """Load the hash cache from disk"""
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, 'r') as infile:
+                self.cache = json.load(infile)
+        except Exception as e:
+            log.warning(f'Unable to load preset hash cache {self.cache_path}: {e}')
+            self.cache = dict()
+
+    """Write the hash cache to disk, dropping entries for presets that no longer exist.
+    @param seen: the cache keys encountered during the current scan
+    """
+    def _save_cache(self, seen):
+        self.cache = {key: val for key, val in self.cache.items() if key in seen}
+
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as outfile:
+                json.dump(self.cache, outfile)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            log.warning(f'Unable to save preset hash cache {self.cache_path}: {e}')
+
+    """Normalize preset contents so whitespace-only differences hash the same.
+    @param data: the raw preset bytes
+    @returns the normalized preset bytes
+    """
+    def _normalize(self, data):
+        lines = list()
+        for line in data.splitlines():
+            line = b' '.join(line.split())
+            if not line:
+                continue
+
+            # Milkdrop assignments allow arbitrary spacing around the first '='
+            if b'=' in line:
+                key, val = line.split(b'=', 1)
+                line = key.strip() + b'=' + val.strip()
+
+            lines.append(line)
+
+        return b'\n'.join(lines)
+
+    """Get the content hash for a preset, reading it only if the cache is stale.
+    @param path: the preset file path
+    @param stat: the os.stat_result for the preset
+    @returns a tuple of the cache key and the content hash
+    """
+    def _get_hash(self, path, stat):
+        key = f'{stat.st_dev}:{stat.st_ino}'
+        entry = self.cache.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            self.cached += 1
+            return key, entry['hash']
+
+        with open(path, 'rb') as infile:
+            digest = hashlib.sha1(self._normalize(infile.read())).hexdigest()
+
+        self.cache[key] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': digest
+            }
+        self.hashed += 1
+
+        return key, digest
+
+    """Get all of the preset files in the configured preset paths"""
+    def get_preset_files(self):
+        presets = list()
+        for preset_path in self.preset_paths:
+            if os.path.isfile(preset_path):
+                presets.append(preset_path)
+                continue
+
+            for root, dirs, files in os.walk(preset_path):
+                for name in files:
+                    if name.lower().endswith(PRESET_EXTENSIONS):
+                        presets.append(os.path.join(root, name))
+
+        return sorted(set(presets))
+
+    """Scan the preset paths and group presets by content.
+    The first preset (by path) of each group is kept and the rest are reported as duplicates.
+    @returns a tuple of the unique preset list and a dict of kept preset to its duplicates
+    """
+    def scan(self):
+        self._load_cache()
+        self.hashed = 0
+        self.cached = 0
+
+        unique = list()
+        groups = dict()
+        seen = set()
+        for preset in self.get_preset_files():
+            try:
+                key, digest = self._get_hash(preset, os.stat(preset))
+            except Exception as e:
+                log.error(f'Failed to hash preset {preset}: {e}')
+                continue
+
+            seen.add(key)
+            if digest in groups:
+                groups[digest].append(preset)
+            else:
+                groups[digest] = [preset]
+                unique.append(preset)
+
+        self._save_cache(seen)
+
+        duplicates = {group[0]: group[1:] for group in groups.values() if len(group) > 1}
+        log.info(
+            f'Preset deduplication found {len(unique)} unique presets and '
+            f'{sum(len(dups) for dups in duplicates.values())} duplicates '
+            f'({self.hashed} hashed, {self.cached} cached)'
+            )
+
+        return unique, duplicates
+
+    """Move duplicate presets into the backup path, preserving their relative location.
+    @param duplicates: a dict of kept preset to its duplicates
+    @param get_backup_path: a callable mapping a preset path to its backup path
+    @param move_preset: a callable moving a preset to its backup path (ie: PresetFileWorker.backup)
+    """
+    def backup_duplicates(self, duplicates, get_backup_path, move_preset):
+        for kept, dups in duplicates.items():
+            for dup in dups:
+                backup_path = get_backup_path(dup)
+                if backup_path:
+                    move_preset(dup, backup_path)
+
+    """Write a JSON report of the duplicate presets.
+    @param report_path: the path of the report file
+    @param duplicates: a dict of kept preset to its duplicates
+    """
+    def write_report(self, report_path, duplicates):
+        report = {
+            'duplicate_count': sum(len(dups) for dups in duplicates.values()),
+            'duplicates': duplicates
+            }
+
+        try:
+            with open(report_path, 'w') as outfile:
+                outfile.write(json.dumps(report, indent=2))
+            log.info(f'Preset deduplication report written to {report_path}')
+        except Exception as e:
+            log.error(f'Failed to write preset deduplication report {report_path}: {e}')
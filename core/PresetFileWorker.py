@@ -0,0 +1,116 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+log = logging.getLogger()
+
+class PresetFileOperation:
+    """A queued preset filesystem operation.
+    @param description: a human readable description of the operation
+    @param func: the callable performing the operation
+    @param args: the arguments to pass to the callable
+    @param on_complete: optional callable invoked with (operation, error) once finished
+    """
+    def __init__(self, description, func, args, on_complete=None):
+        self.description    = description
+        self.func           = func
+        self.args           = args
+        self.on_complete    = on_complete
+        self.queued         = time.time()
+
+class PresetFileWorker(threading.Thread):
+    """Single background worker that serializes all preset filesystem mutations.
+    Callers apply playlist changes immediately and only queue the disk work here, so slow
+    storage never blocks the rendering thread.
+    """
+    def __init__(self):
+        threading.Thread.__init__(self, name='PresetFileWorker', daemon=True)
+
+        self._queue         = queue.Queue()
+
+        self.completed      = 0
+        self.failed         = 0
+
+    """Queue a filesystem operation.
+    @param description: a human readable description of the operation
+    @param func: the callable performing the operation
+    @param args: the arguments to pass to the callable
+    @param on_complete: optional callable invoked with (operation, error) once finished
+    """
+    def submit(self, description, func, *args, on_complete=None):
+        self._queue.put(PresetFileOperation(description, func, args, on_complete))
+
+    """Queue the removal of a preset.
+    @param preset: the preset file path
+    @param on_complete: optional completion callback
+    """
+    def delete(self, preset, on_complete=None):
+        self.submit(f'delete {preset}', os.remove, preset, on_complete=on_complete)
+
+    """Queue the move of a preset into the backup location.
+    @param preset: the preset file path
+    @param backup_path: the destination path of the preset
+    @param on_complete: optional completion callback
+    """
+    def backup(self, preset, backup_path, on_complete=None):
+        self.submit(f'backup {preset} to {backup_path}', self._move, preset, backup_path, on_complete=on_complete)
+
+    """Queue the rename of a preset.
+    @param preset: the preset file path
+    @param dst: the new preset file path
+    @param on_complete: optional completion callback
+    """
+    def rename(self, preset, dst, on_complete=None):
+        self.submit(f'rename {preset} to {dst}', os.rename, preset, dst, on_complete=on_complete)
+
+    """Move a file, creating the destination directory if required"""
+    def _move(self, src, dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.move(src, dst)
+
+    """Block until all queued operations have completed"""
+    def flush(self):
+        self._queue.join()
+
+    """Get the number of queued operations"""
+    def pending(self):
+        return self._queue.qsize()
+
+    """Run the worker thread"""
+    def run(self):
+        while True:
+            operation = self._queue.get()
+            try:
+                if operation is None:
+                    break
+
+                error = None
+                start = time.time()
+                try:
+                    operation.func(*operation.args)
+                    self.completed += 1
+                    log.debug(f'Preset file operation {operation.description} completed in {(time.time() - start) * 1000:.1f}ms')
+                except Exception as e:
+                    error = e
+                    self.failed += 1
+                    log.error(f'Preset file operation {operation.description} failed with error: {e}')
+
+                if operation.on_complete:
+                    try:
+                        operation.on_complete(operation, error)
+                    except Exception:
+                        log.exception(f'Preset file operation {operation.description} completion callback failed')
+
+            finally:
+                self._queue.task_done()
+
+    """Stop the worker once all queued operations have completed.
+    @param timeout: the maximum number of seconds to wait for the queue to drain
+    """
+    def stop(self, timeout=5):
+        self._queue.put(None)
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,232 @@
+import logging
+import os
+import random
+
+from array import array
+from collections import deque
+
+log = logging.getLogger()
+
+PRESET_EXTENSIONS = ('.milk', '.prjm')
+
+class PresetPlaylist:
+    """Python-side preset playlist with O(1) navigation and a real shuffle history.
+    Presets are stored in a flat array; removals leave a tombstone so indexes stay stable.
+    Shuffle is a permutation of the indexes that is regenerated every cycle, and previous
+    walks back through the presets that were actually played.
+    @param shuffle: whether presets are played in a shuffled order
+    @param history_size: the maximum number of presets remembered for previous
+    """
+    def __init__(self, shuffle=False, history_size=1000):
+        self.paths          = list()
+        self.count          = 0
+        self.shuffle        = shuffle
+        self.position       = None
+
+        self._order         = array('L')
+        self._order_pos     = array('L')
+        self._cursor        = -1
+        self._history       = deque(maxlen=history_size)
+        self._forward       = list()
+
+    def __len__(self):
+        return len(self.paths)
+
+    """Add a preset to the playlist.
+    @param path: the preset file path
+    @returns the index of the preset
+    """
+    def add_preset(self, path):
+        self.paths.append(path)
+        self.count += 1
+        return len(self.paths) - 1
+
+    """Add all presets found in a directory.
+    @param path: the directory to search
+    @param recursive: whether to search subdirectories
+    """
+    def add_path(self, path, recursive=True):
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                if name.lower().endswith(PRESET_EXTENSIONS):
+                    self.add_preset(os.path.join(root, name))
+
+            if not recursive:
+                break
+
+    """Sort the presets by filename and reset the play order.
+    Must be called before playback starts as indexes are reassigned.
+    """
+    def sort(self):
+        self.paths = sorted(
+            (path for path in self.paths if path is not None),
+            key=lambda path: os.path.basename(path).lower()
+            )
+        self.count = len(self.paths)
+        self.position = None
+        self._history.clear()
+        self._forward.clear()
+        self._build_order()
+
+    """Build the play order for a new cycle through the playlist"""
+    def _build_order(self):
+        self._order = array('L', range(len(self.paths)))
+        if self.shuffle:
+            random.shuffle(self._order)
+
+        self._order_pos = array('L', bytes(self._order.itemsize * len(self._order)))
+        for pos, index in enumerate(self._order):
+            self._order_pos[index] = pos
+
+        self._cursor = -1 if self.position is None else self._order_pos[self.position]
+
+    """Enable or disable shuffle, starting a new play order from the current preset.
+    @param shuffle: whether presets are played in a shuffled order
+    """
+    def set_shuffle(self, shuffle):
+        self.shuffle = shuffle
+        self._forward.clear()
+        self._build_order()
+
+    """Get a preset path by index.
+    @param index: the playlist index
+    @returns the preset path or None if it was removed
+    """
+    def item(self, index):
+        if index < 0 or index >= len(self.paths):
+            raise IndexError(f'Item at index {index} does not exist in the playlist')
+
+        return self.paths[index]
+
+    """Get the index following a position in the play order, skipping removed presets.
+    @param cursor: the position within the play order
+    @returns a tuple of the next cursor and whether a new cycle started
+    """
+    def _next_cursor(self, cursor):
+        for step in range(len(self._order)):
+            cursor += 1
+            if cursor >= len(self._order):
+                return 0, True
+
+            if self.paths[self._order[cursor]] is not None:
+                return cursor, False
+
+        return cursor, False
+
+    """Move to a preset, recording the current preset in the history.
+    @param index: the playlist index to move to
+    """
+    def _move_to(self, index):
+        if self.position is not None and self.position != index:
+            self._history.append(self.position)
+
+        self.position = index
+
+    """Advance to the next preset.
+    @returns the playlist index of the next preset or None if the playlist is empty
+    """
+    def next(self):
+        if self.count == 0:
+            return None
+
+        # Replay anything that was stepped back over first
+        while self._forward:
+            index = self._forward.pop()
+            if self.paths[index] is not None:
+                self._move_to(index)
+                self._cursor = self._order_pos[index]
+                return index
+
+        cursor, wrapped = self._next_cursor(self._cursor)
+        if wrapped:
+            # Start a new cycle; shuffle draws a fresh permutation
+            if self.shuffle:
+                current = self.position
+                self.position = None
+                self._build_order()
+                self.position = current
+
+            cursor, wrapped = self._next_cursor(-1)
+            if self._order[cursor] == self.position and self.count > 1:
+                cursor, wrapped = self._next_cursor(cursor)
+
+        self._cursor = cursor
+        index = self._order[cursor]
+        self._move_to(index)
+        return index
+
+    """Go back to the previously played preset.
+    @returns the playlist index of the previous preset or None if there is no history
+    """
+    def previous(self):
+        while self._history:
+            index = self._history.pop()
+            if self.paths[index] is None:
+                continue
+
+            if self.position is not None:
+                self._forward.append(self.position)
+
+            self.position = index
+            self._cursor = self._order_pos[index]
+            return index
+
+        return None
+
+    """Jump to a preset by index.
+    @param index: the playlist index
+    @returns the playlist index or None if the preset was removed
+    """
+    def jump(self, index):
+        if self.item(index) is None:
+            return None
+
+        self._forward.clear()
+        self._move_to(index)
+        self._cursor = self._order_pos[index]
+        return index
+
+    """Remove a preset from the playlist.
+    @param index: the playlist index
+    @returns True if the preset was removed
+    """
+    def remove(self, index):
+        if self.item(index) is None:
+            return False
+
+        self.paths[index] = None
+        self.count -= 1
+        return True
+
+    """Get the presets that will be played next without advancing.
+    Only the remainder of the current shuffle cycle is known.
+    @param count: the maximum number of presets to return
+    @returns a list of playlist indexes
+    """
+    def upcoming(self, count):
+        indexes = list()
+        if self.count == 0:
+            return indexes
+
+        for index in reversed(self._forward):
+            if len(indexes) >= count:
+                return indexes
+            if self.paths[index] is not None:
+                indexes.append(index)
+
+        # Once the stepped back presets are replayed the play order continues from the last of them
+        cursor = self._order_pos[self._forward[0]] if self._forward else self._cursor
+        while len(indexes) < count:
+            cursor, wrapped = self._next_cursor(cursor)
+            if wrapped:
+                if self.shuffle:
+                    break
+                cursor, wrapped = self._next_cursor(-1)
+
+            index = self._order[cursor]
+            if index == self.position or index in indexes:
+                break
+
+            indexes.append(index)
+
+        return indexes
@@ -0,0 +1,202 @@
+import logging
+import os
+import re
+import threading
+
+from collections import OrderedDict
+
+log = logging.getLogger()
+
+TEXTURE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tga', '.bmp', '.dds')
+
+# Milkdrop sampler prefixes for the filtering/wrap mode (ie: sampler_fw_clouds)
+SAMPLER_PREFIXES = ('fc_', 'fw_', 'pc_', 'pw_')
+SAMPLER_PATTERN = re.compile(rb'sampler_([a-z0-9_\-]+)', re.I)
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+class PresetPrefetcher(threading.Thread):
+    """Background prefetcher that warms the page cache for upcoming presets and their textures.
+    Only the most recent request is processed so rapid preset switching never builds a backlog.
+    Warmed files are tracked up to the memory cap so they are not read again; files that fall
+    out of the tracked set are left for the kernel's page cache LRU to reclaim.
+    The hit/miss counters measure whether a loaded file was in the tracked set, not whether its
+    pages were actually still resident in the page cache.
+    @param texture_paths: the texture search paths registered with projectM
+    @param memory_cap: the maximum number of warmed bytes tracked at once
+    """
+    def __init__(self, texture_paths, memory_cap):
+        threading.Thread.__init__(self, name='PresetPrefetcher', daemon=True)
+
+        self.texture_paths      = texture_paths
+        self.memory_cap         = memory_cap
+
+        self.hits               = 0
+        self.misses             = 0
+
+        self._lock              = threading.Lock()
+        self._request_event     = threading.Event()
+        self._stop_event        = threading.Event()
+        self._pending           = None
+
+        self._texture_index     = None
+        self._preset_textures   = dict()
+        self._warmed            = OrderedDict()
+        self._warmed_bytes      = 0
+
+        self._use_fadvise       = hasattr(os, 'posix_fadvise')
+
+    """Build an index of texture names to files from the texture search paths"""
+    def _build_texture_index(self):
+        texture_index = dict()
+        for texture_path in self.texture_paths:
+            for root, dirs, files in os.walk(texture_path):
+                for name in files:
+                    stem, ext = os.path.splitext(name)
+                    if ext.lower() in TEXTURE_EXTENSIONS:
+                        texture_index.setdefault(stem.lower(), os.path.join(root, name))
+
+        log.debug(f'Prefetcher indexed {len(texture_index)} textures')
+        return texture_index
+
+    """Get the texture files referenced by a preset.
+    @param data: the raw preset contents
+    @returns a list of texture file paths
+    """
+    def _get_preset_textures(self, data):
+        textures = list()
+        for match in SAMPLER_PATTERN.finditer(data):
+            name = match.group(1).decode('utf-8', 'ignore').lower()
+            if name.startswith(SAMPLER_PREFIXES):
+                name = name[3:]
+
+            texture = self._texture_index.get(name)
+            if texture and texture not in textures:
+                textures.append(texture)
+
+        return textures
+
+    """Stop tracking the oldest warmed files until the requested size fits within the memory cap.
+    The pages themselves are not dropped as textures may be shared with presets still in use.
+    An evicted preset's texture references are forgotten with it, so they are bounded by the
+    tracked set as well.
+    @param size: the number of bytes about to be warmed
+    """
+    def _evict(self, size):
+        while self._warmed and self._warmed_bytes + size > self.memory_cap:
+            path, evicted_size = self._warmed.popitem(last=False)
+            self._warmed_bytes -= evicted_size
+            self._preset_textures.pop(path, None)
+
+    """Warm the page cache for a file.
+    @param path: the file to warm
+    @param read: read the contents instead of only advising the kernel
+    @returns the file contents if read, otherwise None
+    """
+    def _warm(self, path, read=False):
+        with self._lock:
+            if path in self._warmed and not read:
+                self._warmed.move_to_end(path)
+                return None
+
+        try:
+            size = os.path.getsize(path)
+            if size > self.memory_cap:
+                log.debug(f'Skipping prefetch of {path} as it exceeds the memory cap')
+                return None
+
+            with self._lock:
+                if path not in self._warmed:
+                    self._evict(size)
+
+            data = None
+            with open(path, 'rb') as infile:
+                if read:
+                    data = infile.read()
+                elif self._use_fadvise:
+                    os.posix_fadvise(infile.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                else:
+                    while infile.read(READ_CHUNK_SIZE):
+                        pass
+
+            with self._lock:
+                if path not in self._warmed:
+                    self._warmed_bytes += size
+                self._warmed[path] = size
+                self._warmed.move_to_end(path)
+
+            return data
+
+        except OSError as e:
+            log.debug(f'Failed to prefetch {path}: {e}')
+            return None
+
+    """Warm a preset and the textures it references.
+    @param preset: the preset file path
+    """
+    def _prefetch_preset(self, preset):
+        data = self._warm(preset, read=preset not in self._preset_textures)
+        with self._lock:
+            if data is not None and preset in self._warmed:
+                self._preset_textures[preset] = self._get_preset_textures(data)
+
+            textures = self._preset_textures.get(preset, list())
+
+        for texture in textures:
+            self._warm(texture)
+
+    """Request the upcoming presets to be prefetched, replacing any pending request.
+    @param presets: a list of upcoming preset file paths in play order
+    """
+    def prefetch(self, presets):
+        with self._lock:
+            self._pending = list(presets)
+        self._request_event.set()
+
+    """Record that a preset was loaded and count whether its files had been warmed.
+    @param preset: the preset file path that was switched to
+    """
+    def record_access(self, preset):
+        with self._lock:
+            files = [preset] + self._preset_textures.get(preset, list())
+            for path in files:
+                if path in self._warmed:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+    """Get the prefetcher statistics"""
+    def get_stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'warmed_files': len(self._warmed),
+                'warmed_bytes': self._warmed_bytes,
+                'memory_cap': self.memory_cap
+                }
+
+    """Run the prefetcher thread"""
+    def run(self):
+        self._texture_index = self._build_texture_index()
+
+        while not self._stop_event.is_set():
+            if not self._request_event.wait(timeout=1):
+                continue
+
+            with self._lock:
+                presets = self._pending
+                self._pending = None
+                self._request_event.clear()
+
+            for preset in presets or list():
+                # Abandon the current request if a newer one has arrived
+                if self._stop_event.is_set() or self._request_event.is_set():
+                    break
+
+                self._prefetch_preset(preset)
+
+    """Stop the prefetcher thread"""
+    def stop(self):
+        self._stop_event.set()
+        self._request_event.set()
@@ -0,0 +1,176 @@
+import logging
+import math
+import os
+import re
+
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+log = logging.getLogger()
+
+NORMALIZE_PATTERN = re.compile(r'[^a-z0-9]+')
+
+"""Normalize a preset name for searching.
+@param name: the preset name or search query
+@returns the lowercase name with punctuation collapsed to single spaces
+"""
+def normalize_name(name):
+    return NORMALIZE_PATTERN.sub(' ', name.lower()).strip()
+
+"""Get the trigrams of a normalized name, padded so word boundaries are weighted.
+@param name: the normalized name
+"""
+def get_trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PresetSearchIndex:
+    """In-memory search index over preset basenames.
+    Prefix lookups bisect a sorted array of names.  Fuzzy lookups count the trigrams each
+    preset shares with the query from the query's posting lists, so only presets sharing at
+    least one trigram are touched rather than every name in the playlist.
+    Names and postings refer to presets by the playlist index they had when the index was
+    built; a position map translates those to current playlist indexes, so removing a preset
+    only updates the map instead of every posting list.
+    """
+    def __init__(self):
+        self._names         = list()
+        self._indexes       = array('L')
+        self._trigrams      = dict()
+        self._trigram_counts = np.zeros(0, dtype=np.uint16)
+        self._positions     = np.zeros(0, dtype=np.int64)
+        self._built_indexes = np.zeros(0, dtype=np.int64)
+        self._count         = 0
+
+    def __len__(self):
+        return self._count
+
+    """Build the index from the playlist.
+    @param presets: an iterable of (playlist index, preset path) tuples
+    """
+    def build(self, presets):
+        entries = list()
+        trigrams = defaultdict(lambda: array('L'))
+        trigram_counts = dict()
+
+        for index, preset in presets:
+            name = normalize_name(os.path.splitext(os.path.basename(preset))[0])
+            entries.append((name, index))
+
+            name_trigrams = get_trigrams(name)
+            trigram_counts[index] = len(name_trigrams)
+            for trigram in name_trigrams:
+                trigrams[trigram].append(index)
+
+        entries.sort()
+        self._names = [name for name, index in entries]
+        self._indexes = array('L', (index for name, index in entries))
+        self._trigrams = {trigram: np.array(posting, dtype=np.uint32) for trigram, posting in trigrams.items()}
+
+        self._trigram_counts = np.zeros(max(trigram_counts, default=-1) + 1, dtype=np.uint16)
+        self._positions = np.full(len(self._trigram_counts), -1, dtype=np.int64)
+        for index, count in trigram_counts.items():
+            self._trigram_counts[index] = count
+            self._positions[index] = index
+
+        # The built index of the preset at each current playlist index (-1 for presets not indexed)
+        self._built_indexes = self._positions.copy()
+        self._count = len(self._names)
+
+        log.debug(f'Built preset search index with {len(self._names)} presets and {len(self._trigrams)} trigrams')
+
+    """Remove a preset from the index.
+    @param index: the current playlist index of the preset
+    @param shift: whether the playlist moves the following presets down one index
+    """
+    def remove(self, index, shift=False):
+        if index < 0 or index >= len(self._built_indexes) or self._built_indexes[index] < 0:
+            return
+
+        self._positions[self._built_indexes[index]] = -1
+        if shift:
+            self._positions[self._positions > index] -= 1
+            self._built_indexes = np.delete(self._built_indexes, index)
+        else:
+            self._built_indexes[index] = -1
+
+        self._count -= 1
+
+    """Find presets whose name starts with a query.
+    @param query: the search query
+    @param limit: the maximum number of results
+    @returns a list of playlist indexes in name order
+    """
+    def prefix(self, query, limit=10):
+        query = normalize_name(query)
+        results = list()
+        if not query:
+            return results
+
+        position = bisect_left(self._names, query)
+        while position < len(self._names) and len(results) < limit:
+            if not self._names[position].startswith(query):
+                break
+
+            index = self._positions[self._indexes[position]]
+            if index >= 0:
+                results.append(int(index))
+            position += 1
+
+        return results
+
+    """Find presets with a name similar to a query.
+    @param query: the search query
+    @param limit: the maximum number of results
+    @param threshold: the minimum similarity (0-1) for a result
+    @returns a list of (playlist index, similarity) tuples, best match first
+    """
+    def fuzzy(self, query, limit=10, threshold=0.3):
+        query = normalize_name(query)
+        if not query:
+            return list()
+
+        query_trigrams = get_trigrams(query)
+        postings = [self._trigrams[trigram] for trigram in query_trigrams if trigram in self._trigrams]
+        if not postings:
+            return list()
+
+        # The number of query trigrams each preset shares, counted over whole posting lists
+        shared = np.bincount(np.concatenate(postings), minlength=len(self._trigram_counts))
+
+        # A match above the threshold shares at least this many trigrams with the query
+        required = max(math.ceil(threshold * len(query_trigrams) / (2 - threshold)), 1)
+        candidates = np.flatnonzero(shared >= required)
+
+        # Dice coefficient of the trigram sets
+        similarity = 2 * shared[candidates] / (len(query_trigrams) + self._trigram_counts[candidates].astype(np.float64))
+        candidates = self._positions[candidates]
+        matches = (similarity >= threshold) & (candidates >= 0)
+        candidates, similarity = candidates[matches], similarity[matches]
+
+        # Only the best matches are ranked once every candidate has been scored
+        if len(candidates) > limit:
+            best = np.argpartition(-similarity, limit)[:limit]
+            candidates, similarity = candidates[best], similarity[best]
+
+        order = np.argsort(-similarity, kind='stable')
+        return [(int(candidates[i]), float(similarity[i])) for i in order]
+
+    """Search for presets, preferring prefix matches over fuzzy matches.
+    @param query: the search query
+    @param limit: the maximum number of results
+    @returns a list of playlist indexes, best match first
+    """
+    def search(self, query, limit=10):
+        results = self.prefix(query, limit)
+        if len(results) < limit:
+            for index, similarity in self.fuzzy(query, limit):
+                if index not in results:
+                    results.append(index)
+                    if len(results) >= limit:
+                        break
+
+        return results
@@ -0,0 +1,166 @@
+import logging
+import random
+
+from array import array
+
+log = logging.getLogger()
+
+class AliasTable:
+    """Walker/Vose alias table for O(1) sampling from a discrete weight distribution.
+    @param weights: a sequence of non-negative weights
+    """
+    def __init__(self, weights):
+        count = len(weights)
+        self.total  = float(sum(weights))
+        self.prob   = array('d', bytes(8 * count))
+        self.alias  = array('L', bytes(array('L').itemsize * count))
+
+        if count == 0 or self.total <= 0:
+            return
+
+        scaled = [weight * count / self.total for weight in weights]
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Anything left over is 1.0 within floating point error
+        for i in large + small:
+            self.prob[i] = 1.0
+            self.alias[i] = i
+
+    def __len__(self):
+        return len(self.prob)
+
+    """Draw a position from the table.
+    @param rng: the random number generator
+    @returns the sampled position or None if every weight is zero
+    """
+    def sample(self, rng):
+        if self.total <= 0:
+            return None
+
+        position = rng.randrange(len(self.prob))
+        if rng.random() < self.prob[position]:
+            return position
+
+        return self.alias[position]
+
+class WeightedPresetSelector:
+    """Weighted random preset selection backed by blocked alias tables.
+    The playlist is split into fixed size blocks with an alias table each, plus a top level
+    table over the block totals.  Changing a weight only rebuilds its block and the top level
+    table, and rebuilds are deferred until the next sample so bursts of updates are batched.
+    Each preset's weight is multiplied by a cost factor, kept separately so measured render
+    costs never overwrite the configured weights.
+    @param size: the number of playlist entries
+    @param default_weight: the weight of presets without an explicit weight
+    @param block_size: the number of presets per alias table block
+    """
+    def __init__(self, size, default_weight=1.0, block_size=1024):
+        self.default_weight = default_weight
+        self.block_size     = block_size
+
+        self._weights       = array('d', [default_weight]) * size
+        self._cost_factors  = array('d', [1.0]) * size
+        self._blocks        = list()
+        self._top           = None
+        self._dirty         = set(range(self._get_block_count()))
+        self._random        = random.Random()
+
+    def __len__(self):
+        return len(self._weights)
+
+    """Get the number of blocks covering the playlist"""
+    def _get_block_count(self):
+        return (len(self._weights) + self.block_size - 1) // self.block_size
+
+    """Get the weight of a preset.
+    @param index: the playlist index
+    """
+    def get_weight(self, index):
+        return self._weights[index]
+
+    """Set the weight of a preset.
+    @param index: the playlist index
+    @param weight: the new non-negative weight (0 excludes the preset)
+    """
+    def set_weight(self, index, weight):
+        weight = max(float(weight), 0.0)
+        if self._weights[index] != weight:
+            self._weights[index] = weight
+            self._dirty.add(index // self.block_size)
+
+    """Scale the weight of a preset.
+    @param index: the playlist index
+    @param factor: the multiplier to apply
+    """
+    def scale_weight(self, index, factor):
+        self.set_weight(index, self._weights[index] * factor)
+
+    """Set the render cost factor of a preset.
+    @param index: the playlist index
+    @param factor: the multiplier applied to the preset's weight (1 for presets within budget)
+    """
+    def set_cost_factor(self, index, factor):
+        factor = max(float(factor), 0.0)
+        if self._cost_factors[index] != factor:
+            self._cost_factors[index] = factor
+            self._dirty.add(index // self.block_size)
+
+    """Remove a preset, shifting the following playlist indexes down.
+    @param index: the playlist index
+    """
+    def remove(self, index):
+        self._weights.pop(index)
+        self._cost_factors.pop(index)
+        self._dirty.update(range(index // self.block_size, self._get_block_count()))
+
+    """Rebuild the alias tables for blocks with modified weights"""
+    def _rebuild(self):
+        block_count = self._get_block_count()
+        del self._blocks[block_count:]
+        while len(self._blocks) < block_count:
+            self._blocks.append(None)
+
+        for block in self._dirty:
+            if block < block_count:
+                start = block * self.block_size
+                end = start + self.block_size
+                self._blocks[block] = AliasTable([
+                    weight * factor for weight, factor in zip(self._weights[start:end], self._cost_factors[start:end])
+                    ])
+
+        self._top = AliasTable([table.total for table in self._blocks])
+        self._dirty.clear()
+
+    """Draw a preset index.
+    @param exclude: a playlist index to avoid (ie: the current preset) when possible
+    @returns the sampled playlist index or None if every weight is zero
+    """
+    def sample(self, exclude=None):
+        if self._dirty or self._top is None:
+            self._rebuild()
+
+        index = None
+        for attempt in range(8):
+            block = self._top.sample(self._random)
+            if block is None:
+                return None
+
+            index = block * self.block_size + self._blocks[block].sample(self._random)
+            if index != exclude:
+                break
+
+        return index
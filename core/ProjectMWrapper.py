@@ -1,14 +1,27 @@
 import ctypes
+import json
 import logging
 import os
 import random
 import re
+import threading
 import time
-import shutil
+import zlib
 
 import numpy as np
 
 from lib.common import load_library
+from lib.config import APP_ROOT
+
+from core.PresetArchive import PresetArchive
+from core.PresetDeduplicator import PresetDeduplicator
+from core.PresetFileWorker import PresetFileWorker
+from core.PresetPlaylist import PresetPlaylist
+from core.PresetPrefetcher import PresetPrefetcher
+from core.PresetSearchIndex import PresetSearchIndex
+from core.PresetSelector import WeightedPresetSelector
+from core.TexturePreprocessor import TexturePreprocessor
+from core.TransitionPolicy import GPUFrameTimer, TransitionPolicy
 
 log = logging.getLogger()
 
@@ -23,6 +36,13 @@ SORT_ORDER_DESCENDING           = 1 # Sort in alphabetically descending order.
 PresetSwitchedCallback = ctypes.CFUNCTYPE(None, ctypes.c_bool, ctypes.c_uint, ctypes.c_void_p)
 PresetSwitchFailedCallback = ctypes.CFUNCTYPE(None, ctypes.c_char_p, ctypes.c_void_p)
 
+# projectM core callbacks used by the native playlist engine
+PresetSwitchRequestedCallback = ctypes.CFUNCTYPE(None, ctypes.c_bool, ctypes.c_void_p)
+CorePresetSwitchFailedCallback = ctypes.CFUNCTYPE(None, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p)
+
+# Maximum number of consecutive presets the native playlist engine tries before giving up
+MAX_PRESET_LOAD_ATTEMPTS = 10
+
 @PresetSwitchedCallback
 def on_preset_switched(is_hard_cut, index, context):
     instance = ctypes.cast(context, ctypes.POINTER(ctypes.py_object)).contents.value
@@ -33,6 +53,16 @@ def on_preset_switch_failed(error_msg, context):
     instance = ctypes.cast(context, ctypes.POINTER(ctypes.py_object)).contents.value
     instance.on_preset_switch_failed(error_msg)
 
+@PresetSwitchRequestedCallback
+def on_preset_switch_requested(is_hard_cut, context):
+    instance = ctypes.cast(context, ctypes.POINTER(ctypes.py_object)).contents.value
+    instance.on_preset_switch_requested(is_hard_cut)
+
+@CorePresetSwitchFailedCallback
+def on_core_preset_switch_failed(preset_filename, error_msg, context):
+    instance = ctypes.cast(context, ctypes.POINTER(ctypes.py_object)).contents.value
+    instance.on_preset_switch_failed(error_msg)
+
 class ProjectMWrapper:
     def __init__(self, config, sdl_rendering):
         self.config = config
@@ -48,12 +78,34 @@ class ProjectMWrapper:
         self.projectm_playlist = None
         self.projectm_playlist_lib = load_library('projectM-4-playlist')
 
+        # The native engine replaces libprojectM-playlist with PresetPlaylist
+        self.playlist_engine = self.config.projectm.get('projectm.playlistengine', 'projectm')
+        self.preset_playlist = None
+        self.preset_archives = dict()
+        self.preset_search_index = None
+        self.preset_selector = None
+        self.transition_policy = None
+        self.frame_timer = None
+        self._loading_preset_index = None
+        self._preset_load_failed = False
+
+        # PCM may be added from the capture callbacks and plugin readers at the same time
+        self._pcm_lock = threading.Lock()
+
         self.preset_paths = list()
         self.texture_paths = list()
+        self.texture_search_paths = list()
 
         self.current_preset = None
+        self.current_preset_index = None
         self.current_preset_start = None
 
+        self.preset_prefetcher = None
+
+        # All preset filesystem mutations are serialized on a background worker
+        self.preset_file_worker = PresetFileWorker()
+        self.preset_file_worker.start()
+
         # Set up projectm function signatures
         self.projectm_lib.projectm_create.restype = ctypes.c_void_p
         self.projectm_lib.projectm_destroy.argtypes = [ctypes.c_void_p]
@@ -78,6 +130,12 @@ class ProjectMWrapper:
         self.projectm_lib.projectm_pcm_add_float.restype = None
         self.projectm_lib.projectm_set_texture_search_paths.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.POINTER(ctypes.c_char_p)), ctypes.c_int]
         self.projectm_lib.projectm_set_texture_search_paths.restype = None
+        self.projectm_lib.projectm_load_preset_file.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_bool]
+        self.projectm_lib.projectm_load_preset_file.restype = None
+        self.projectm_lib.projectm_load_preset_data.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_bool]
+        self.projectm_lib.projectm_load_preset_data.restype = None
+        self.projectm_lib.projectm_set_preset_switch_requested_event_callback.argtypes = [ctypes.c_void_p, PresetSwitchRequestedCallback, ctypes.c_void_p]
+        self.projectm_lib.projectm_set_preset_switch_failed_event_callback.argtypes = [ctypes.c_void_p, CorePresetSwitchFailedCallback, ctypes.c_void_p]
 
         # Future user sprites feature
         # self.projectm_lib.projectm_sprite_create.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
@@ -105,8 +163,8 @@ class ProjectMWrapper:
         self.projectm_playlist_lib.projectm_playlist_get_shuffle.argtypes = [ctypes.c_void_p]
         self.projectm_playlist_lib.projectm_playlist_get_shuffle.restype = ctypes.c_bool
         self.projectm_playlist_lib.projectm_playlist_item.argtypes = [ctypes.c_void_p, ctypes.c_uint]
-        self.projectm_playlist_lib.projectm_playlist_item.restype = ctypes.c_char_p
-        self.projectm_playlist_lib.projectm_playlist_free_string.argtypes = [ctypes.c_char_p]
+        self.projectm_playlist_lib.projectm_playlist_item.restype = ctypes.c_void_p
+        self.projectm_playlist_lib.projectm_playlist_free_string.argtypes = [ctypes.c_void_p]
         self.projectm_playlist_lib.projectm_playlist_free_string.restype = None
         self.projectm_playlist_lib.projectm_playlist_set_preset_switched_event_callback.argtypes = [ctypes.c_void_p, PresetSwitchedCallback, ctypes.c_void_p]
         self.projectm_playlist_lib.projectm_playlist_set_preset_switch_failed_event_callback.argtypes = [ctypes.c_void_p, PresetSwitchFailedCallback, ctypes.c_void_p]
@@ -131,18 +189,53 @@ class ProjectMWrapper:
             self.projectm_lib.projectm_set_preset_locked(self.projectm, self.config.projectm.get("projectm.presetlocked", False))
             self.projectm_lib.projectm_set_preset_duration(self.projectm, self.config.projectm.get("projectm.displayduration", 60))
             self.projectm_lib.projectm_set_soft_cut_duration(self.projectm, self.config.projectm.get("projectm.transitionduration", 0))
+            if self.config.projectm.get("projectm.transitionpolicyenabled", False):
+                self.transition_policy = TransitionPolicy(
+                    self.config.projectm.get("projectm.transitionduration", 0),
+                    self.config.projectm.get("projectm.fps", 60),
+                    self.config.projectm.get("projectm.transitionminduration", 0.5),
+                    self.config.projectm.get("projectm.transitionframebudget", 0.85)
+                    )
             self.projectm_lib.projectm_set_hard_cut_enabled(self.projectm, self.config.projectm.get("projectm.hardcutsenabled", True))
             self.projectm_lib.projectm_set_hard_cut_duration(self.projectm, self.config.projectm.get("projectm.hardcutduration", 30))
             self.projectm_lib.projectm_set_hard_cut_sensitivity(self.projectm, float(self.config.projectm.get("projectm.hardcutsensitivity", 2)))
             self.projectm_lib.projectm_set_beat_sensitivity(self.projectm, float(self.config.projectm.get("projectm.beatsensitivity", 2)))
 
-            self.projectm_playlist = self.projectm_playlist_lib.projectm_playlist_create(self.projectm)
-            if not self.projectm_playlist:
-                log.error("Failed to create the projectM preset playlist manager instance.")
-                raise RuntimeError("Playlist initialization failed")
+            preset_path_index = 0
+            while True:
+                config_key = 'projectm.presetpath'
+                if preset_path_index > 0:
+                    config_key += '.{}'.format(preset_path_index)
 
-            # self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, self.config.projectm.get("projectm.shuffleenabled", False))
-            self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, False)
+                if self.config.projectm.get(config_key, None):
+                    log.info('Adding preset path {} {}'.format(config_key, self.config.projectm.get(config_key)))
+                    self.preset_paths.append(self.config.projectm.get(config_key))
+
+                else:
+                    break
+
+                preset_path_index += 1
+
+            # Archive preset packs are loaded as in-memory data which libprojectM-playlist does not support
+            archive_paths = [preset_path for preset_path in self.preset_paths if PresetArchive.is_archive(preset_path)]
+            if archive_paths:
+                self.preset_paths = [preset_path for preset_path in self.preset_paths if preset_path not in archive_paths]
+                if self.playlist_engine != 'native':
+                    log.warning('Preset archives require the native playlist engine; switching playlist engines')
+                    self.playlist_engine = 'native'
+
+            if self.playlist_engine == 'native':
+                log.info('Using the native preset playlist engine')
+                self.preset_playlist = PresetPlaylist(shuffle=self.config.projectm.get("projectm.shuffleenabled", False))
+
+            else:
+                self.projectm_playlist = self.projectm_playlist_lib.projectm_playlist_create(self.projectm)
+                if not self.projectm_playlist:
+                    log.error("Failed to create the projectM preset playlist manager instance.")
+                    raise RuntimeError("Playlist initialization failed")
+
+                # self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, self.config.projectm.get("projectm.shuffleenabled", False))
+                self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, False)
 
             texture_path_index = 0
             while True:
@@ -159,87 +252,181 @@ class ProjectMWrapper:
 
                 texture_path_index += 1
 
-            if self.texture_paths:
-                texture_path_list = [ctypes.create_string_buffer(path.encode('utf-8')) for path in self.texture_paths]
+            # Register the downscaled texture mirror in place of the original texture paths
+            self.texture_search_paths = self.texture_paths
+            if self.texture_paths and self.config.projectm.get("projectm.texturepreprocessenabled", False):
+                self.texture_search_paths = TexturePreprocessor.from_config(self.config, self.texture_paths).run()
+
+            if self.texture_search_paths:
+                texture_path_list = [ctypes.create_string_buffer(path.encode('utf-8')) for path in self.texture_search_paths]
                 texture_path_array = (ctypes.POINTER(ctypes.c_char_p) * len(texture_path_list))()
 
                 for i, path in enumerate(texture_path_list):
                     texture_path_array[i] = ctypes.cast(ctypes.pointer(path), ctypes.POINTER(ctypes.c_char_p))
 
-                self.projectm_lib.projectm_set_texture_search_paths(self.projectm, texture_path_array, len(self.texture_paths))
+                self.projectm_lib.projectm_set_texture_search_paths(self.projectm, texture_path_array, len(self.texture_search_paths))
 
-            preset_path_index = 0
-            while True:
-                config_key = 'projectm.presetpath'
-                if preset_path_index > 0:
-                    config_key += '.{}'.format(preset_path_index)
+            if self.config.projectm.get("projectm.presetprefetchenabled", False):
+                memory_cap = self.config.projectm.get("projectm.presetprefetchmemorycap", 64)
+                self.preset_prefetcher = PresetPrefetcher(self.texture_search_paths, int(memory_cap * 1024 * 1024))
+                self.preset_prefetcher.start()
 
-                if self.config.projectm.get(config_key, None):
-                    log.info('Adding preset path {} {}'.format(config_key, self.config.projectm.get(config_key)))
-                    self.preset_paths.append(self.config.projectm.get(config_key))
+            # Collapse duplicate presets before they reach the playlist
+            unique_presets = None
+            if self.config.projectm.get("projectm.presetdedupenabled", False):
+                unique_presets = self.deduplicate_presets()
 
+            # The native engine shuffles with a real history so the preset renaming is not required
+            if self.config.projectm.get("projectm.shuffleenabled", False) and self.preset_playlist is None:
+                log.info(f'Randomizing preset indexes for shuffle mode...')
+                if unique_presets is not None:
+                    presets = list(unique_presets)
                 else:
-                    break
-
-                preset_path_index += 1
+                    presets = list()
+                    for preset_path in self.preset_paths:
+                        for root, dirs, files in os.walk(preset_path):
+                            for name in files:
+                                preset_path = os.path.join(root, name)
+                                if not preset_path in presets:
+                                    presets.append(preset_path)
 
-            if self.config.projectm.get("projectm.shuffleenabled", False):
-                log.info(f'Randomizing preset indexes for shuffle mode...')
-                presets = list()
+                random.shuffle(presets)
+                renamed_presets = self.create_indexed_presets(presets)
+                if unique_presets is not None:
+                    unique_presets = renamed_presets
+
+            if unique_presets is not None:
+                log.info(f'Adding {len(unique_presets)} unique presets')
+                for preset_path in unique_presets:
+                    self.add_preset(preset_path)
+            else:
                 for preset_path in self.preset_paths:
-                    for root, dirs, files in os.walk(preset_path):
-                        for name in files:
-                            preset_path = os.path.join(root, name)
-                            if not preset_path in presets:
-                                presets.append(preset_path)
+                    if os.path.isfile(preset_path):
+                        self.add_preset(preset_path)
+                    else:
+                        log.info(f'Adding preset path {preset_path}')
+                        self.add_preset_path(preset_path)
 
-                random.shuffle(presets)
-                self.create_indexed_presets(presets)
+            for archive_path in archive_paths:
+                self.add_preset_archive(archive_path)
 
-            for preset_path in self.preset_paths:
-                if os.path.isfile(preset_path):
-                    self.projectm_playlist_lib.projectm_playlist_add_preset(self.projectm_playlist, preset_path.encode(), False)
-                else:
-                    log.info(f'Adding preset path {preset_path}')
-                    self.projectm_playlist_lib.projectm_playlist_add_path(self.projectm_playlist, preset_path.encode(), True, False)
+            self.sort_presets()
+            self.build_search_index()
 
-            # Sorting constants
-            size = self.projectm_playlist_lib.projectm_playlist_size(self.projectm_playlist)
-            self.projectm_playlist_lib.projectm_playlist_sort(
-                self.projectm_playlist, 0, size, 
-                SORT_PREDICATE_FILENAME_ONLY, SORT_ORDER_ASCENDING
-            )
+            if self.config.projectm.get("projectm.weightedselectionenabled", False):
+                self.preset_selector = self.create_preset_selector()
 
             # Setup callback and userdata
-            self._preset_switched_event_callback = on_preset_switched
-            self._preset_switch_failed_event_callback = on_preset_switch_failed
-        
             user_data = ctypes.py_object(self)
             self._user_data_ptr = ctypes.cast(ctypes.pointer(user_data), ctypes.c_void_p)
 
-            # Register the preset event callbacks
-            self.projectm_playlist_lib.projectm_playlist_set_preset_switched_event_callback(
-                self.projectm_playlist,
-                self._preset_switched_event_callback,
-                self._user_data_ptr
-            )
+            if self.preset_playlist is not None:
+                self._preset_switch_requested_event_callback = on_preset_switch_requested
+                self._preset_switch_failed_event_callback = on_core_preset_switch_failed
 
-            self.projectm_playlist_lib.projectm_playlist_set_preset_switch_failed_event_callback(
-                self.projectm_playlist,
-                self._preset_switch_failed_event_callback,
-                self._user_data_ptr
-            )
+                # Register the projectM core preset event callbacks
+                self.projectm_lib.projectm_set_preset_switch_requested_event_callback(
+                    self.projectm,
+                    self._preset_switch_requested_event_callback,
+                    self._user_data_ptr
+                )
+
+                self.projectm_lib.projectm_set_preset_switch_failed_event_callback(
+                    self.projectm,
+                    self._preset_switch_failed_event_callback,
+                    self._user_data_ptr
+                )
+
+            else:
+                self._preset_switched_event_callback = on_preset_switched
+                self._preset_switch_failed_event_callback = on_preset_switch_failed
+
+                # Route projectM's automatic preset switches through next_preset so the weighted selector
+                # and transition policy apply to them as well
+                if self.preset_selector is not None or self.transition_policy is not None:
+                    self._preset_switch_requested_event_callback = on_preset_switch_requested
+                    self.projectm_lib.projectm_set_preset_switch_requested_event_callback(
+                        self.projectm,
+                        self._preset_switch_requested_event_callback,
+                        self._user_data_ptr
+                    )
+
+                # Register the preset event callbacks
+                self.projectm_playlist_lib.projectm_playlist_set_preset_switched_event_callback(
+                    self.projectm_playlist,
+                    self._preset_switched_event_callback,
+                    self._user_data_ptr
+                )
+
+                self.projectm_playlist_lib.projectm_playlist_set_preset_switch_failed_event_callback(
+                    self.projectm_playlist,
+                    self._preset_switch_failed_event_callback,
+                    self._user_data_ptr
+                )
 
     def __del__(self):
+        if self.preset_prefetcher:
+            self.preset_prefetcher.stop()
+            self.preset_prefetcher = None
+        if self.preset_file_worker:
+            self.preset_file_worker.stop()
+            self.preset_file_worker = None
         if self.projectm:
             self.projectm_lib.projectm_destroy(self.projectm)
             self.projectm = None
         if self.projectm_playlist:
             self.projectm_playlist_lib.projectm_playlist_destroy(self.projectm_playlist)
             self.projectm_playlist = None
+        for archive in self.preset_archives.values():
+            archive.close()
+        self.preset_archives = dict()
+
+    """Deduplicate the presets in the configured preset paths.
+    Duplicates are optionally moved to the preset backup path, otherwise they are only left out of the playlist.
+    @returns a list of the unique preset files
+    """
+    def deduplicate_presets(self):
+        log.info('Deduplicating presets...')
+        deduplicator = PresetDeduplicator(
+            self.preset_paths,
+            self.config.projectm.get('projectm.presetdedupcachepath', os.path.join(APP_ROOT, 'preset_dedup_cache.json'))
+            )
 
-    """Create indexed presets by renaming them with a six-digit index"""
+        unique_presets, duplicates = deduplicator.scan()
+
+        report_path = self.config.projectm.get('projectm.presetdedupreportpath', os.path.join(APP_ROOT, 'preset_dedup_report.json'))
+        if report_path:
+            deduplicator.write_report(report_path, duplicates)
+
+        if duplicates and self.config.projectm.get('projectm.presetdedupbackupenabled', False):
+            deduplicator.backup_duplicates(duplicates, self.get_backup_path, self.preset_file_worker.backup)
+
+        return unique_presets
+
+    """Get the backup location for a preset within the preset backup path.
+    @param preset_name: the full path of the preset
+    @returns the backup path or None if the preset is not within a preset path
+    """
+    def get_backup_path(self, preset_name):
+        backup_path = self.config.projectm.get('projectm.presetdeletebachuppath', '/opt/ProjectMAR/preset_backup')
+
+        for preset_path in self.preset_paths:
+            if preset_name.startswith(preset_path):
+                return preset_name.replace(preset_path, backup_path)
+
+        return None
+
+    """Create indexed presets by renaming them with a six-digit index
+    @returns a list of the renamed preset paths
+    """
     def create_indexed_presets(self, presets):
+        renamed = list()
+        failed = dict()
+
+        def on_renamed(operation, error):
+            if error:
+                failed[operation.args[1]] = operation.args[0]
+
         for index, preset in enumerate(presets, start=1):
             idx_pad = f"{index:06}"
             preset_root, preset_name = preset.rsplit('/', 1)
@@ -248,36 +435,338 @@ class ProjectMWrapper:
             else:
                 preset_name_stripped = preset_name.split(' ', 1)[1]
             dst = os.path.join(preset_root, f"{idx_pad} {preset_name_stripped}")
-            try:
-                os.rename(preset, dst)
-            except Exception as e:
-                log.error(f'Failed to rename preset {preset}: {e}')
+            self.preset_file_worker.rename(preset, dst, on_complete=on_renamed)
+            renamed.append(dst)
+
+        # The playlist is built from the renamed presets so wait for the renames to land
+        self.preset_file_worker.flush()
+
+        return [failed.get(preset, preset) for preset in renamed]
+
+    """Add a single preset to the playlist.
+    @param preset_path: the preset file path
+    """
+    def add_preset(self, preset_path):
+        if self.preset_playlist is not None:
+            self.preset_playlist.add_preset(preset_path)
+        else:
+            self.projectm_playlist_lib.projectm_playlist_add_preset(self.projectm_playlist, preset_path.encode(), False)
+
+    """Recursively add a preset directory to the playlist.
+    @param preset_path: the preset directory
+    """
+    def add_preset_path(self, preset_path):
+        if self.preset_playlist is not None:
+            self.preset_playlist.add_path(preset_path, recursive=True)
+        else:
+            self.projectm_playlist_lib.projectm_playlist_add_path(self.projectm_playlist, preset_path.encode(), True, False)
+
+    """Add the presets of a memory-mapped preset archive to the playlist.
+    @param archive_path: the archive file path
+    """
+    def add_preset_archive(self, archive_path):
+        archive = PresetArchive(archive_path)
+        try:
+            archive.open()
+        except (OSError, ValueError) as e:
+            log.error(f'Failed to open preset archive {archive_path}: {e}')
+            return
+
+        self.preset_archives[archive.path] = archive
+        for name in archive.names():
+            self.preset_playlist.add_preset(archive.get_member_path(name))
+
+        log.info(f'Added {len(archive.names())} presets from archive {archive_path}')
+
+    """Get the archive containing a preset.
+    @param preset: the playlist preset path
+    @returns a tuple of the PresetArchive and the preset name within it, or (None, None) for preset files
+    """
+    def get_preset_archive(self, preset):
+        for archive_path, archive in self.preset_archives.items():
+            if preset.startswith(archive_path + os.sep):
+                return archive, preset[len(archive_path) + 1:]
+
+        return None, None
+
+    """Sort the playlist by preset filename"""
+    def sort_presets(self):
+        if self.preset_playlist is not None:
+            self.preset_playlist.sort()
+        else:
+            # Sorting constants
+            size = self.projectm_playlist_lib.projectm_playlist_size(self.projectm_playlist)
+            self.projectm_playlist_lib.projectm_playlist_sort(
+                self.projectm_playlist, 0, size, 
+                SORT_PREDICATE_FILENAME_ONLY, SORT_ORDER_ASCENDING
+            )
+
+    """Get the number of playlist entries"""
+    def get_playlist_size(self):
+        if self.preset_playlist is not None:
+            return len(self.preset_playlist)
+
+        return self.projectm_playlist_lib.projectm_playlist_size(self.projectm_playlist)
+
+    """Load a preset from the native playlist, skipping ahead if projectM fails to load it.
+    @param index: the playlist index to load
+    @param softcut: whether to transition with a soft cut
+    """
+    def load_preset(self, index, softcut=True):
+        attempts = 0
+        while index is not None:
+            preset = self.preset_playlist.item(index)
+
+            self._preset_load_failed = False
+            self._loading_preset_index = index
+            # The requested cut is kept so a hard cut chosen for one attempt does not carry over to retries
+            cut = self.get_transition(softcut, index)
+            archive, name = self.get_preset_archive(preset)
+            if archive:
+                try:
+                    self.projectm_lib.projectm_load_preset_data(self.projectm, archive.read(name), cut)
+                except (OSError, ValueError, zlib.error) as e:
+                    log.error(f'Failed to read preset {name} from archive {archive.path}: {e}')
+                    self._preset_load_failed = True
+            else:
+                self.projectm_lib.projectm_load_preset_file(self.projectm, preset.encode(), cut)
+
+            if not self._preset_load_failed:
+                self.on_preset_switched(not cut, index)
+                return
+
+            attempts += 1
+            if attempts >= min(MAX_PRESET_LOAD_ATTEMPTS, self.preset_playlist.count):
+                log.error(f'Giving up loading presets after {attempts} consecutive failures')
+                return
+
+            index = self.get_next_native_index()
+
+    """Get the next native playlist index, drawing from the weighted selector when enabled"""
+    def get_next_native_index(self):
+        if self.preset_selector is not None:
+            index = self.preset_selector.sample(exclude=self.preset_playlist.position)
+            if index is not None:
+                return self.preset_playlist.jump(index)
+
+        return self.preset_playlist.next()
+
+    """Handle a preset switch requested by projectM (native playlist engine or weighted selection).
+    @param is_hard_cut: whether projectM requested a hard cut
+    """
+    def on_preset_switch_requested(self, is_hard_cut: bool):
+        self.next_preset(softcut=not is_hard_cut)
 
     def on_preset_switched(self, is_hard_cut: bool, index: int):
-        name_ptr = self.projectm_playlist_lib.projectm_playlist_item(self.projectm_playlist, index)
-        self.current_preset = ctypes.string_at(name_ptr).decode("utf-8")
+        self.update_preset_cost_weight()
+
+        self.current_preset = self.get_preset_item(index)
+        self.current_preset_index = index
         self.current_preset_start = time.time()
         log.info(f"[{is_hard_cut=}] Preset switched to: {self.current_preset}")
 
         if self.config.projectm.get("window.displaypresetnameintitle", True):
             self.sdl_rendering.set_sdl_window_title(self.current_preset.rsplit('/', 1)[1].encode())
 
+        if self.transition_policy:
+            self.transition_policy.on_preset_switched(self.current_preset, is_hard_cut)
+            log.debug(f'Transition policy stats: {self.transition_policy.get_stats()}')
+
+        if self.preset_prefetcher:
+            self.preset_prefetcher.record_access(self.current_preset)
+            self.prefetch_upcoming_presets(index)
+
+    """Weight the outgoing preset by the render cost measured while it was displayed"""
+    def update_preset_cost_weight(self):
+        if self.preset_selector is None or self.transition_policy is None or self.current_preset_index is None:
+            return
+
+        if self.current_preset_index < len(self.preset_selector):
+            factor = self.transition_policy.get_selection_factor(
+                self.current_preset,
+                self.config.projectm.get("projectm.presetcostweightmin", 0.1)
+                )
+            self.preset_selector.set_cost_factor(self.current_preset_index, factor)
+
+    """Request the presets following the given playlist index to be prefetched.
+    @param index: the current playlist index
+    """
+    def prefetch_upcoming_presets(self, index):
+        # libprojectM shuffle picks presets at random so the upcoming presets are unknown
+        if self.preset_playlist is None and self.get_preset_shuffle():
+            return
+
+        size = self.get_playlist_size()
+        count = min(self.config.projectm.get("projectm.presetprefetchcount", 3), size - 1)
+
+        try:
+            if self.preset_playlist is not None:
+                upcoming = [self.get_preset_item(upcoming_index) for upcoming_index in self.preset_playlist.upcoming(count)]
+            else:
+                upcoming = [self.get_preset_item((index + offset) % size) for offset in range(1, count + 1)]
+        except IndexError as e:
+            log.debug(f'Unable to determine upcoming presets: {e}')
+            return
+
+        # Archived presets are already mapped so the kernel is only advised to read them ahead
+        preset_files = list()
+        for preset in upcoming:
+            archive, name = self.get_preset_archive(preset)
+            if archive:
+                archive.advise(name)
+            else:
+                preset_files.append(preset)
+
+        self.preset_prefetcher.prefetch(preset_files)
+        log.debug(f'Preset prefetch stats: {self.preset_prefetcher.get_stats()}')
+
     def on_preset_switch_failed(self, error_msg: str):
+        self._preset_load_failed = True
+
+        # Presets that fail to load become less likely to be selected again
+        if self.preset_selector is not None:
+            index = self._loading_preset_index if self.preset_playlist is not None else self.get_active_preset_index()
+            if index is not None and index < len(self.preset_selector):
+                self.preset_selector.scale_weight(index, self.config.projectm.get("projectm.presetfailurepenalty", 0.25))
+
         error_string = ctypes.string_at(error_msg).decode("utf-8")
         log.error(f'Failed to switch preset with error {error_string}')
 
     def get_active_preset_index(self):
+        if self.preset_playlist is not None:
+            return self.preset_playlist.position
+
         return self.projectm_playlist_lib.projectm_playlist_get_position(self.projectm_playlist)
 
     def get_preset_item(self, index):
-        item = self.projectm_playlist_lib.projectm_playlist_item(self.projectm_playlist, index)
-        if not item:
+        if self.preset_playlist is not None:
+            item = self.preset_playlist.item(index)
+            if not item:
+                raise IndexError(f"Item at index {index} has been removed from the playlist")
+
+            return item
+
+        # The playlist returns an allocated copy of the path which must be released
+        item_ptr = self.projectm_playlist_lib.projectm_playlist_item(self.projectm_playlist, index)
+        if not item_ptr:
             raise IndexError(f"Item at index {index} does not exist in the playlist")
 
-        return item.decode('utf-8')
+        try:
+            return ctypes.string_at(item_ptr).decode('utf-8')
+        finally:
+            self.projectm_playlist_lib.projectm_playlist_free_string(item_ptr)
+
+    """Create the weighted preset selector, applying the weights from the preset weights file.
+    The weights file is a JSON object of preset filenames to weights (ie: favorites > 1, disliked < 1, 0 to never select).
+    """
+    def create_preset_selector(self):
+        size = self.get_playlist_size()
+        selector = WeightedPresetSelector(size)
+
+        weights_path = self.config.projectm.get("projectm.presetweightspath", os.path.join(APP_ROOT, 'preset_weights.json'))
+        weights = dict()
+        if weights_path and os.path.isfile(weights_path):
+            try:
+                with open(weights_path, 'r') as infile:
+                    weights = {self.get_preset_weight_key(name): weight for name, weight in json.load(infile).items()}
+            except (OSError, ValueError, AttributeError) as e:
+                log.error(f'Failed to load preset weights from {weights_path}: {e}')
+
+        applied = 0
+        if weights:
+            for index in range(size):
+                try:
+                    weight = weights.get(self.get_preset_weight_key(self.get_preset_item(index)))
+                except IndexError:
+                    continue
+
+                if weight is not None:
+                    selector.set_weight(index, weight)
+                    applied += 1
+
+        log.info(f'Weighted preset selection enabled for {size} presets ({applied} weighted)')
+        return selector
+
+    """Get the weights file key of a preset (the lowercase filename without the shuffle index prefix).
+    @param preset: the preset path or filename
+    """
+    def get_preset_weight_key(self, preset):
+        name = os.path.basename(preset).lower()
+        if re.match(r'^\d{6}\s', name):
+            name = name.split(' ', 1)[1]
+
+        return name
+
+    """Set the selection weight of a preset.
+    @param index: the playlist index
+    @param weight: the new weight (0 to never select the preset)
+    """
+    def set_preset_weight(self, index, weight):
+        if self.preset_selector is not None:
+            self.preset_selector.set_weight(index, weight)
+
+    """Build the preset search index from the playlist"""
+    def build_search_index(self):
+        start = time.time()
+        presets = list()
+        for index in range(self.get_playlist_size()):
+            try:
+                presets.append((index, self.get_preset_item(index)))
+            except IndexError:
+                continue
+
+        self.preset_search_index = PresetSearchIndex()
+        self.preset_search_index.build(presets)
+        log.info(f'Indexed {len(presets)} presets for search in {time.time() - start:.2f}s')
+
+    """Get the preset search index, building it if the playlist has not been indexed yet"""
+    def get_search_index(self):
+        if self.preset_search_index is None:
+            self.build_search_index()
+
+        return self.preset_search_index
+
+    """Search the playlist for presets by name (prefix matches first, then fuzzy matches).
+    @param query: the preset name to search for
+    @param limit: the maximum number of results
+    @returns a list of (playlist index, preset path) tuples, best match first
+    """
+    def search_presets(self, query, limit=10):
+        results = list()
+        for index in self.get_search_index().search(query, limit):
+            try:
+                results.append((index, self.get_preset_item(index)))
+            except IndexError:
+                continue
+
+        return results
+
+    """Switch to the preset best matching a name.
+    @param query: the preset name to search for
+    @param softcut: whether to transition with a soft cut
+    @returns True if a matching preset was found
+    """
+    def jump_to_preset(self, query, softcut=True):
+        results = self.search_presets(query, limit=1)
+        if not results:
+            log.warning(f'No preset found matching {query}')
+            return False
+
+        index, preset = results[0]
+        log.info(f'Jumping to preset {preset} with index {index} for query {query}')
+        self.set_preset_index(index, softcut)
+        return True
 
     def display_initial_preset(self):
         if not self.config.projectm.get("projectm.enablesplash", False):
+            start_preset = self.config.projectm.get("projectm.startpreset", None)
+            if start_preset and self.jump_to_preset(start_preset, softcut=False):
+                return
+
+            if self.preset_playlist is not None:
+                self.next_preset(softcut=False)
+                return
+
             self.projectm_playlist_lib.projectm_playlist_set_position(self.projectm_playlist, 0, True)
 
             # Currently it is best to handle shuffling by creating an index for each preset and randomizing it
@@ -289,51 +778,111 @@ class ProjectMWrapper:
 
     def delete_preset(self, physical=False):
         preset_index = self.get_active_preset_index()
-        if preset_index:
+        if preset_index or (self.preset_playlist is not None and preset_index is not None):
             preset_name = self.get_preset_item(preset_index)
 
             log.info(f'User has requested to delete preset {preset_name} with index {preset_index}')
-            self.projectm_playlist_lib.projectm_playlist_remove_preset(self.projectm_playlist, preset_index)
+            if self.preset_playlist is not None:
+                self.preset_playlist.remove(preset_index)
+                if self.preset_search_index is not None:
+                    self.preset_search_index.remove(preset_index)
+                if self.preset_selector is not None:
+                    self.preset_selector.set_weight(preset_index, 0)
+            else:
+                # libprojectM-playlist shifts the following indexes down one
+                self.projectm_playlist_lib.projectm_playlist_remove_preset(self.projectm_playlist, preset_index)
+                if self.preset_search_index is not None:
+                    self.preset_search_index.remove(preset_index, shift=True)
+                if self.preset_selector is not None:
+                    self.preset_selector.remove(preset_index)
+                self.current_preset_index = None
             
-            try:
-                if physical and self.config.projectm.get("projectm.presetdeletebachupenabled", True):
-                    backup_path = self.config.projectm.get('projectm.presetdeletebachuppath', '/opt/ProjectMAR/preset_backup')
+            # Archived presets can only be left out of the playlist
+            if physical and self.get_preset_archive(preset_name)[0]:
+                log.info(f'Preset {preset_name} is part of an archive and will not be removed from disk')
 
-                    match_path = None
-                    for preset_path in self.preset_paths:
-                        if preset_name.startswith(preset_path):
-                            match_path = preset_path
-                            break
+            # The disk work is queued so slow storage does not block the rendering thread
+            elif physical and self.config.projectm.get("projectm.presetdeletebachupenabled", True):
+                backup_path = self.get_backup_path(preset_name)
 
-                    if match_path:
-                        backup_path = preset_name.replace(match_path, backup_path)
-                        backup_dir = os.path.dirname(backup_path)
-                        os.makedirs(backup_dir, exist_ok=True)
+                if backup_path:
+                    self.preset_file_worker.backup(preset_name, backup_path, on_complete=self.on_preset_file_operation)
 
-                        shutil.move(preset_name, backup_path)
+            elif physical:
+                self.preset_file_worker.delete(preset_name, on_complete=self.on_preset_file_operation)
 
-                elif physical:
-                    os.remove(preset_name)
+            self.next_preset()
 
-            except Exception as e:
-                log.error(f'Failed to delete/backup preset {preset_name} with error: {e}')
+    """Report the completion of a queued preset file operation (failures are logged by the worker).
+    @param operation: the completed PresetFileOperation
+    @param error: the exception raised by the operation, if any
+    """
+    def on_preset_file_operation(self, operation, error):
+        if not error:
+            log.info(f'Completed preset {operation.description} after {time.time() - operation.queued:.2f}s')
+
+    """Choose between a soft and hard cut for a preset switch using the transition policy.
+    The soft cut duration is updated in projectM before the switch is made.
+    @param softcut: whether a soft cut was requested
+    @param index: the playlist index being switched to, if known
+    @returns whether to perform a soft cut
+    """
+    def get_transition(self, softcut, index=None):
+        if not softcut or not self.transition_policy:
+            return softcut
+
+        incoming = None
+        if index is not None:
+            try:
+                incoming = self.get_preset_item(index)
+            except IndexError:
+                pass
 
-            self.next_preset()
+        duration = self.transition_policy.get_transition_duration(self.current_preset, incoming)
+        self.projectm_lib.projectm_set_soft_cut_duration(self.projectm, duration)
+        return duration > 0
 
     def next_preset(self, softcut=True):
-        self.projectm_playlist_lib.projectm_playlist_play_next(self.projectm_playlist, softcut)
+        if self.preset_playlist is not None:
+            self.load_preset(self.get_next_native_index(), softcut)
+            return
+
+        if self.preset_selector is not None:
+            index = self.preset_selector.sample(exclude=self.get_active_preset_index())
+            if index is not None:
+                self.set_preset_index(index, softcut)
+                return
+
+        self.projectm_playlist_lib.projectm_playlist_play_next(self.projectm_playlist, self.get_transition(softcut))
 
     def previous_preset(self, softcut=True):
-        self.projectm_playlist_lib.projectm_playlist_play_previous(self.projectm_playlist, softcut)
+        if self.preset_playlist is not None:
+            index = self.preset_playlist.previous()
+            if index is None:
+                log.debug('There is no previous preset in the playlist history')
+                return
+
+            self.load_preset(index, softcut)
+        else:
+            self.projectm_playlist_lib.projectm_playlist_play_previous(self.projectm_playlist, self.get_transition(softcut))
 
     def set_preset_index(self, index, softcut=True):
-        self.projectm_playlist_lib.projectm_playlist_set_position(self.projectm_playlist, index, softcut)
+        if self.preset_playlist is not None:
+            self.load_preset(self.preset_playlist.jump(index), softcut)
+        else:
+            self.projectm_playlist_lib.projectm_playlist_set_position(self.projectm_playlist, index, self.get_transition(softcut, index))
 
     def get_preset_shuffle(self):
+        if self.preset_playlist is not None:
+            return self.preset_playlist.shuffle
+
         return self.projectm_playlist_lib.projectm_playlist_get_shuffle(self.projectm_playlist)
 
     def shuffle_playlist(self, shuffle):
-        self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, shuffle)
+        if self.preset_playlist is not None:
+            self.preset_playlist.set_shuffle(shuffle)
+        else:
+            self.projectm_playlist_lib.projectm_playlist_set_shuffle(self.projectm_playlist, shuffle)
 
     def get_preset_locked(self):
         return self.projectm_lib.projectm_get_preset_locked(self.projectm)
@@ -362,12 +911,25 @@ class ProjectMWrapper:
         samples = np.ascontiguousarray(samples, dtype=np.float32)
         ptr = samples.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
 
-        self.projectm_lib.projectm_pcm_add_float(
-            self.projectm, ptr, frame_count, channels
-        )
+        with self._pcm_lock:
+            self.projectm_lib.projectm_pcm_add_float(
+                self.projectm, ptr, frame_count, channels
+            )
 
     def render_frame(self):
+        if not self.transition_policy:
+            self.projectm_lib.projectm_opengl_render_frame(self.projectm)
+            return
+
+        # Created on the render thread as the timer needs the GL context
+        if self.frame_timer is None:
+            self.frame_timer = GPUFrameTimer()
+
+        self.frame_timer.begin()
         self.projectm_lib.projectm_opengl_render_frame(self.projectm)
+        frame_time = self.frame_timer.end()
+        if frame_time is not None:
+            self.transition_policy.record_frame(frame_time)
 
     def target_fps(self):
         return self.config.projectm.get("projectm.fps", 60)
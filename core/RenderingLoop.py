@@ -51,12 +51,19 @@ class RenderingLoop:
 
         if self.config.audio_ctrl.get('audio_listener_enabled', False):
             handler = PhysicalMediaCtrl(self.thread_event, self.config)
+            handler.set_pcm_consumer(self.projectm_wrapper.add_pcm)
+            handler.set_direct_capture(self.audio_capture.direct_capture)
             handler.start()
             self.ctrl_threads.append(handler)
 
         for config_key, ControllerClass in self.CONTROLLER_REGISTRY:
             if self.config.general.get(config_key, False):
                 handler = ControllerClass(self.thread_event, self.config)
+                if config_key == 'plugin_ctrl':
+                    handler.set_pcm_consumer(self.projectm_wrapper.add_pcm)
+                elif config_key == 'audio_ctrl':
+                    handler.set_direct_capture(self.audio_capture.direct_capture)
+
                 handler.start()
                 self.ctrl_threads.append(handler)
 
@@ -0,0 +1,211 @@
+import logging
+import os
+import shutil
+
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger()
+
+PIL_INSTALLED = False
+try:
+    from PIL import Image
+    PIL_INSTALLED = True
+except ImportError:
+    pass
+
+TEXTURE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tga', '.bmp', '.dds')
+
+# Formats Pillow is able to decode and normalize; anything else is mirrored as-is
+CONVERTIBLE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tga', '.bmp')
+NORMALIZED_EXTENSIONS = ('.jpg', '.png')
+
+"""Get the largest power of two that does not exceed a value.
+@param value: a positive integer
+"""
+def pow2_floor(value):
+    return 1 << (max(int(value), 1).bit_length() - 1)
+
+"""Get the smallest power of two that is not less than a value.
+@param value: a positive integer
+"""
+def pow2_ceil(value):
+    return 1 << (max(int(value), 1) - 1).bit_length()
+
+"""Downscale and normalize a single texture into the mirror.
+Textures with transparency are written as PNG, everything else as JPEG.  The mirrored file
+carries the mtime of its source so unchanged textures are skipped on the next run.
+@param src: the source texture path
+@param dst_base: the mirror path without a file extension
+@param max_size: the maximum width/height of the mirrored texture
+@returns the mirrored texture path
+"""
+def process_texture(src, dst_base, max_size):
+    src_mtime = os.stat(src).st_mtime
+    ext = os.path.splitext(src)[1].lower()
+
+    if ext in CONVERTIBLE_EXTENSIONS:
+        with Image.open(src) as image:
+            image.load()
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+            width, height = image.size
+            size = (pow2_floor(min(width, max_size)), pow2_floor(min(height, max_size)))
+            if size != image.size:
+                image = image.resize(size, Image.LANCZOS)
+
+            dst = dst_base + ('.png' if has_alpha else '.jpg')
+            tmp = dst + '.tmp'
+            if has_alpha:
+                image.save(tmp, format='PNG')
+            else:
+                image.save(tmp, format='JPEG', quality=90)
+
+        os.replace(tmp, dst)
+    else:
+        dst = dst_base + ext
+        shutil.copyfile(src, dst)
+
+    os.utime(dst, (src_mtime, src_mtime))
+    return dst
+
+class TexturePreprocessor:
+    """Build a downscaled, power-of-two, format-normalized mirror of the texture search paths.
+    @param texture_paths: the configured texture search paths
+    @param cache_path: the root directory of the texture mirror
+    @param max_size: the maximum width/height of a mirrored texture
+    @param workers: the number of parallel workers (defaults to the CPU count)
+    """
+    def __init__(self, texture_paths, cache_path, max_size, workers=None):
+        self.texture_paths  = texture_paths
+        self.cache_path     = cache_path
+        self.max_size       = max_size
+        self.workers        = workers or os.cpu_count() or 1
+
+    """Create a texture preprocessor from the projectM configuration.
+    The maximum texture size defaults to the power of two covering the fullscreen resolution.
+    @param config: the projectMAR configuration
+    @param texture_paths: the configured texture search paths
+    """
+    @classmethod
+    def from_config(cls, config, texture_paths):
+        max_size = config.projectm.get('projectm.texturepreprocessmaxsize', 0)
+        if not max_size:
+            max_size = pow2_ceil(max(
+                config.projectm.get('window.fullscreen.width', 1280),
+                config.projectm.get('window.fullscreen.height', 720)
+                ))
+
+        return cls(
+            texture_paths,
+            config.projectm.get('projectm.texturecachepath', '/opt/ProjectMAR/texture_cache'),
+            max_size,
+            config.projectm.get('projectm.texturepreprocessworkers', 0)
+            )
+
+    """Get the mirror directory for a texture search path.
+    @param index: the index of the texture search path
+    """
+    def get_mirror_path(self, index):
+        return os.path.join(self.cache_path, str(index))
+
+    """Check whether a mirrored texture is up-to-date with its source.
+    @param src: the source texture path
+    @param dst_base: the mirror path without a file extension
+    @returns the mirrored texture path if current, otherwise None
+    """
+    def _get_current_mirror(self, src, dst_base):
+        src_mtime = os.stat(src).st_mtime
+        for ext in NORMALIZED_EXTENSIONS + (os.path.splitext(src)[1].lower(),):
+            dst = dst_base + ext
+            if os.path.exists(dst) and os.stat(dst).st_mtime == src_mtime:
+                return dst
+
+        return None
+
+    """Remove mirrored files that no longer have a source texture and any directories left empty.
+    @param mirror_path: the mirror directory
+    @param current: the set of mirrored files produced by this run
+    """
+    def _remove_stale(self, mirror_path, current):
+        removed = 0
+        for root, dirs, files in os.walk(mirror_path, topdown=False):
+            for name in files:
+                path = os.path.join(root, name)
+                if path not in current:
+                    os.remove(path)
+                    removed += 1
+
+            if root != mirror_path and not os.listdir(root):
+                os.rmdir(root)
+
+        return removed
+
+    """Preprocess all texture search paths, only processing new or modified textures.
+    @returns a list of the mirrored texture search paths
+    """
+    def run(self):
+        if not PIL_INSTALLED:
+            log.warning('Skipping texture preprocessing as Pillow is not installed')
+            return list(self.texture_paths)
+
+        log.info(f'Preprocessing textures into {self.cache_path} (max size {self.max_size}, {self.workers} workers)')
+
+        mirror_paths = list()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for index, texture_path in enumerate(self.texture_paths):
+                mirror_path = self.get_mirror_path(index)
+                jobs = dict()
+                current = set()
+                skipped = 0
+
+                for root, dirs, files in os.walk(texture_path):
+                    mirror_root = os.path.normpath(os.path.join(mirror_path, os.path.relpath(root, texture_path)))
+                    os.makedirs(mirror_root, exist_ok=True)
+
+                    # Textures are looked up by name, so foo.tga and foo.jpg would share a mirror; keep the first
+                    stems = dict()
+                    for name in sorted(files):
+                        stem, ext = os.path.splitext(name)
+                        if ext.lower() not in TEXTURE_EXTENSIONS:
+                            continue
+
+                        if stem.lower() in stems:
+                            log.warning(f'Skipping texture {os.path.join(root, name)} as it has the same name as {stems[stem.lower()]}')
+                            continue
+                        stems[stem.lower()] = name
+
+                        src = os.path.join(root, name)
+                        dst_base = os.path.join(mirror_root, stem)
+
+                        dst = self._get_current_mirror(src, dst_base)
+                        if dst:
+                            current.add(dst)
+                            skipped += 1
+                        else:
+                            jobs[executor.submit(process_texture, src, dst_base, self.max_size)] = (src, dst_base)
+
+                failed = 0
+                for job, (src, dst_base) in jobs.items():
+                    try:
+                        current.add(job.result())
+                    except Exception as e:
+                        # Mirror the original so presets referencing it still resolve
+                        log.error(f'Failed to preprocess texture {src}: {e}')
+                        dst = dst_base + os.path.splitext(src)[1].lower()
+                        try:
+                            shutil.copy2(src, dst)
+                            current.add(dst)
+                        except OSError:
+                            pass
+                        failed += 1
+
+                removed = self._remove_stale(mirror_path, current)
+                log.info(
+                    f'Texture path {texture_path}: {len(jobs) - failed} processed, {skipped} unchanged, '
+                    f'{failed} failed, {removed} stale removed'
+                    )
+
+                mirror_paths.append(mirror_path)
+
+        return mirror_paths
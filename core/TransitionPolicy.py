@@ -0,0 +1,228 @@
+import logging
+import time
+
+from collections import OrderedDict, deque
+
+from OpenGL import GL
+
+log = logging.getLogger()
+
+class GPUFrameTimer:
+    """Measure the GPU time of projectM's frame rendering.
+    GL is asynchronous, so timing the render call on the CPU only measures command submission.
+    GL_TIME_ELAPSED queries are used where the driver reports timer bits and read back a few
+    frames later without stalling; otherwise (or once a query fails) every sync_interval frames
+    the pipeline is drained with glFinish around the render call so that frame's full cost is
+    measured.
+    @param query_count: the number of timer queries in flight
+    @param sync_interval: the frames between synchronized measurements when queries are unavailable
+    """
+    def __init__(self, query_count=4, sync_interval=10):
+        self.sync_interval  = sync_interval
+
+        self.frames         = 0
+
+        self._free          = deque()
+        self._pending       = deque()
+        self._active        = None
+        self._start         = None
+
+        try:
+            # glGenQueries succeeds on drivers without GL_TIME_ELAPSED (ie: V3D), the counter bits do not
+            bits = (GL.GLint * 1)()
+            GL.glGetQueryiv(GL.GL_TIME_ELAPSED, GL.GL_QUERY_COUNTER_BITS, bits)
+            if bits[0] <= 0:
+                raise RuntimeError('the driver has no timer query counter bits')
+
+            queries = GL.glGenQueries(query_count)
+            self._free.extend(int(query) for query in (queries if query_count > 1 else [queries]))
+            log.info('Measuring preset render costs with GL timer queries')
+        except Exception as e:
+            log.info(f'GL timer queries are unavailable ({e}); measuring preset render costs every {sync_interval} frames with glFinish')
+
+    """Switch permanently to glFinish timing after a timer query failed.
+    @param error: the error raised by the query
+    """
+    def _disable_queries(self, error):
+        log.warning(f'GL timer query failed ({error}); measuring preset render costs every {self.sync_interval} frames with glFinish')
+        self._free.clear()
+        self._pending.clear()
+        self._active = None
+
+    """Start measuring a frame (call immediately before rendering)"""
+    def begin(self):
+        self.frames += 1
+        if self._free:
+            self._active = self._free.popleft()
+            try:
+                GL.glBeginQuery(GL.GL_TIME_ELAPSED, self._active)
+                return
+            except Exception as e:
+                self._disable_queries(e)
+
+        if not self._pending and self.frames % self.sync_interval == 0:
+            GL.glFinish()
+            self._start = time.perf_counter()
+
+    """Finish measuring a frame (call immediately after rendering).
+    @returns the GPU time in seconds of a completed earlier frame, or None if none is available
+    """
+    def end(self):
+        if self._active is not None:
+            try:
+                GL.glEndQuery(GL.GL_TIME_ELAPSED)
+                self._pending.append(self._active)
+                self._active = None
+            except Exception as e:
+                self._disable_queries(e)
+                return None
+        elif self._start is not None:
+            GL.glFinish()
+            elapsed = time.perf_counter() - self._start
+            self._start = None
+            return elapsed
+
+        if not self._pending:
+            return None
+
+        query = self._pending[0]
+        available = (GL.GLint * 1)()
+        elapsed = (GL.GLuint64 * 1)()
+        try:
+            GL.glGetQueryObjectiv(query, GL.GL_QUERY_RESULT_AVAILABLE, available)
+            if not available[0]:
+                return None
+
+            GL.glGetQueryObjectui64v(query, GL.GL_QUERY_RESULT, elapsed)
+        except Exception as e:
+            self._disable_queries(e)
+            return None
+
+        self._free.append(self._pending.popleft())
+        return elapsed[0] / 1e9
+
+class TransitionPolicy:
+    """Choose the soft cut duration per preset switch from measured preset render costs.
+    A soft cut renders the outgoing and incoming presets together, so when their combined
+    cost would exceed the frame budget the soft cut is shortened or replaced by a hard cut.
+    @param soft_cut_duration: the configured soft cut duration in seconds
+    @param target_fps: the target frame rate (0 assumes 60)
+    @param min_duration: the shortest soft cut worth doing; anything shorter becomes a hard cut
+    @param budget_ratio: the fraction of the frame time available to rendering
+    @param alpha: the smoothing factor of the render cost moving averages
+    @param max_presets: the maximum number of presets to remember render costs for
+    """
+    def __init__(self, soft_cut_duration, target_fps, min_duration=0.5, budget_ratio=0.85, alpha=0.1, max_presets=4096):
+        self.soft_cut_duration  = soft_cut_duration
+        self.frame_budget       = budget_ratio / (target_fps or 60)
+        self.min_duration       = min_duration
+        self.alpha              = alpha
+        self.max_presets        = max_presets
+
+        self.frame_cost         = None
+        self.hard_cuts          = 0
+        self.shortened_cuts     = 0
+        self.soft_cuts          = 0
+
+        self._preset_costs      = OrderedDict()
+        self._current_preset    = None
+        self._last_duration     = soft_cut_duration
+        self._transition_end    = 0
+
+    """Record the render time of a frame.
+    Frames rendered during a soft cut are not attributed to the current preset.
+    @param frame_time: the render time in seconds
+    """
+    def record_frame(self, frame_time):
+        if self.frame_cost is None:
+            self.frame_cost = frame_time
+        else:
+            self.frame_cost += self.alpha * (frame_time - self.frame_cost)
+
+        if not self._current_preset or time.monotonic() < self._transition_end:
+            return
+
+        cost = self._preset_costs.get(self._current_preset)
+        if cost is None:
+            cost = frame_time
+            if len(self._preset_costs) >= self.max_presets:
+                self._preset_costs.popitem(last=False)
+        else:
+            cost += self.alpha * (frame_time - cost)
+
+        self._preset_costs[self._current_preset] = cost
+        self._preset_costs.move_to_end(self._current_preset)
+
+    """Get the measured render cost of a preset.
+    @param preset: the preset path
+    @returns the render cost in seconds or None if the preset has not been measured
+    """
+    def get_cost(self, preset):
+        return self._preset_costs.get(preset)
+
+    """Get the selection weight factor of a preset from its render cost.
+    A soft cut renders two presets at once, so presets costing more than half the frame budget
+    are down-weighted in proportion to their overrun.
+    @param preset: the preset path
+    @param min_factor: the lowest factor applied to an expensive preset
+    @returns the factor (1 for unmeasured presets and presets within budget)
+    """
+    def get_selection_factor(self, preset, min_factor=0.1):
+        cost = self._preset_costs.get(preset)
+        if not cost:
+            return 1.0
+
+        return max(min(self.frame_budget / 2 / cost, 1.0), min_factor)
+
+    """Choose the soft cut duration for a switch between two presets.
+    Unmeasured presets are assumed to cost the same as the recent frames.
+    @param outgoing: the current preset path
+    @param incoming: the next preset path, if known
+    @returns the soft cut duration in seconds (0 for a hard cut)
+    """
+    def get_transition_duration(self, outgoing, incoming=None):
+        duration = self.soft_cut_duration
+        if duration > 0 and self.frame_cost is not None:
+            outgoing_cost = self._preset_costs.get(outgoing, self.frame_cost)
+            incoming_cost = self._preset_costs.get(incoming, self.frame_cost)
+            transition_cost = outgoing_cost + incoming_cost
+
+            if transition_cost > self.frame_budget:
+                # Shorten the soft cut in proportion to the overrun so fewer frames are dropped
+                duration = self.soft_cut_duration * self.frame_budget / transition_cost
+                if transition_cost > 2 * self.frame_budget or duration < self.min_duration:
+                    duration = 0
+
+                log.debug(
+                    f'Transition cost {transition_cost * 1000:.1f}ms exceeds the frame budget of '
+                    f'{self.frame_budget * 1000:.1f}ms; using a {duration:.2f}s soft cut'
+                    )
+
+        if duration <= 0:
+            self.hard_cuts += 1
+        elif duration < self.soft_cut_duration:
+            self.shortened_cuts += 1
+        else:
+            self.soft_cuts += 1
+
+        self._last_duration = duration
+        return duration
+
+    """Track the preset switched to so its frames are attributed correctly.
+    @param preset: the new preset path
+    @param is_hard_cut: whether the switch was a hard cut
+    """
+    def on_preset_switched(self, preset, is_hard_cut):
+        self._current_preset = preset
+        self._transition_end = time.monotonic() + (0 if is_hard_cut else self._last_duration)
+
+    """Get the transition policy statistics"""
+    def get_stats(self):
+        return {
+            'frame_cost_ms': round(self.frame_cost * 1000, 2) if self.frame_cost is not None else None,
+            'frame_budget_ms': round(self.frame_budget * 1000, 2),
+            'measured_presets': len(self._preset_costs),
+            'soft_cuts': self.soft_cuts,
+            'shortened_cuts': self.shortened_cuts,
+            'hard_cuts': self.hard_cuts
+            }
@@ -1,14 +1,22 @@
-﻿import logging
+﻿import ctypes
+import json
+import logging
 import os
-import random
 import pyudev
 import re
+import select
 import time
 import threading
 import vlc
 
-from pulsectl import Pulse
+from collections import defaultdict, OrderedDict
+from urllib.parse import unquote, urlparse
+from pulsectl import Pulse, PulseDisconnected, PulseError
 
+from core.MediaAudioTap import MediaAudioTap
+from core.MediaLibraryIndex import MEDIA_TAGS, MediaLibraryIndex
+from core.MediaLibraryWatcher import MediaLibraryWatcher, MountWatcher, iter_audio_files
+from core.MediaQueue import MediaQueue
 from lib.abstracts import Controller
 from lib.config import APP_ROOT, Config
 from lib.constants import DeviceCatalog
@@ -16,6 +24,738 @@ from lib.common import execute, execute_managed
 
 log = logging.getLogger()
 
+# The activity monitor drives peak-detect streams through pulsectl's libpulse bindings,
+# which are not part of its public API (verified against pulsectl 24.11.0 and 24.12.0)
+try:
+    from pulsectl import _pulsectl as pulse_c
+except ImportError:
+    pulse_c = None
+
+PEAK_DETECT_ATTRIBUTES = (
+    'PA_SAMPLE_SPEC', 'PA_SAMPLE_FLOAT32NE', 'PA_BUFFER_ATTR', 'PA_STREAM_REQUEST_CB_T', 'PA_STREAM_DONT_MOVE',
+    'PA_STREAM_PEAK_DETECT', 'PA_STREAM_ADJUST_LATENCY', 'PA_STREAM_DONT_INHIBIT_AUTO_SUSPEND'
+    )
+PEAK_DETECT_CALLS = (
+    'proplist_from_string', 'proplist_free', 'stream_new_with_proplist', 'stream_set_read_callback',
+    'stream_connect_record', 'stream_peek', 'stream_drop', 'stream_disconnect', 'stream_unref'
+    )
+
+JEEPNEY_INSTALLED = False
+try:
+    from jeepney import DBusAddress, DBusErrorResponse, HeaderFields, MatchRule, MessageType, message_bus, new_method_call
+    from jeepney.io.blocking import Proxy, open_dbus_connection
+    JEEPNEY_INSTALLED = True
+except ImportError:
+    pass
+
+BLUEZ_SERVICE = 'org.bluez'
+BLUEZ_DEVICE_INTERFACE = 'org.bluez.Device1'
+BLUEZ_PLAYER_INTERFACE = 'org.bluez.MediaPlayer1'
+DBUS_OBJECT_MANAGER = 'org.freedesktop.DBus.ObjectManager'
+DBUS_PROPERTIES = 'org.freedesktop.DBus.Properties'
+
+AUDIO_FILE_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg')
+
+# Files found on a new mount are added to the media list in batches of this size or at this interval in seconds
+MOUNT_SCAN_BATCH_SIZE = 100
+MOUNT_SCAN_BATCH_INTERVAL = 0.5
+
+USB_MEDIA_PATH = '/media'
+
+# Sink input properties tagging the loopbacks ProjectMAR loads, so loopbacks made by the user or
+# other applications are never reconciled away
+LOOPBACK_PROPERTIES = 'media.name=ProjectMAR-Loopback'
+
+# PulseAudio calls that can safely be issued again if the connection drops before they return
+IDEMPOTENT_PULSE_CALLS = ('server_info', 'card_profile_set', 'volume_set_all_chans', 'sink_default_set', 'source_default_set')
+
+"""Check whether a PulseAudio call can be re-issued after a lost connection.
+@param func: the pulsectl method name
+"""
+def is_idempotent_pulse_call(func):
+    return func.endswith(('_list', '_info')) or func in IDEMPOTENT_PULSE_CALLS
+
+class PulseClient:
+    """Long-lived, thread-safe PulseAudio client connection.
+    pulsectl connections are not thread-safe so calls are serialized, and the connection is
+    re-established transparently if the server restarts.  Only idempotent calls are re-issued
+    blindly; a module load or unload interrupted by a lost connection is checked against the
+    server's module list first so it is never applied twice.
+    @param client_name: the PulseAudio client name
+    @param persistent: keep the connection open between calls (False connects per call)
+    @param retries: the number of connection attempts per call
+    @param retry_delay: the seconds to wait between connection attempts
+    """
+    def __init__(self, client_name, persistent=True, retries=3, retry_delay=0.5):
+        self.client_name    = client_name
+        self.persistent     = persistent
+        self.retries        = retries
+        self.retry_delay    = retry_delay
+
+        self.connects       = 0
+        self.calls          = 0
+
+        self._pulse         = None
+        self._lock          = threading.RLock()
+
+    """Connect to the PulseAudio server if not already connected"""
+    def _connect(self):
+        if self._pulse is None:
+            self._pulse = Pulse(self.client_name)
+            self.connects += 1
+            if self.persistent:
+                log.info(f'Connected PulseAudio client {self.client_name}')
+
+    """Close the connection to the PulseAudio server"""
+    def _disconnect(self):
+        if self._pulse is not None:
+            try:
+                self._pulse.close()
+            except Exception:
+                pass
+            self._pulse = None
+
+    """Check whether an interrupted module load or unload was applied before the connection dropped.
+    @param func: the pulsectl method name (module_load or module_unload)
+    @param args: the arguments of the interrupted call
+    @returns a tuple of whether the call was applied and its result
+    """
+    def _check_interrupted(self, func, args):
+        args = list(args) if isinstance(args, (list, tuple)) else [args]
+        modules = self._pulse.module_list()
+
+        if func == 'module_load':
+            name, argument = args[0], (args[1] if len(args) > 1 else '') or ''
+            for module in modules:
+                if module.name == name and (module.argument or '') == argument:
+                    log.info(f'Interrupted load of {name} had completed (index {module.index})')
+                    return True, module.index
+
+        elif func == 'module_unload':
+            if not any(module.index == args[0] for module in modules):
+                log.info(f'Interrupted unload of module {args[0]} had completed')
+                return True, None
+
+        return False, None
+
+    """Execute a PulseAudio method with optional arguments, reconnecting if the server went away.
+    @param func: The PulseAudio method to call.
+    @param args: Optional arguments to pass to the method.
+    """
+    def call(self, func, args=None):
+        with self._lock:
+            interrupted = False
+            for attempt in range(1, self.retries + 1):
+                try:
+                    self._connect()
+                except PulseError as e:
+                    if attempt == self.retries:
+                        raise
+
+                    log.warning(f'Unable to connect to PulseAudio ({e}); retrying in {self.retry_delay}s')
+                    time.sleep(self.retry_delay)
+                    continue
+
+                try:
+                    if interrupted:
+                        applied, result = self._check_interrupted(func, args)
+                        if applied:
+                            return result
+
+                    self.calls += 1
+                    method = getattr(self._pulse, func)
+                    if isinstance(args, (list, tuple)):
+                        return method(*args)
+                    elif args is not None:
+                        return method(args)
+                    else:
+                        return method()
+
+                except PulseDisconnected:
+                    log.warning(f'PulseAudio connection lost during {func}; reconnecting')
+                    self._disconnect()
+                    if attempt == self.retries:
+                        raise
+
+                    if not is_idempotent_pulse_call(func):
+                        if func not in ('module_load', 'module_unload'):
+                            raise
+
+                        interrupted = True
+
+                finally:
+                    if not self.persistent:
+                        self._disconnect()
+
+    """Close the connection"""
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+"""Parse the argument string of a PulseAudio module into a dictionary stored as module.args.
+@param module: The PulseAudio module object to extract arguments from.
+"""
+def parse_module_arguments(module):
+    module.args = dict()
+    if getattr(module, 'argument', None):
+        for arg in module.argument.split(' '):
+            if '=' in arg:
+                key, val = arg.split('=', 1)
+                module.args[key] = val
+
+class PulseStateMirror:
+    """In-memory mirror of the PulseAudio modules, sinks, sources and cards.
+    The mirror is seeded with one listing per facility and then kept current from subscription
+    events and the module loads/unloads made through it, so lookups never go to the server.
+    @param pulse: the PulseClient used to fetch individual objects
+    """
+    FACILITIES = ('module', 'sink', 'source', 'card')
+
+    def __init__(self, pulse):
+        self.pulse              = pulse
+
+        self._items             = {facility: dict() for facility in self.FACILITIES}
+        self._names             = {facility: dict() for facility in self.FACILITIES}
+        self._modules_by_name   = defaultdict(dict)
+        self._lock              = threading.RLock()
+
+    """Replace the mirror contents with a full listing from the server"""
+    def seed(self):
+        listings = {facility: self.pulse.call(f'{facility}_list') for facility in self.FACILITIES}
+
+        with self._lock:
+            for facility in self.FACILITIES:
+                self._items[facility].clear()
+                self._names[facility].clear()
+            self._modules_by_name.clear()
+
+            for facility, items in listings.items():
+                for item in items:
+                    self._store(facility, item)
+
+        log.debug('Seeded PulseAudio mirror with {}'.format(
+            ', '.join(f'{len(self._items[facility])} {facility}s' for facility in self.FACILITIES)
+            ))
+
+    """Add or replace an object in the mirror.
+    @param facility: the PulseAudio facility (module/sink/source/card)
+    @param item: the PulseAudio object
+    """
+    def _store(self, facility, item):
+        self._remove(facility, item.index)
+
+        if facility == 'module':
+            parse_module_arguments(item)
+            self._modules_by_name[item.name][item.index] = item
+
+        self._items[facility][item.index] = item
+        self._names[facility][item.name] = item
+
+    """Remove an object from the mirror.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    @returns the removed object or None
+    """
+    def _remove(self, facility, index):
+        item = self._items[facility].pop(index, None)
+        if item is not None:
+            if self._names[facility].get(item.name) is item:
+                self._names[facility].pop(item.name)
+
+            if facility == 'module':
+                self._modules_by_name[item.name].pop(index, None)
+
+        return item
+
+    """Fetch a single object from the server and update the mirror.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    @returns the object or None if it no longer exists
+    """
+    def refresh(self, facility, index):
+        try:
+            item = self.pulse.call(f'{facility}_info', index)
+        except PulseError:
+            item = None
+
+        with self._lock:
+            if item is None:
+                self._remove(facility, index)
+            else:
+                self._store(facility, item)
+
+        return item
+
+    """Remove an object from the mirror.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    @returns the removed object or None
+    """
+    def remove(self, facility, index):
+        with self._lock:
+            return self._remove(facility, index)
+
+    """Apply a PulseAudio subscription event to the mirror.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    @param action: the event type (new/change/remove)
+    @returns the new/changed object or the removed object
+    """
+    def update(self, facility, index, action):
+        if facility not in self.FACILITIES:
+            return None
+
+        if action == 'remove':
+            return self.remove(facility, index)
+
+        return self.refresh(facility, index)
+
+    """Get an object by index.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    """
+    def get(self, facility, index):
+        return self._items[facility].get(index)
+
+    """Get an object by name.
+    @param facility: the PulseAudio facility
+    @param name: the PulseAudio object name
+    """
+    def find(self, facility, name):
+        return self._names[facility].get(name)
+
+    """List the objects of a facility.
+    @param facility: the PulseAudio facility
+    """
+    def list(self, facility):
+        with self._lock:
+            return list(self._items[facility].values())
+
+    """Get the loaded modules with a name.
+    @param module_name: the module name
+    """
+    def get_modules(self, module_name):
+        with self._lock:
+            return list(self._modules_by_name.get(module_name, dict()).values())
+
+class PulseEventCoalescer:
+    """Collect PulseAudio subscription events into consolidated change sets.
+    Events are held until no new event has arrived for the debounce window (or max_delay has
+    passed since the first one); repeated events for an object are merged and objects that
+    were created and removed within the same batch are dropped.
+    @param window: the debounce window in seconds
+    @param max_delay: the maximum number of seconds an event is held
+    """
+    def __init__(self, window=0.2, max_delay=1.0):
+        self.window             = window
+        self.max_delay          = max_delay
+
+        self.events_received    = 0
+        self.events_coalesced   = 0
+        self.events_cancelled   = 0
+        self.batches            = 0
+        self.reconciliations    = 0
+
+        self._pending           = OrderedDict()
+        self._first_event       = None
+        self._last_event        = None
+        self._lock              = threading.Lock()
+
+    """Add an event to the pending batch.
+    @param facility: the PulseAudio facility
+    @param index: the PulseAudio object index
+    @param action: the event type (new/change/remove)
+    """
+    def add(self, facility, index, action):
+        with self._lock:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_event = now
+            self._last_event = now
+            self.events_received += 1
+
+            entry = self._pending.get((facility, index))
+            if entry is None:
+                self._pending[(facility, index)] = [action, action]
+                return
+
+            # A change after new/remove adds nothing to the pending action
+            self.events_coalesced += 1
+            if action != 'change' or entry[1] == 'change':
+                entry[1] = action
+
+    """Check whether the pending batch is ready to be processed"""
+    def ready(self):
+        with self._lock:
+            if not self._pending:
+                return False
+
+            now = time.monotonic()
+            return now - self._last_event >= self.window or now - self._first_event >= self.max_delay
+
+    """Take the pending batch as a consolidated change set.
+    Removals are ordered first so a device that moved is released before it is added again.
+    @returns a list of (facility, index, action) tuples
+    """
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = OrderedDict()
+
+        removed = list()
+        added = list()
+        changed = list()
+        for (facility, index), (first, last) in pending.items():
+            if first == 'new' and last == 'remove':
+                self.events_cancelled += 1
+            elif first == 'remove' and last == 'new':
+                removed.append((facility, index, 'remove'))
+                added.append((facility, index, 'new'))
+            elif 'remove' in (first, last):
+                removed.append((facility, index, 'remove'))
+            elif 'new' in (first, last):
+                added.append((facility, index, 'new'))
+            else:
+                changed.append((facility, index, 'change'))
+
+        self.batches += 1
+        return removed + added + changed
+
+    """Get the event coalescing metrics"""
+    def get_metrics(self):
+        return {
+            'events_received': self.events_received,
+            'events_coalesced': self.events_coalesced,
+            'events_cancelled': self.events_cancelled,
+            'batches': self.batches,
+            'reconciliations': self.reconciliations
+            }
+
+class LoopbackLatencyTuner:
+    """Per-source adaptive latency for loopback modules.
+    Each source starts at the minimum latency (or its learned value).  PulseAudio does not expose
+    loopback underrun counts, but module-loopback grows its buffer after underruns, so a loopback
+    whose buffered latency drifts well past its target is treated as unstable and stepped up.
+    Only the loopback's own buffer is measured; the sink's device latency (100-200ms on bluetooth)
+    is constant for the sink and says nothing about the loopback's stability.
+    Sources that stay stable are periodically stepped back down, never below the largest latency
+    that proved unstable.  Learned latencies are persisted per source name.
+    @param state_path: the JSON file used to persist learned latencies
+    @param min_latency: the lowest latency to try in milliseconds
+    @param max_latency: the highest latency to use in milliseconds
+    @param check_interval: the seconds between latency checks
+    @param stable_period: the seconds a latency must be stable before a lower one is tried
+    """
+    STEP = 1.5
+
+    def __init__(self, state_path, min_latency=10, max_latency=200, check_interval=5, stable_period=120):
+        self.state_path     = state_path
+        self.min_latency    = min_latency
+        self.max_latency    = max_latency
+        self.check_interval = check_interval
+        self.stable_period  = stable_period
+
+        self._state         = self._load()
+        self._stable_since  = dict()
+        self._last_check    = 0
+
+    """Load the learned latencies"""
+    def _load(self):
+        try:
+            with open(self.state_path, 'r') as infile:
+                return json.load(infile)
+        except FileNotFoundError:
+            return dict()
+        except (OSError, ValueError) as e:
+            log.warning(f'Failed to load loopback latencies from {self.state_path}: {e}')
+            return dict()
+
+    """Persist the learned latencies"""
+    def _save(self):
+        try:
+            with open(self.state_path, 'w') as outfile:
+                json.dump(self._state, outfile, indent=2)
+        except OSError as e:
+            log.warning(f'Failed to save loopback latencies to {self.state_path}: {e}')
+
+    """Get the latency to use for a source's loopbacks.
+    @param source_name: the PulseAudio source name
+    @returns the latency in milliseconds
+    """
+    def get_latency(self, source_name):
+        state = self._state.setdefault(source_name, {'latency': self.min_latency, 'floor': 0})
+        return state['latency']
+
+    """Check whether a latency check is due"""
+    def due(self):
+        return time.monotonic() - self._last_check >= self.check_interval
+
+    """Compare the measured latency of each loopback against its target and adjust.
+    @param loopback_modules: the loaded loopback modules (with parsed args)
+    @param sink_inputs: the PulseAudio sink inputs
+    @returns True if the latency of any source changed
+    """
+    def update(self, loopback_modules, sink_inputs):
+        now = time.monotonic()
+        self._last_check = now
+
+        measured = defaultdict(float)
+        for sink_input in sink_inputs:
+            latency = getattr(sink_input, 'buffer_usec', 0) / 1000
+            measured[sink_input.owner_module] = max(measured[sink_input.owner_module], latency)
+
+        changed = False
+        for module in loopback_modules:
+            source_name = module.args.get('source')
+            if not source_name or module.index not in measured:
+                continue
+
+            state = self._state.setdefault(source_name, {'latency': self.min_latency, 'floor': 0})
+            target = int(module.args.get('latency_msec', 0))
+
+            # Wait until the loopback has been reloaded with the current latency
+            if target != state['latency']:
+                continue
+
+            stable_since = self._stable_since.setdefault(source_name, now)
+            if measured[module.index] > target * self.STEP + 5:
+                if target < self.max_latency:
+                    state['floor'] = max(state['floor'], target)
+                    state['latency'] = min(int(target * self.STEP) + 1, self.max_latency)
+                    log.info(f'Loopback for {source_name} measured {measured[module.index]:.1f}ms against {target}ms; raising latency to {state["latency"]}ms')
+                    changed = True
+
+                self._stable_since[source_name] = now
+
+            elif now - stable_since >= self.stable_period and target > self.min_latency:
+                lower = max(int(target / self.STEP), self.min_latency)
+                if lower > state['floor']:
+                    state['latency'] = lower
+                    log.info(f'Loopback for {source_name} stable at {target}ms; trying {lower}ms')
+                    changed = True
+
+                self._stable_since[source_name] = now
+
+        if changed:
+            self._save()
+
+        return changed
+
+class SourceActivityMonitor(threading.Thread):
+    """Peak-detect signal monitoring for loopback sources.
+    Each monitored source gets one persistent PEAK_DETECT record stream on a dedicated connection,
+    so the server only delivers a single peak value per sample period instead of the audio itself.
+    The peaks gathered by the event loop are evaluated every sample period.
+    @param idle_timeout: the seconds a source must stay below the threshold before it is idle
+    @param threshold: the peak level (0-1) treated as signal
+    @param on_change: a callback invoked when a source becomes idle or active
+    @param sample_period: the seconds between peak values delivered by the server
+    """
+    def __init__(self, idle_timeout, threshold, on_change, sample_period=0.05):
+        threading.Thread.__init__(self, daemon=True)
+
+        self.idle_timeout   = idle_timeout
+        self.threshold      = threshold
+        self.on_change      = on_change
+        self.sample_period  = sample_period
+
+        self.idle           = set()
+
+        self._sources       = dict()
+        self._source_index  = dict()
+        self._streams       = dict()
+        self._peaks         = dict()
+        self._lock          = threading.Lock()
+        self._stop_event    = threading.Event()
+
+    """Check whether the installed pulsectl exposes the internals the peak-detect streams use"""
+    @staticmethod
+    def is_available():
+        if pulse_c is None or not hasattr(pulse_c, 'pa'):
+            return False
+
+        # LibPulse.__getattr__ raises KeyError for unknown calls, so its function table is checked instead
+        calls = getattr(pulse_c.pa, 'funcs', dict())
+        return (
+            all(hasattr(pulse_c, name) for name in PEAK_DETECT_ATTRIBUTES)
+            and all(name in calls for name in PEAK_DETECT_CALLS)
+            and all(hasattr(Pulse, name) for name in ('event_callback_set', 'event_listen'))
+            )
+
+    """Set the sources to monitor.
+    New sources start out active so their loopbacks are loaded until proven idle.
+    @param sources: a dict of the names of the sources with loopbacks and their source indexes
+    """
+    def set_sources(self, sources):
+        now = time.monotonic()
+        with self._lock:
+            self._sources = {name: self._sources.get(name, now) for name in sources}
+            self._source_index = dict(sources)
+            self.idle &= set(sources)
+
+    """Check whether a source is idle.
+    @param source_name: the PulseAudio source name
+    """
+    def is_idle(self, source_name):
+        return source_name in self.idle
+
+    """Open a peak-detect record stream on a source.
+    @param pulse: the monitor's Pulse connection
+    @param source_name: the PulseAudio source name
+    @returns the stream and its read callback (which must be kept alive with the stream)
+    """
+    def _connect_stream(self, pulse, source_name):
+        proplist = pulse_c.pa.proplist_from_string('application.id=org.PulseAudio.pavucontrol')
+        sample_spec = pulse_c.PA_SAMPLE_SPEC(format=pulse_c.PA_SAMPLE_FLOAT32NE, rate=max(int(1 / self.sample_period), 1), channels=1)
+        stream = pulse_c.pa.stream_new_with_proplist(pulse._ctx, 'ProjectMAR Peak Detect', ctypes.byref(sample_spec), None, proplist)
+        pulse_c.pa.proplist_free(proplist)
+
+        @pulse_c.PA_STREAM_REQUEST_CB_T
+        def read_cb(s, nbytes, userdata):
+            data, nbytes = ctypes.c_void_p(), ctypes.c_int(nbytes)
+            pulse_c.pa.stream_peek(s, data, ctypes.byref(nbytes))
+            try:
+                if data and nbytes.value >= 4:
+                    samples = ctypes.cast(data, ctypes.POINTER(ctypes.c_float))
+                    peak = max(samples[i] for i in range(nbytes.value // 4))
+                    self._peaks[source_name] = max(self._peaks.get(source_name, 0), peak)
+            finally:
+                # A hole in the stream still has to be dropped, an empty buffer must not be
+                if nbytes.value:
+                    pulse_c.pa.stream_drop(s)
+
+        pulse_c.pa.stream_set_read_callback(stream, read_cb, None)
+        try:
+            pulse_c.pa.stream_connect_record(
+                stream, source_name.encode('utf-8'),
+                pulse_c.PA_BUFFER_ATTR(fragsize=4, maxlength=2**32-1),
+                pulse_c.PA_STREAM_DONT_MOVE | pulse_c.PA_STREAM_PEAK_DETECT |
+                    pulse_c.PA_STREAM_ADJUST_LATENCY | pulse_c.PA_STREAM_DONT_INHIBIT_AUTO_SUSPEND
+                )
+        except pulse_c.pa.CallError:
+            pulse_c.pa.stream_unref(stream)
+            raise
+
+        return stream, read_cb
+
+    """Close a peak-detect record stream.
+    @param source_name: the PulseAudio source name
+    """
+    def _disconnect_stream(self, source_name):
+        stream, read_cb, source_index = self._streams.pop(source_name)
+        try:
+            pulse_c.pa.stream_disconnect(stream)
+        except pulse_c.pa.CallError:
+            # The server already terminated the stream with its source
+            pass
+
+        pulse_c.pa.stream_unref(stream)
+        self._peaks.pop(source_name, None)
+
+    """Open and close streams so every monitored source has exactly one.
+    A source removed and re-added gets a new index, which the old stream (created with
+    DONT_MOVE) will never follow, so its stream is reopened.
+    @param pulse: the monitor's Pulse connection
+    """
+    def _sync_streams(self, pulse):
+        with self._lock:
+            sources = dict(self._source_index)
+
+        for source_name in list(self._streams):
+            if self._streams[source_name][2] != sources.get(source_name, -1):
+                self._disconnect_stream(source_name)
+
+        for source_name, source_index in sources.items():
+            if source_name in self._streams:
+                continue
+
+            try:
+                stream, read_cb = self._connect_stream(pulse, source_name)
+            except pulse_c.pa.CallError as e:
+                # The source may have been removed since the last reconcile
+                log.debug(f'Failed to monitor {source_name}: {e}')
+                continue
+
+            self._streams[source_name] = (stream, read_cb, source_index)
+
+    """Evaluate the peaks gathered since the last call.
+    @returns True if any source changed state
+    """
+    def _evaluate(self):
+        changed = False
+        for source_name in list(self._streams):
+            if self._record(source_name, self._peaks.pop(source_name, 0)):
+                changed = True
+
+        return changed
+
+    """Record a peak sample and flag transitions between idle and active.
+    @param source_name: the PulseAudio source name
+    @param peak: the sampled peak level
+    @returns True if the source changed state
+    """
+    def _record(self, source_name, peak):
+        now = time.monotonic()
+        with self._lock:
+            if source_name not in self._sources:
+                return False
+
+            if peak >= self.threshold:
+                self._sources[source_name] = now
+                if source_name in self.idle:
+                    self.idle.discard(source_name)
+                    log.info(f'Signal detected on {source_name}; resuming its loopbacks')
+                    return True
+
+            elif source_name not in self.idle and now - self._sources[source_name] >= self.idle_timeout:
+                self.idle.add(source_name)
+                log.info(f'No signal on {source_name} for {self.idle_timeout}s; suspending its loopbacks')
+                return True
+
+        return False
+
+    """Monitor the sources until stopped"""
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with Pulse('ProjectMAR Activity Monitor') as pulse:
+                    if getattr(pulse, '_ctx', None) is None:
+                        self._disable('the pulsectl connection has no libpulse context')
+                        return
+
+                    # event_listen() drives the stream callbacks; no server events are subscribed
+                    pulse.event_callback_set(lambda event: None)
+                    try:
+                        while not self._stop_event.is_set():
+                            self._sync_streams(pulse)
+                            pulse.event_listen(self.sample_period)
+                            if self._evaluate():
+                                self.on_change()
+                    finally:
+                        for source_name in list(self._streams):
+                            self._disconnect_stream(source_name)
+
+            except Exception as e:
+                log.exception(f'Unhandled exception in source activity monitor: {e}')
+                self._stop_event.wait(1)
+
+    """Stop monitoring and resume the loopbacks of every source.
+    @param reason: why the monitor cannot run
+    """
+    def _disable(self, reason):
+        log.warning(f'Disabling loopback idle detection as {reason}')
+        self._stop_event.set()
+        with self._lock:
+            changed = bool(self.idle)
+            self.idle = set()
+
+        if changed:
+            self.on_change()
+
+    """Stop the monitor"""
+    def stop(self):
+        self._stop_event.set()
+
 class AudioCtrl(Controller, threading.Thread):
     """Controller for managing PulseAudio devices and profiles.
     @param thread_event: Event to signal when the thread should stop.
@@ -27,15 +767,45 @@ class AudioCtrl(Controller, threading.Thread):
         
         self.audio_mode             = self._config.audio_ctrl.get('audio_mode', 'automatic')
         self.io_device_mode         = self._config.audio_ctrl.get('io_device_mode', 'aux')
+        self.capture_mode           = self._config.audio_ctrl.get('capture_mode', 'loopback')
+        self.direct_capture         = False
 
         self.sink_device            = None
         self.source_device          = None
         self.sink_devices           = list()
+
+        self._reconcile_lock        = threading.RLock()
+
+        self.event_coalescer        = PulseEventCoalescer(self._config.audio_ctrl.get('event_coalesce_window', 0.2))
+
+        self.latency_tuner          = None
+        if self._config.audio_ctrl.get('adaptive_latency_enabled', False):
+            self.latency_tuner = LoopbackLatencyTuner(
+                self._config.audio_ctrl.get('adaptive_latency_path', None) or os.path.join(APP_ROOT, 'loopback_latency.json'),
+                self._config.audio_ctrl.get('adaptive_latency_min', 10),
+                self._config.audio_ctrl.get('adaptive_latency_max', 200)
+                )
+
+        self.activity_monitor       = None
+        self._routing_dirty         = threading.Event()
+        if self._config.audio_ctrl.get('loopback_idle_enabled', False):
+            if SourceActivityMonitor.is_available():
+                self.activity_monitor = SourceActivityMonitor(
+                    self._config.audio_ctrl.get('loopback_idle_timeout', 30),
+                    self._config.audio_ctrl.get('loopback_idle_threshold', 0.01),
+                    self._routing_dirty.set
+                    )
+            else:
+                log.warning('Loopback idle detection is disabled as the installed pulsectl does not expose the peak-detect stream internals')
+        self._applied_volumes       = dict()
         
         self.devices                = DeviceCatalog()
 
         self.ar_sink                = 'platform-project_mar.stereo'
 
+        self.pulse                  = PulseClient('ProjectMAR PulseAudio Callback')
+        self.mirror                 = PulseStateMirror(self.pulse)
+
         config_path = os.path.join(APP_ROOT, 'conf')
         self.supported_cards = self.load_audio_config(config_path, 'audio_cards.conf')
         self.supported_sinks = self.load_audio_config(config_path, 'audio_sinks.conf')
@@ -68,14 +838,7 @@ class AudioCtrl(Controller, threading.Thread):
     @param args: Optional arguments to pass to the method.
     """
     def pulse_audio_callback(self, func, args=None):
-        with Pulse('ProjectMAR PulseAudio Callback') as pulse:
-            method = getattr(pulse, func)
-            if isinstance(args, (list, tuple)):
-                return method(*args)
-            elif args is not None:
-                return method(args)
-            else:
-                return method()
+        return self.pulse.call(func, args)
         
     """Get raw diagnostic information from PulseAudio"""
     def get_raw_diagnostics(self):
@@ -142,30 +905,30 @@ class AudioCtrl(Controller, threading.Thread):
     @param module: The PulseAudio module object to extract arguments from.
     """
     def get_module_arguments(self, module):
-        module.args = dict()
-        if hasattr(module, 'argument'):
-            if module.argument:
-                args = module.argument.split(' ')
-                for arg in args:
-                    if '=' in arg:
-                        key, val = arg.split('=', 1)
-                        module.args[key] = val
-
-    """Get modules by name from PulseAudio.
+        parse_module_arguments(module)
+
+    """Get modules by name from the PulseAudio mirror.
     @param module_name: The name of the module to search for.
     """
     def get_modules(self, module_name=None):
-        modules = list()
-        
-        for module in self.pulse_audio_callback('module_list'):
-            try:
-                self.get_module_arguments(module)
-                if module.name == module_name:
-                    modules.append(module)
-            except Exception as e:
-                log.exception('Failed to process argument %s: %s', getattr(module, 'argument', None), e)
+        return self.mirror.get_modules(module_name)
+
+    """Load a PulseAudio module and add it to the mirror.
+    @param module_name: The name of the module to load.
+    @param module_args: The module argument string.
+    @returns the index of the loaded module
+    """
+    def load_module(self, module_name, module_args):
+        index = self.pulse_audio_callback('module_load', [module_name, module_args])
+        self.mirror.refresh('module', index)
+        return index
 
-        return modules
+    """Unload a PulseAudio module and remove it from the mirror.
+    @param module: The PulseAudio module object to unload.
+    """
+    def unload_module(self, module):
+        self.pulse_audio_callback('module_unload', module.index)
+        self.mirror.remove('module', module.index)
 
     """Check if a module is loaded by name.
     @param module_name: The name of the module to check.
@@ -177,12 +940,16 @@ class AudioCtrl(Controller, threading.Thread):
 
         return False
            
+    """Get the loopback modules loaded by ProjectMAR"""
+    def get_owned_loopbacks(self):
+        return [module for module in self.get_modules('module-loopback') if module.args.get('sink_input_properties') == LOOPBACK_PROPERTIES]
+
     """Unload loopback modules based on sink and source names.
     @param sink_name: The name of the sink to unload loopback modules for.
     @param source_name: The name of the source to unload loopback modules for.
     """
     def unload_loopback_modules(self, sink_name=None, source_name=None):
-        for module in self.get_modules('module-loopback'):            
+        for module in self.get_owned_loopbacks():
             unload = False
             if not source_name and not sink_name:
                 unload = True
@@ -193,72 +960,187 @@ class AudioCtrl(Controller, threading.Thread):
 
             if unload:
                 log.info('Unloading loopback module {}'.format(module.name))
-                self.pulse_audio_callback('module_unload', module.index)
+                self.unload_module(module)
 
-    """Load a loopback module for a specific source and sink.
-    @param source_name: The name of the source to load the loopback module for.
-    @param sink_name: The name of the sink to load the loopback module for.
+    """Get the module arguments of the loopback between a source and sink.
+    @param source_name: The name of the loopback source.
+    @param sink_name: The name of the loopback sink.
     """
-    def load_loopback_module(self, source_name, sink_name):
-        log.info('Loading module-loopback for source {} sink {}'.format(source_name, sink_name))
-        self.pulse_audio_callback('module_load', [
-            'module-loopback',
-            f'source={source_name} sink={sink_name} latency_msec=20 source_dont_move=true sink_dont_move=true'
-        ])
+    def get_loopback_arguments(self, source_name, sink_name):
+        latency = self.latency_tuner.get_latency(source_name) if self.latency_tuner else 20
+
+        return {
+            'source': source_name,
+            'sink': sink_name,
+            'latency_msec': str(latency),
+            'source_dont_move': 'true',
+            'sink_dont_move': 'true',
+            'sink_input_properties': LOOPBACK_PROPERTIES
+            }
 
     """Unload null sink modules"""
     def unload_null_sink_modules(self):
         for module in self.get_modules('module-null-sink'):
             log.info('Unloading null sink {}'.format(module.name))
-            self.pulse_audio_callback('module_unload', module.index)
+            self.unload_module(module)
 
     """Unload combined sink modules"""
     def unload_combined_sink_modules(self):
         for module in self.get_modules('module-combine-sink'):
             log.info('Unloading combined sink {}'.format(module.name))
-            self.pulse_audio_callback('module_unload', module.index)
+            self.unload_module(module)
 
     """Unload suspend on idle modules"""
     def unload_suspend_on_idle(self):
         for module in self.get_modules('module-suspend-on-idle'):
             log.info('Unloading suspend on idle module {}'.format(module.name))
-            self.pulse_audio_callback('module_unload', module.index)
-
-    """Load a combined sink module with specified sinks.
-    @param combined_sinks: A list of sink names to combine.
-    """
-    def load_combined_sinks(self, combined_sinks):
-        log.info('Loading combined sink for {}'.format(combined_sinks))
-        self.pulse_audio_callback('module_load', [
-            'module-combine-sink',
-            'slaves=' + ','.join(combined_sinks)
-            ])
-
-    """Update sink devices from PulseAudio"""
-    def setup_combined_sink(self):
-        log.info('Setting up combined sink for PulseAudio')
-        sinks = [sink.name for sink in self.devices.sink.values()]
-        
-        load_sink = False
-        combined_sinks = self.get_modules('module-combine-sink')
-        if len(combined_sinks) > 0:
-            combined_sink_slaves = combined_sinks[0].args["slaves"].split(',')
-
-            log.info('Found an active module-combine-sink module loaded!')
-            log.info('Found {} combined sinks with {} slaves'.format(len(combined_sinks), len(combined_sink_slaves)))
-            if any(sink not in combined_sink_slaves for sink in sinks):
-                self.unload_combined_sink_modules()
-                load_sink = True
-                time.sleep(0.5)
-        else:
-            load_sink = True
+            self.unload_module(module)
+
+    """Set whether the visualizer captures its sources directly.
+    The visualizer loopbacks are only dropped once direct capture has opened its devices, since
+    its fallback records the null sink monitor and would be silent without them.
+    @param direct_capture: whether direct capture opened its capture devices
+    """
+    def set_direct_capture(self, direct_capture):
+        self.direct_capture = direct_capture
+        if self.capture_mode == 'direct' and not direct_capture:
+            log.warning('Direct capture fell back to the default capturing device; keeping the visualizer loopbacks')
 
-        log.info(f'Found {len(sinks)} sinks: {sinks} reload combined sink: {load_sink}')
-        if len(sinks) > 1 and load_sink:
-            self.load_combined_sinks(sinks)
-            self.sink_device = 'combined'
+    """Compute the desired audio routing from the device catalog.
+    @returns a dictionary describing the null sink, combined sink, loopbacks (and their sources), defaults and volumes
+    """
+    def get_desired_routing(self):
+        sinks = sorted(sink.name for sink in self.devices.sink.values())
+
+        routing = {
+            'null_sink': f'sink_name={self.ar_sink} sink_properties=device.description=ProjectMAR-NULL-Sink',
+            'combined_sink': sinks if len(sinks) > 1 else None,
+            'loopbacks': dict(),
+            'loopback_sources': dict(),
+            'defaults': {'source': f'{self.ar_sink}.monitor'},
+            'volumes': dict()
+            }
 
-            self.pulse_audio_callback('sink_default_set', 'combined')
+        if routing['combined_sink']:
+            routing['defaults']['sink'] = 'combined'
+        elif self.sink_device:
+            routing['defaults']['sink'] = self.sink_device
+
+        # Hardware output monitors and mics feed the visualizer through the null sink unless the
+        # visualizer captures them directly, leaving only the loopbacks needed for playthrough
+        visualizer_loopbacks = not self.direct_capture
+
+        loopbacks = list()
+        if visualizer_loopbacks:
+            for source_name in self.devices.unsupported_sources:
+                if source_name.startswith('alsa_output'):
+                    loopbacks.append((source_name, self.ar_sink))
+
+        if self.sink_device:
+            for source in self.devices.source.values():
+                if source.type == 'aux':
+                    loopbacks.extend((source.name, sink_name) for sink_name in sinks)
+                elif source.type == 'mic' and visualizer_loopbacks:
+                    loopbacks.append((source.name, self.ar_sink))
+
+        # Loopbacks of sources without signal are left unloaded until the activity monitor hears them
+        source_indexes = {source.name: source.index for source in self.devices.unsupported_sources.values()}
+        source_indexes.update((source.name, source.index) for source in self.devices.source.values())
+        for source_name, sink_name in loopbacks:
+            routing['loopback_sources'][source_name] = source_indexes.get(source_name)
+            if not self.activity_monitor or not self.activity_monitor.is_idle(source_name):
+                routing['loopbacks'][(source_name, sink_name)] = self.get_loopback_arguments(source_name, sink_name)
+
+        for device_type, devices in (('sink', self.devices.sink), ('source', self.devices.source)):
+            for device in devices.values():
+                if getattr(device, 'target_volume', None) is not None:
+                    routing['volumes'][(device_type, device.name)] = (device, device.target_volume)
+
+        return routing
+
+    """Bring the PulseAudio routing in line with the device catalog.
+    The desired routing is compared against the mirrored modules and only the differences are
+    applied (unloads, then loads, then defaults and volumes), so repeated calls are no-ops.
+    @returns the number of changes applied
+    """
+    def reconcile(self):
+        with self._reconcile_lock:
+            self._routing_dirty.clear()
+            routing = self.get_desired_routing()
+            unload = list()
+            load = list()
+
+            if not any(module.args.get('sink_name') == self.ar_sink for module in self.get_modules('module-null-sink')):
+                load.append(('module-null-sink', routing['null_sink']))
+
+            combined_sink = routing['combined_sink']
+            combined_loaded = False
+            for module in self.get_modules('module-combine-sink'):
+                if combined_sink and not combined_loaded and sorted(module.args.get('slaves', '').split(',')) == combined_sink:
+                    combined_loaded = True
+                else:
+                    unload.append(module)
+
+            if combined_sink and not combined_loaded:
+                load.append(('module-combine-sink', 'slaves=' + ','.join(combined_sink)))
+
+            loaded_loopbacks = set()
+            for module in self.get_owned_loopbacks():
+                key = (module.args.get('source'), module.args.get('sink'))
+                loopback_args = routing['loopbacks'].get(key)
+                if loopback_args is None or key in loaded_loopbacks or module.args.get('latency_msec') != loopback_args['latency_msec']:
+                    unload.append(module)
+                else:
+                    loaded_loopbacks.add(key)
+
+            for key, loopback_args in routing['loopbacks'].items():
+                if key not in loaded_loopbacks:
+                    load.append(('module-loopback', ' '.join(f'{arg}={val}' for arg, val in loopback_args.items())))
+
+            for module in unload:
+                log.info(f'Unloading {module.name} {module.argument}')
+                try:
+                    self.unload_module(module)
+                except PulseError as e:
+                    log.error(f'Failed to unload {module.name}: {e}')
+
+            for module_name, module_args in load:
+                log.info(f'Loading {module_name} {module_args}')
+                try:
+                    self.load_module(module_name, module_args)
+                except PulseError as e:
+                    log.error(f'Failed to load {module_name} {module_args}: {e}')
+
+            changes = len(unload) + len(load)
+
+            server_info = self.pulse_audio_callback('server_info')
+            current_defaults = {'sink': server_info.default_sink_name, 'source': server_info.default_source_name}
+            for device_type, device_name in routing['defaults'].items():
+                if current_defaults.get(device_type) != device_name:
+                    log.info(f'Setting default {device_type} to {device_name}')
+                    self.set_default(device_type, device_name)
+                    changes += 1
+
+            # A device removed and re-added within one batch is a new object (and usually a new
+            # index), so the cached volume only counts for the same device instance
+            applied_volumes = dict()
+            for key, (device, device_volume) in routing['volumes'].items():
+                applied = (device, getattr(device, 'index', None), device_volume)
+                if self._applied_volumes.get(key) != applied:
+                    self.set_volume(key[0], device, device_volume)
+                    changes += 1
+
+                applied_volumes[key] = applied
+
+            self._applied_volumes = applied_volumes
+
+            if self.activity_monitor:
+                self.activity_monitor.set_sources(routing['loopback_sources'])
+
+            if changes:
+                log.info(f'Audio routing reconciled with {changes} changes')
+
+            return changes
 
     """Add a new card device to the catalog and set its profile.
     @param card: The PulseAudio card object to add.
@@ -371,8 +1253,7 @@ class AudioCtrl(Controller, threading.Thread):
             if not self.devices.sink_cards.get(alsa_card):
                 self.devices.sink_cards[alsa_card] = alsa_name
         
-        self.set_default('sink', sink.name)
-        self.set_volume('sink', sink, sink_volume)
+        sink.target_volume = sink_volume
         self.sink_device = sink.name
 
         sink.type = sink_type
@@ -391,10 +1272,6 @@ class AudioCtrl(Controller, threading.Thread):
         log.debug('Found source device: {} {}'.format(source.name, source))
 
         if source.name.startswith('alsa_output'):
-            loopback_modules = self.get_modules('module-loopback')
-            if not any(lm.args['source'] == source.name and lm.args['sink'] == self.ar_sink for lm in loopback_modules):
-                self.load_loopback_module(source.name, self.ar_sink)
-
             log.debug('Source device: {} is not supported'.format(source.name))
             self.devices.unsupported_sources[source.name] = source
             return
@@ -445,17 +1322,7 @@ class AudioCtrl(Controller, threading.Thread):
                     log.warning('Source {} does not have a float value for volume'.format(source.name))
                     source_volume = .85
 
-        self.set_volume('source', source, source_volume)
-
-        self.unload_loopback_modules(source_name=source.name)
-
-        if self.sink_device and source_type == 'aux':
-            for sink in self.devices.sink.values():
-                self.load_loopback_module(source.name, sink.name)
-
-        elif self.sink_device and source_type == 'mic':
-            self.load_loopback_module(source.name, self.ar_sink)
-
+        source.target_volume = source_volume
         source.type = source_type
         source.device = 'pa'
         self.devices.source[source.index] = source
@@ -475,7 +1342,7 @@ class AudioCtrl(Controller, threading.Thread):
         self.devices.sink.pop(sink.index, None)
 
         if self.sink_device == sink.name:
-            self.sink_device = None
+            self.sink_device = next((remaining.name for remaining in self.devices.sink.values()), None)
         
         if sink.proplist.get('alsa.card') and sink.proplist.get('alsa.long_card_name'):
             alsa_card = sink.proplist['alsa.card']
@@ -492,21 +1359,14 @@ class AudioCtrl(Controller, threading.Thread):
             return
 
         log.warning('Source device {} has been disconnected'.format(source.name))
-        self.unload_loopback_modules(source_name=source.name)
         self.devices.source.pop(source.index, None)
+        self.devices.unsupported_sources.pop(source.name, None)
 
     """Setup PulseAudio devices and load the null sink."""
     def setup_devices(self):
-        self.unload_suspend_on_idle()
+        self.mirror.seed()
 
-        # Load null sink
-        self.pulse_audio_callback('module_load', [
-            'module-null-sink',
-            f'sink_name={self.ar_sink} sink_properties=device.description=ProjectMAR-NULL-Sink'
-            ])
-
-        # Set null sink monitor as default
-        self.pulse_audio_callback('source_default_set', 'platform-project_mar.stereo.monitor')
+        self.unload_suspend_on_idle()
 
         for card in self.pulse_audio_callback('card_list'):
             self.add_card_device(card)
@@ -514,74 +1374,133 @@ class AudioCtrl(Controller, threading.Thread):
         for sink in self.pulse_audio_callback('sink_list'):
             self.add_sink_device(sink)
 
-        self.setup_combined_sink()
-
         for source in self.pulse_audio_callback('source_list'):
             self.add_source_device(source)
 
+        # Load the null sink, combined sink and loopbacks and set the defaults/volumes in one pass
+        self.reconcile()
+
     """Handle PulseAudio events for device changes.
     @param event: The PulseAudio event object containing information about the device change.
     """
     def pulse_event_handler(self, event):
-        device      = None
-        device_type = event.facility._value
-        try:
-            match event.t:
-                case 'new':
-                    log.info(f'PulseAudio new event for device type: {device_type} index: {event.index}')
+        self.event_coalescer.add(event.facility._value, event.index, event.t)
 
-                    for pulse_item in self.pulse_audio_callback(f'{device_type}_list'):
-                        if event.index == pulse_item.index:
-                            device = pulse_item
-                            break
+    """Apply a consolidated device change to the catalog.
+    @param device_type: The PulseAudio device type
+    @param index: The PulseAudio device index
+    @param action: The consolidated event type (new/remove)
+    @param device: The mirrored device object
+    @returns True if the catalog changed
+    """
+    def handle_device_event(self, device_type, index, action, device):
+        match action:
+            case 'new':
+                log.info(f'PulseAudio new event for device type: {device_type} index: {index}')
 
-                    if not device:
-                        log.warning(f'Unable to find PulseAudio {device_type} with index {event.index} for event {event.t}')
+                if not device:
+                    log.warning(f'Unable to find PulseAudio {device_type} with index {index} for event {action}')
 
-                    elif device.name == 'combined':
-                        pass
+                elif device.name == 'combined':
+                    pass
 
-                    elif device.name.startswith('bluez_source'):
-                        pass
+                elif device.name.startswith('bluez_source'):
+                    pass
 
-                    else:
-                        getattr(self, f'add_{device_type}_device')(device)
+                else:
+                    getattr(self, f'add_{device_type}_device')(device)
+                    return True
 
-                        if device_type == 'sink':
-                            self.setup_combined_sink()
+            case 'remove':
+                log.info(f'PulseAudio remove event for device type: {device_type} index: {index}')
 
-                case 'remove':
-                    log.info(f'PulseAudio remove event for device type: {device_type} index: {event.index}')
+                device = None
+                devices = getattr(self.devices, device_type)
+                if devices.get(index):
+                    device = devices[index]
 
-                    devices = getattr(self.devices, device_type)
-                    if devices.get(event.index):
-                        device = devices[event.index]
+                # Output monitors are only tracked as unsupported sources but are still routed
+                elif device_type == 'source':
+                    device = next((source for source in self.devices.unsupported_sources.values() if source.index == index), None)
 
-                    if not device:
-                        log.warning(f'Unable to find PulseAudio {device_type} with index {event.index} for event {event.t}')
+                if not device:
+                    log.warning(f'Unable to find PulseAudio {device_type} with index {index} for event {action}')
 
-                    elif device.name == 'combined':
-                        pass
+                elif device.name == 'combined':
+                    pass
 
-                    else:
-                        getattr(self, f'remove_{device_type}_device')(device)
+                else:
+                    getattr(self, f'remove_{device_type}_device')(device)
+                    return True
+
+        return False
+
+    """Process a consolidated batch of PulseAudio events and reconcile the routing once.
+    @param changes: a list of (facility, index, action) tuples from the event coalescer
+    """
+    def process_events(self, changes):
+        catalog_changed = False
+        for device_type, index, action in changes:
+            try:
+                device = self.mirror.update(device_type, index, action)
+                if device_type != 'module' and action != 'change':
+                    catalog_changed |= self.handle_device_event(device_type, index, action, device)
 
+            except Exception as e:
+                log.error(f'Failed to handle PulseAudio event: {e}')
+
+        if catalog_changed:
+            try:
+                self.reconcile()
+                self.event_coalescer.reconciliations += 1
+            except Exception as e:
+                log.error(f'Failed to reconcile audio routing: {e}')
+
+        log.debug(f'Processed {len(changes)} PulseAudio changes; metrics: {self.get_metrics()}')
+
+    """Measure the loopback latencies and reload loopbacks whose latency was adjusted"""
+    def tune_loopback_latency(self):
+        try:
+            if self.latency_tuner.update(self.get_owned_loopbacks(), self.pulse_audio_callback('sink_input_list')):
+                self.reconcile()
         except Exception as e:
-            log.error(f'Failed to handle PulseAudio event: {e}')
+            log.error(f'Failed to tune loopback latency: {e}')
+
+    """Get the PulseAudio event metrics"""
+    def get_metrics(self):
+        return self.event_coalescer.get_metrics()
 
 
     """Run the audio controller thread to handle PulseAudio devices"""
     def run(self):
+        if self.activity_monitor:
+            self.activity_monitor.start()
+
         while not self._thread_event.is_set():
             try:
                 log.info('starting new pulse audio event listener...')
                 with Pulse('ProjectMAR Event Listener') as pulse:
-                    pulse.event_mask_set('sink', 'source', 'card')
+                    pulse.event_mask_set('sink', 'source', 'card', 'module')
                     pulse.event_callback_set(self.pulse_event_handler)
 
+                    # Events are only received once subscribed so reseed anything missed while disconnected
+                    self.mirror.seed()
+
                     while not self._thread_event.is_set():
                         pulse.event_listen(timeout=.1)
 
+                        if self.event_coalescer.ready():
+                            self.process_events(self.event_coalescer.flush())
+
+                        if self.latency_tuner and self.latency_tuner.due():
+                            self.tune_loopback_latency()
+
+                        if self._routing_dirty.is_set():
+                            try:
+                                self.reconcile()
+                            except Exception as e:
+                                log.error(f'Failed to reconcile audio routing: {e}')
+
             except Exception as e:
                 log.exception(f'Unhandled exception in PulseAudio thread: {e}')
 
@@ -589,20 +1508,243 @@ class AudioCtrl(Controller, threading.Thread):
 
     """Close the PulseAudio connection and unload modules"""
     def close(self):            
+        if self.activity_monitor:
+            self.activity_monitor.stop()
+
         for source_index, source_device in self.devices.source.items():
             if not source_device.name.startswith('bluez_source'):
                 self.unload_loopback_modules(source_name=source_device.name)
 
         self.unload_null_sink_modules()
         self.unload_combined_sink_modules()
+
+        self.pulse.close()
         
+class BlueZClient(threading.Thread):
+    """Persistent D-Bus client for BlueZ.
+    Devices and media players are mirrored from the BlueZ object manager and kept current from
+    PropertiesChanged and InterfacesAdded/Removed signals, so queries are in-memory lookups.
+    Method calls use a separate connection serialized with a lock because jeepney's blocking
+    connections are not thread-safe.
+    @param bus: the message bus BlueZ is on ('SYSTEM', or 'SESSION' for a mock service)
+    @param call_timeout: the seconds to wait for a method call reply
+    """
+    def __init__(self, bus='SYSTEM', call_timeout=5):
+        threading.Thread.__init__(self, name='BlueZClient', daemon=True)
+
+        self.bus            = bus
+        self.call_timeout   = call_timeout
+
+        self.devices        = dict()
+        self.players        = dict()
+
+        self._call_conn     = None
+        self._call_lock     = threading.Lock()
+        self._lock          = threading.Lock()
+        self._ready         = threading.Event()
+        self._stop_event    = threading.Event()
+
+    """Check whether the device and player state has been loaded"""
+    def is_ready(self):
+        return self._ready.is_set()
+
+    """Wait for the device and player state to be loaded.
+    @param timeout: the seconds to wait
+    """
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    """Strip the signatures from a dictionary of D-Bus variants.
+    @param properties: a dictionary of property names to (signature, value) tuples
+    """
+    @staticmethod
+    def _unwrap(properties):
+        return {name: value for name, (signature, value) in properties.items()}
+
+    """Store the BlueZ interfaces of an object.
+    @param path: the object path
+    @param interfaces: a dictionary of interface names to properties
+    """
+    def _add_interfaces(self, path, interfaces):
+        with self._lock:
+            for interface, properties in interfaces.items():
+                if interface == BLUEZ_DEVICE_INTERFACE:
+                    self.devices.setdefault(path, dict()).update(self._unwrap(properties))
+                elif interface == BLUEZ_PLAYER_INTERFACE:
+                    self.players.setdefault(path, dict()).update(self._unwrap(properties))
+
+    """Remove BlueZ interfaces of an object.
+    @param path: the object path
+    @param interfaces: a list of interface names
+    """
+    def _remove_interfaces(self, path, interfaces):
+        with self._lock:
+            if BLUEZ_DEVICE_INTERFACE in interfaces:
+                self.devices.pop(path, None)
+            if BLUEZ_PLAYER_INTERFACE in interfaces:
+                self.players.pop(path, None)
+
+    """Load every BlueZ device and media player.
+    @param conn: the signal connection
+    """
+    def _seed(self, conn):
+        msg = new_method_call(DBusAddress('/', bus_name=BLUEZ_SERVICE, interface=DBUS_OBJECT_MANAGER), 'GetManagedObjects')
+        objects = conn.send_and_get_reply(msg, timeout=self.call_timeout).body[0]
+
+        with self._lock:
+            self.devices.clear()
+            self.players.clear()
+
+        for path, interfaces in objects.items():
+            self._add_interfaces(path, interfaces)
+
+        log.info(f'Loaded {len(self.devices)} bluetooth devices and {len(self.players)} media players from BlueZ')
+
+    """Apply a BlueZ signal to the mirrored state.
+    @param msg: the signal message
+    """
+    def _dispatch(self, msg):
+        interface = msg.header.fields.get(HeaderFields.interface)
+        member = msg.header.fields.get(HeaderFields.member)
+        path = msg.header.fields.get(HeaderFields.path)
+
+        if interface == DBUS_PROPERTIES and member == 'PropertiesChanged':
+            changed_interface, changed, invalidated = msg.body
+            if changed_interface in (BLUEZ_DEVICE_INTERFACE, BLUEZ_PLAYER_INTERFACE):
+                self._add_interfaces(path, {changed_interface: changed})
+                if changed_interface == BLUEZ_DEVICE_INTERFACE and 'Connected' in changed:
+                    log.info(f'Bluetooth device {path} connected: {changed["Connected"][1]}')
+
+        elif interface == DBUS_OBJECT_MANAGER and member == 'InterfacesAdded':
+            self._add_interfaces(*msg.body)
+
+        elif interface == DBUS_OBJECT_MANAGER and member == 'InterfacesRemoved':
+            self._remove_interfaces(*msg.body)
+
+    """Listen for BlueZ signals, reconnecting if the bus connection is lost"""
+    def run(self):
+        rules = [
+            MatchRule(type='signal', sender=BLUEZ_SERVICE, interface=DBUS_PROPERTIES, member='PropertiesChanged'),
+            MatchRule(type='signal', sender=BLUEZ_SERVICE, interface=DBUS_OBJECT_MANAGER)
+            ]
+
+        while not self._stop_event.is_set():
+            try:
+                with open_dbus_connection(bus=self.bus) as conn:
+                    bus_proxy = Proxy(message_bus, conn)
+                    for rule in rules:
+                        bus_proxy.AddMatch(rule)
+
+                    # Signals are matched on the bus by BlueZ's well-known name, which is
+                    # rewritten to its unique name, so only the signal type is filtered here
+                    with conn.filter(MatchRule(type='signal')) as queue:
+                        self._seed(conn)
+                        self._ready.set()
+
+                        while not self._stop_event.is_set():
+                            try:
+                                self._dispatch(conn.recv_until_filtered(queue, timeout=1))
+                            except TimeoutError:
+                                continue
+
+            except Exception as e:
+                log.error(f'BlueZ D-Bus connection failed: {e}')
+                self._ready.clear()
+                self._stop_event.wait(5)
+
+    """Call a BlueZ method.
+    @param path: the object path
+    @param interface: the interface name
+    @param method: the method name
+    @returns the reply body
+    """
+    def call(self, path, interface, method):
+        msg = new_method_call(DBusAddress(path, bus_name=BLUEZ_SERVICE, interface=interface), method)
+        with self._call_lock:
+            for attempt in range(2):
+                try:
+                    if self._call_conn is None:
+                        self._call_conn = open_dbus_connection(bus=self.bus)
+
+                    reply = self._call_conn.send_and_get_reply(msg, timeout=self.call_timeout)
+                    break
+
+                except (OSError, ConnectionError) as e:
+                    if self._call_conn is not None:
+                        self._call_conn.close()
+                        self._call_conn = None
+                    if attempt:
+                        raise
+
+                    log.warning(f'BlueZ D-Bus call connection lost ({e}); reconnecting')
+
+        if reply.header.message_type == MessageType.error:
+            raise DBusErrorResponse(reply)
+
+        return reply.body
+
+    """Get the connected devices.
+    @returns a list of (mac address, name) tuples
+    """
+    def get_connected_devices(self):
+        with self._lock:
+            return [
+                (device.get('Address'), device.get('Alias', device.get('Name', '')))
+                for device in self.devices.values() if device.get('Connected')
+                ]
+
+    """Get the device object path of a MAC address.
+    @param mac_address: the device MAC address
+    """
+    def get_device_path(self, mac_address):
+        with self._lock:
+            for path, device in self.devices.items():
+                if device.get('Address', '').upper() == mac_address.upper():
+                    return path
+
+        return None
+
+    """Get the active media player, preferring one that is playing.
+    @returns the player object path or None if no connected device has a player
+    """
+    def get_player_path(self):
+        with self._lock:
+            connected = [path for path in self.players if self.devices.get(self.players[path].get('Device'), dict()).get('Connected', True)]
+            connected.sort(key=lambda path: self.players[path].get('Status') != 'playing')
+
+        return connected[0] if connected else None
+
+    """Stop listening and close the connections"""
+    def stop(self):
+        self._stop_event.set()
+        with self._call_lock:
+            if self._call_conn is not None:
+                self._call_conn.close()
+                self._call_conn = None
+
 class BluetoothManager:
-    """Controller for managing Bluetooth devices"""
-    def __init__(self):
-        pass
-        
-    """Get connected Bluetooth devices using bluetoothctl"""
+    """Controller for managing Bluetooth devices.
+    BlueZ is used over D-Bus when jeepney is installed, falling back to bluetoothctl otherwise.
+    @param bus: the message bus BlueZ is on ('SYSTEM', or 'SESSION' for a mock service)
+    """
+    def __init__(self, bus='SYSTEM'):
+        self.bluez = None
+        if JEEPNEY_INSTALLED:
+            self.bluez = BlueZClient(bus)
+            self.bluez.start()
+        else:
+            log.warning('jeepney is not installed and therefore bluetooth will be managed with bluetoothctl!')
+
+    """Check whether BlueZ can be used over D-Bus"""
+    def _use_dbus(self):
+        return self.bluez is not None and self.bluez.is_ready()
+
+    """Get connected Bluetooth devices"""
     def get_connected_devices(self):
+        if self._use_dbus():
+            yield from self.bluez.get_connected_devices()
+            return
+
         bluetoothctl =  execute('bluetoothctl', 'bluetoothctl', ['bluetoothctl', 'devices', 'Connected'])
         for line in iter(bluetoothctl.process.stdout.readline, ''):
             log.debug('bluetoothctl output: {}'.format(line))
@@ -613,24 +1755,65 @@ class BluetoothManager:
                     
                 yield mac_address, device
 
-    """Execute a player command for a Bluetooth device"""
+    """Execute a player command for a Bluetooth device.
+    @param action: the player command (ie: play, pause, stop, next, previous)
+    """
     def player(self, action):
         log.info('Attempting to {} bluetooth audio'.format(action))
-        execute_managed(['bluetoothctl', 'player.{}'.format(action)])
+        if self._use_dbus():
+            player_path = self.bluez.get_player_path()
+            if player_path is None:
+                log.warning('No bluetooth media player is available')
+                return False
+
+            return self._call(player_path, BLUEZ_PLAYER_INTERFACE, action.capitalize())
 
-    """Connect a Bluetooth device using bluetoothctl.
+        return execute_managed(['bluetoothctl', 'player.{}'.format(action)])
+
+    """Connect a Bluetooth device.
     @param source_device: The PluginDevice object representing the Bluetooth device to connect.
     """
     def connect_device(self, source_device):
         log.info('Connecting bluetooth device: {}'.format(source_device.name))
-        execute_managed(['bluetoothctl', 'connect', source_device.mac_address])
+        return self._device_call(source_device, 'Connect', 'connect')
          
-    """Disconnect a Bluetooth device using bluetoothctl.
+    """Disconnect a Bluetooth device.
     @param source_device: The PluginDevice object representing the Bluetooth device to disconnect.
     """
     def disconnect_device(self, source_device):
         log.info('Disconnecting bluetooth device: {}'.format(source_device.name))
-        execute_managed(['bluetoothctl', 'disconnect', source_device.mac_address])
+        return self._device_call(source_device, 'Disconnect', 'disconnect')
+
+    """Call a Device1 method over D-Bus, or the equivalent bluetoothctl command.
+    @param source_device: The PluginDevice object representing the Bluetooth device.
+    @param method: the Device1 method name
+    @param command: the bluetoothctl command
+    """
+    def _device_call(self, source_device, method, command):
+        if self._use_dbus():
+            device_path = self.bluez.get_device_path(source_device.mac_address)
+            if device_path is not None:
+                return self._call(device_path, BLUEZ_DEVICE_INTERFACE, method)
+
+            log.warning('Bluetooth device {} is not known to BlueZ'.format(source_device.mac_address))
+
+        return execute_managed(['bluetoothctl', command, source_device.mac_address])
+
+    """Call a BlueZ method and log any failure.
+    @returns a boolean indicating whether the call succeeded
+    """
+    def _call(self, path, interface, method):
+        try:
+            self.bluez.call(path, interface, method)
+            return True
+        except Exception as e:
+            log.error('BlueZ {}.{} on {} failed: {}'.format(interface, method, path, e))
+            return False
+
+    """Stop the BlueZ client"""
+    def close(self):
+        if self.bluez:
+            self.bluez.stop()
 
 
 class VLCManager:
@@ -661,6 +1844,11 @@ class PhysicalMediaCtrl(Controller, threading.Thread):
         self.usb_listener_enabled    = self._config.audio_ctrl.get('usb_listener_enabled', False)
         self.local_listener_enabled = self._config.audio_ctrl.get('local_listener_enabled', False)
         self.local_listener_path          = self._config.audio_ctrl.get('local_listener_path')
+        self.audio_listener_tap     = self._config.audio_ctrl.get('audio_listener_tap', False)
+
+        self.pcm_consumer           = None
+        self.direct_capture         = False
+        self.audio_tap              = None
 
         self.vlc_instance = vlc.Instance()        
         self.vlc_list_player = self.vlc_instance.media_list_player_new()
@@ -691,48 +1879,226 @@ class PhysicalMediaCtrl(Controller, threading.Thread):
         event_manager = self.media_player.event_manager()
         event_manager.event_attach(vlc.EventType.MediaPlayerMediaChanged, self.on_media_changed)
 
+        self.media_index = MediaLibraryIndex(
+            self._config.audio_ctrl.get('media_index_path', None) or os.path.join(APP_ROOT, 'media_index.json'),
+            self.vlc_instance,
+            self._config.audio_ctrl.get('media_index_workers', 2)
+            )
+        self.media_index.load()
+
+        self.media_queue = MediaQueue(
+            self.vlc_media_list,
+            self.media_player,
+            self.create_media,
+            self._config.audio_ctrl.get('audio_listener_window', 20),
+            self.audio_listener_random
+            )
+
         self.current_file_count = 0
+        self._mount_scans = dict()
+        # Guards the media queue and file count against mount scans and unmounts on other threads
+        self._media_lock = threading.RLock()
+
         self.context = pyudev.Context()
         self.monitor = pyudev.Monitor.from_netlink(self.context)
-        self.monitor.filter_by(subsystem='usb')    
+        self.monitor.filter_by(subsystem='block')
+
+    """Set the consumer of the tapped playback audio.
+    @param pcm_consumer: a callable accepting (samples, frame count, channels), ie: ProjectMWrapper.add_pcm
+    """
+    def set_pcm_consumer(self, pcm_consumer):
+        self.pcm_consumer = pcm_consumer
+
+    """Set whether the visualizer captures its sources directly.
+    The tap still plays on the default sink, whose monitor the loopback capture mode feeds to the
+    visualizer as well, so the tap is only enabled when direct capture opened its devices.
+    @param direct_capture: whether direct capture opened its capture devices
+    """
+    def set_direct_capture(self, direct_capture):
+        self.direct_capture = direct_capture
+
+    """Route the playback audio through the in-process tap if enabled"""
+    def setup_audio_tap(self):
+        if not self.audio_listener_tap:
+            return
+
+        if not self.pcm_consumer:
+            log.warning('Audio listener tap is enabled but there is no PCM consumer')
+            return
+
+        if not self.direct_capture:
+            log.warning('Audio listener tap requires direct capture as the sink monitor loopbacks would feed the same audio to the visualizer twice; using the default audio output')
+            return
+
+        try:
+            self.audio_tap = MediaAudioTap(self.pcm_consumer)
+            self.audio_tap.attach(self.media_player)
+        except Exception as e:
+            log.error(f'Failed to set up the audio listener tap; using the default audio output: {e}')
+            self.audio_tap = None
 
     def get_supported_audio_files(self, path):
         audio_files = []
         for root, _, files in os.walk(path):
             for file in files:
-                if file.lower().endswith(('.mp3', '.wav', '.flac', '.ogg')):
+                if file.lower().endswith(AUDIO_FILE_EXTENSIONS):
                     audio_files.append(os.path.join(root, file))
         return audio_files
 
+    """Load the audio files of a directory into the media queue.
+    Only the next tracks of the queue are created as VLC media, so building the playlist of a
+    large library costs a directory walk rather than a media object per file.
+    @param path: the library directory
+    """
     def build_playlist(self, path):
         log.info(f"Building playlist from: {path}")
         media_paths = self.get_supported_audio_files(path)
 
-        if self.audio_listener_random:
-            random.shuffle(media_paths)
+        self.media_index.prune(path, media_paths)
+        self.media_index.refresh(media_paths)
+
+        with self._media_lock:
+            self.media_queue.reset(media_paths)
+            self.current_file_count = len(self.media_queue)
+
+    """Apply library changes to the media queue without rebuilding it.
+    @param added: the paths of the added audio files
+    @param removed: the paths of the removed audio files
+    """
+    def update_playlist(self, added, removed):
+        with self._media_lock:
+            removed = self.media_queue.remove(removed)
+            added = self.media_queue.add(added)
+            self.current_file_count = len(self.media_queue)
+
+        self.media_index.remove(removed)
+        self.media_index.refresh(added)
+
+        log.info(f'Media library changed: {len(added)} added, {len(removed)} removed, {self.current_file_count} files')
+
+    """Empty the media queue so files can be streamed into it"""
+    def reset_playlist(self):
+        with self._media_lock:
+            self.media_queue.reset(list())
+            self.current_file_count = 0
+
+    """Scan a newly mounted filesystem, starting playback with the first audio file found and
+    streaming the rest of the files into the media list in batches.
+    @param mount_point: the mount point to scan
+    @param stop_event: an event set when the filesystem is unmounted
+    """
+    def scan_mount(self, mount_point, stop_event):
+        log.info(f'Scanning {mount_point} for audio files...')
+        batch = list()
+        last_flush = time.monotonic()
+        found = list()
+
+        for file_path in iter_audio_files(mount_point, AUDIO_FILE_EXTENSIONS):
+            if stop_event.is_set() or self._thread_event.is_set():
+                return
+
+            batch.append(file_path)
+            found.append(file_path)
+            if len(found) == 1 or len(batch) >= MOUNT_SCAN_BATCH_SIZE or time.monotonic() - last_flush >= MOUNT_SCAN_BATCH_INTERVAL:
+                if not self.add_scanned_files(batch, stop_event):
+                    return
+
+                batch = list()
+                last_flush = time.monotonic()
+
+        if not self.add_scanned_files(batch, stop_event):
+            return
+
+        # Only a complete scan shows which indexed files are gone from the filesystem
+        self.media_index.prune(mount_point, found)
+        log.info(f'Finished scanning {mount_point}: {len(found)} audio files')
 
-        new_media_list = self.vlc_instance.media_list_new()
-        for file_path in media_paths:
-            media = self.vlc_instance.media_new_path(file_path)
-            new_media_list.add_media(media)
+    """Append audio files to the media list and start playback if nothing was playing.
+    @param file_paths: the audio file paths
+    """
+    def add_media_files(self, file_paths):
+        with self._media_lock:
+            was_empty = self.current_file_count == 0
+            self.update_playlist(file_paths, [])
+
+            if was_empty and self.current_file_count > 0:
+                log.info("Starting VLC playback...")
+                self.vlc_list_player.play()
+
+    """Add a batch of scanned files unless their filesystem has been unmounted.
+    The unmount sets the stop event before taking the media lock, so a batch is either added
+    before the unmount removes the mount's files or not at all.
+    @param file_paths: the audio file paths
+    @param stop_event: an event set when the filesystem is unmounted
+    @returns False if the scan should stop
+    """
+    def add_scanned_files(self, file_paths, stop_event):
+        with self._media_lock:
+            if stop_event.is_set():
+                return False
+
+            if file_paths:
+                self.add_media_files(file_paths)
 
-        self.vlc_list_player.set_media_list(new_media_list)
-        self.vlc_media_list = new_media_list
-        self.current_file_count = len(media_paths)
+        return True
 
+    """Start scanning a mounted filesystem in the background.
+    @param mount_point: the mount point
+    @param device: the mounted device
+    """
+    def on_mounted(self, mount_point, device):
+        log.info(f'{device} mounted at {mount_point}')
+        stop_event = threading.Event()
+        scan_thread = threading.Thread(target=self.scan_mount, args=(mount_point, stop_event), daemon=True)
+        self._mount_scans[mount_point] = (scan_thread, stop_event)
+        scan_thread.start()
+
+    """Remove the files of an unmounted filesystem from the media list.
+    @param mount_point: the mount point
+    @param device: the device that was mounted
+    """
+    def on_unmounted(self, mount_point, device):
+        log.warning(f'{device} unmounted from {mount_point}')
+        scan = self._mount_scans.pop(mount_point, None)
+        if scan:
+            scan[1].set()
+
+        prefix = os.path.join(mount_point, '')
+        with self._media_lock:
+            self.update_playlist(list(), [path for path in list(self.media_queue.indexes) if path.startswith(prefix)])
+            if self.current_file_count == 0:
+                # Played tracks stay in the media list, so clear it for the next mount to start at its own first file
+                self.stop_playback()
+                self.reset_playlist()
+
+    """Create a VLC media item with any indexed tags already set so VLC does not need to parse it.
+    @param file_path: the audio file path
+    """
+    def create_media(self, file_path):
+        media = self.vlc_instance.media_new_path(file_path)
+        entry = self.media_index.get(file_path)
+        if entry:
+            for name, (mutagen_tag, vlc_tag) in MEDIA_TAGS.items():
+                if entry['tags'].get(name):
+                    media.set_meta(vlc_tag, entry['tags'][name])
+
+        return media
+
+    """Log the now playing metadata from the media index.
+    This runs on a VLC event thread so files that have not been indexed yet are queued rather than parsed.
+    """
     def on_media_changed(self, event):
         media = self.media_player.get_media()
         if media:
-            media.parse_with_options(vlc.MediaParseFlag.local, timeout=5)
-            log.info(media.__dict__)
-            metadata = {
-                'Title': media.get_meta(vlc.Meta.Title),
-                'Artist': media.get_meta(vlc.Meta.Artist),
-                'Album': media.get_meta(vlc.Meta.Album),
-                'Genre': media.get_meta(vlc.Meta.Genre),
-                'Track Number': media.get_meta(vlc.Meta.TrackNumber),
-                'Duration (sec)': media.get_duration() / 1000
-            }
+            file_path = unquote(urlparse(media.get_mrl()).path)
+            entry = self.media_index.get(file_path)
+            if entry is None:
+                log.info(f"Now Playing: {os.path.basename(file_path)} (not indexed yet)")
+                self.media_index.refresh([file_path])
+                return
+
+            metadata = {name: entry['tags'].get(name) for name in MEDIA_TAGS}
+            metadata['Duration (sec)'] = entry['duration']
 
             log.info("Now Playing:")
             for key, value in metadata.items():
@@ -752,35 +2118,11 @@ class PhysicalMediaCtrl(Controller, threading.Thread):
 
     """Run the local or USB audio listener based on the configured mode"""
     def run(self):
-        if self.audio_listener_mode == 'usb' and self.usb_listener_enabled:
-            log.info('USB listener enabled, starting CVLC process...')
-
-            listener_path = '/media'
-            usb_storage_devices = [
-                device for device in self.context.list_devices(subsystem='block', DEVTYPE='disk')
-                if device.attributes.asstring('removable') == '1'
-            ]
-
-            if len(usb_storage_devices) > 0:
-                self.start_playback(listener_path)
-            try:
-                while not self._thread_event.is_set():
-                    device = self.monitor.poll(timeout=1)
-                    if device is None:
-                        continue
-
-                    if device.get('SUBSYSTEM') == 'block' and device.get('DEVTYPE') == 'disk':
-                        if device.action == 'add':
-                            log.info(f"USB device connected: {device.device_node} ({device.sys_name} starting CVLC process")
-                            time.sleep(1)   # Wait for the device to be ready
-                            self.start_playback(listener_path)
+        self.setup_audio_tap()
 
-                        elif device.action == 'remove':
-                            log.warning(f"USB device disconnected: {device.device_node} ({device.sys_name} stopping CVLC process")
-                            self.stop_playback()
-
-            except Exception as e:
-                print(f"An error occurred: {e}")
+        if self.audio_listener_mode == 'usb' and self.usb_listener_enabled:
+            log.info(f'USB listener enabled, waiting for filesystems to be mounted under {USB_MEDIA_PATH}...')
+            self.watch_usb_mounts()
 
         elif self.audio_listener_mode == 'local' and self.local_listener_enabled:
 
@@ -793,6 +2135,10 @@ class PhysicalMediaCtrl(Controller, threading.Thread):
             log.info(f'Local listener enabled, starting CVLC process listening to {self.local_listener_path}...')
             self.start_playback(self.local_listener_path)
 
+            if MediaLibraryWatcher.is_available():
+                self.watch_local_library()
+                return
+
             while not self._thread_event.is_set():
                 current_files = self.get_supported_audio_files(self.local_listener_path)
                 current_file_count = len(current_files)
@@ -802,15 +2148,102 @@ class PhysicalMediaCtrl(Controller, threading.Thread):
                     self.stop_playback()
                     self.start_playback(self.local_listener_path)
 
+                self.media_queue.fill()
                 time.sleep(1)
 
         else:
             log.error('Invalid audio listener mode configured: {}'.format(self.audio_listener_mode))
             return
 
+    """Play audio files from filesystems as they are mounted under /media.
+    Playback follows the mount table rather than a fixed delay after the USB event, and only the
+    new mount point is scanned.
+    """
+    def watch_usb_mounts(self):
+        mount_watcher = MountWatcher(USB_MEDIA_PATH)
+        try:
+            mount_watcher.open()
+            self.reset_playlist()
+            for mount_point, device in mount_watcher.mounts.items():
+                self.on_mounted(mount_point, device)
+
+            self.monitor.start()
+            poller = select.poll()
+            poller.register(self.monitor.fileno(), select.POLLIN)
+            poller.register(mount_watcher.fileno(), select.POLLPRI | select.POLLERR)
+
+            while not self._thread_event.is_set():
+                self.media_queue.fill()
+                for fd, event in poller.poll(1000):
+                    if fd == mount_watcher.fileno():
+                        added, removed = mount_watcher.get_changes()
+                        for mount_point, device in removed.items():
+                            self.on_unmounted(mount_point, device)
+                        for mount_point, device in added.items():
+                            self.on_mounted(mount_point, device)
+                        continue
+
+                    device = self.monitor.poll(timeout=0)
+                    if device is None or device.get('DEVTYPE') != 'disk':
+                        continue
+
+                    if device.action == 'add':
+                        log.info(f"USB device connected: {device.device_node} ({device.sys_name}); waiting for it to be mounted")
+
+                    elif device.action == 'remove' and device.device_node:
+                        log.warning(f"USB device disconnected: {device.device_node} ({device.sys_name})")
+
+                        # Drop the files now rather than when the filesystem is lazily unmounted
+                        partition_pattern = re.compile(re.escape(device.device_node) + r'p?\d*')
+                        for mount_point, mounted_device in list(mount_watcher.mounts.items()):
+                            if partition_pattern.fullmatch(mounted_device):
+                                self.on_unmounted(mount_point, mounted_device)
+
+        except Exception as e:
+            log.exception(f'USB listener failed: {e}')
+
+        finally:
+            mount_watcher.close()
+
+    """Apply changes to the local library as inotify reports them"""
+    def watch_local_library(self):
+        watcher = MediaLibraryWatcher(self.local_listener_path, AUDIO_FILE_EXTENSIONS)
+        try:
+            watcher.open()
+            while not self._thread_event.is_set():
+                self.media_queue.fill()
+                changes = watcher.poll(1, self.media_queue.indexes)
+
+                if watcher.rescan_needed:
+                    watcher.reset()
+                    self.stop_playback()
+                    self.start_playback(self.local_listener_path)
+                    continue
+
+                if changes is None:
+                    continue
+
+                added, removed = changes
+                was_empty = self.current_file_count == 0
+                self.update_playlist(added, removed)
+
+                if self.current_file_count == 0:
+                    self.stop_playback()
+                elif was_empty:
+                    log.info('Local listener found audio files, starting playback...')
+                    self.vlc_list_player.play()
+
+        finally:
+            watcher.close()
+
     """Close the physical media controller and clean up resources"""
     def close(self):
         log.info('Closing PhysicalMediaCtrl...')
         self.stop_playback()
 
+        if self.audio_tap:
+            self.audio_tap.close()
+
+        self.media_index.close()
+
         return self._close()
\ No newline at end of file
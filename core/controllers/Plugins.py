@@ -1,12 +1,138 @@
+import errno
 import logging
 import os
+import select
+import stat
 import threading
 
+import numpy as np
+
 from lib.abstracts import Controller
 from lib.config import APP_ROOT, Config
+from lib.multiplexer import OutputMultiplexer
 
 log = logging.getLogger()
 
+# Raw PCM sample formats accepted from plugins and the divisor normalizing them to -1.0 - 1.0
+PCM_FORMATS = {
+    'f32le': (np.dtype('<f4'), 1.0),
+    's16le': (np.dtype('<i2'), 32768.0),
+    's32le': (np.dtype('<i4'), 2147483648.0)
+    }
+
+class PCMFifoReader(threading.Thread):
+    """Read raw interleaved PCM written by a plugin into a named pipe and feed it to projectM.
+    The pipe is created if it does not exist and reopened whenever the writer closes it, so
+    plugins can be restarted without restarting the reader.
+    @param thread_event: an event to signal the thread to stop
+    @param name: the plugin name
+    @param fifo_path: the path of the named pipe
+    @param pcm_consumer: a callable accepting (samples, frame count, channels)
+    @param sample_format: the sample format (see PCM_FORMATS)
+    @param channels: the number of interleaved channels
+    @param frames_per_read: the maximum number of frames read at once
+    """
+    def __init__(self, thread_event, name, fifo_path, pcm_consumer, sample_format='s16le', channels=2, frames_per_read=512):
+        threading.Thread.__init__(self, name=f'{name}_PCM', daemon=True)
+
+        if sample_format not in PCM_FORMATS:
+            raise ValueError(f'Unsupported PCM format {sample_format}; expected one of {", ".join(PCM_FORMATS)}')
+
+        self.plugin_name    = name
+        self.fifo_path      = fifo_path
+        self.pcm_consumer   = pcm_consumer
+        self.channels       = channels
+
+        self.frames_read    = 0
+
+        self._thread_event  = thread_event
+        self._dtype, self._scale = PCM_FORMATS[sample_format]
+        self._frame_size    = self._dtype.itemsize * channels
+        self._read_size     = self._frame_size * frames_per_read
+        self._remainder     = b''
+
+    """Create the named pipe if it does not exist"""
+    def create_fifo(self):
+        try:
+            if not stat.S_ISFIFO(os.stat(self.fifo_path).st_mode):
+                raise ValueError(f'{self.fifo_path} exists and is not a named pipe')
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(os.path.abspath(self.fifo_path)), exist_ok=True)
+            os.mkfifo(self.fifo_path, 0o660)
+            log.info(f'Created PCM pipe {self.fifo_path} for {self.plugin_name}')
+
+    """Convert whole frames of raw PCM to float samples and hand them to projectM.
+    @param data: the raw PCM bytes
+    """
+    def process(self, data):
+        data = self._remainder + data
+        usable = len(data) - len(data) % self._frame_size
+        self._remainder = data[usable:]
+        if not usable:
+            return
+
+        samples = np.frombuffer(data[:usable], dtype=self._dtype).astype(np.float32)
+        if self._scale != 1.0:
+            samples /= self._scale
+
+        frame_count = usable // self._frame_size
+        self.frames_read += frame_count
+        self.pcm_consumer(samples, frame_count, channels=self.channels)
+
+    """Read from the pipe until the writer closes it or the thread is stopped.
+    @param fd: the pipe file descriptor
+    """
+    def _read_until_hangup(self, fd):
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+
+        while not self._thread_event.is_set():
+            for _, event in poller.poll(100):
+                data = b''
+                if event & select.POLLIN:
+                    try:
+                        data = os.read(fd, self._read_size)
+                    except BlockingIOError:
+                        continue
+
+                if data:
+                    self.process(data)
+                elif event & (select.POLLHUP | select.POLLERR):
+                    return
+
+    """Run the reader thread"""
+    def run(self):
+        try:
+            self.create_fifo()
+        except (OSError, ValueError) as e:
+            log.error(f'Unable to create PCM pipe for {self.plugin_name}: {e}')
+            return
+
+        log.info(f'Reading {self.plugin_name} PCM from {self.fifo_path}')
+        while not self._thread_event.is_set():
+            try:
+                # Non-blocking so the open does not wait for a writer
+                fd = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError as e:
+                log.error(f'Unable to open PCM pipe {self.fifo_path}: {e}')
+                self._thread_event.wait(1)
+                continue
+
+            try:
+                self._read_until_hangup(fd)
+            except OSError as e:
+                if e.errno != errno.EINTR:
+                    log.error(f'Failed to read PCM from {self.fifo_path}: {e}')
+                    self._thread_event.wait(1)
+            except Exception as e:
+                log.exception(f'Unhandled exception reading PCM from {self.fifo_path}: {e}')
+                self._thread_event.wait(1)
+            finally:
+                os.close(fd)
+                self._remainder = b''
+
+        log.info(f'Stopped reading {self.plugin_name} PCM after {self.frames_read} frames')
+
 class PluginCtrl(Controller, threading.Thread):
     """Controller for managing audio plugins"""
     def __init__(self, thread_event, config):
@@ -14,18 +140,79 @@ class PluginCtrl(Controller, threading.Thread):
         super().__init__(thread_event, config)
         
         self.audio_plugins_config = Config(os.path.join(APP_ROOT, 'conf', 'audio_plugins.conf'))
-                  
-    """Monitor the output of a plugin process"""
-    def monitor_output(self, plugin_name, plugin_output_stream, log_level):
-        while not self._thread_event.is_set():
-            line = next(self._read_stream(plugin_output_stream), None)
-            if line is None:
-                break
+        self.pcm_consumer = None
+
+        general_config = self.audio_plugins_config.general
+        self.output_multiplexer = OutputMultiplexer(
+            thread_event,
+            general_config.get('output_rate_limit', 20),
+            general_config.get('output_rate_burst', 100),
+            general_config.get('output_history', 200)
+            )
+
+    """Set the consumer of PCM written by plugins into their pipes.
+    @param pcm_consumer: a callable accepting (samples, frame count, channels), ie: ProjectMWrapper.add_pcm
+    """
+    def set_pcm_consumer(self, pcm_consumer):
+        self.pcm_consumer = pcm_consumer
 
-            log.log(log_level, '{} Plugin Output: {}'.format(plugin_name, line))
+    """Start reading a plugin's PCM pipe if one is configured.
+    The reader is started before the plugin so the pipe exists when the plugin opens it.
+    @param plugin_name: the plugin name
+    @param plugin_config: the plugin configuration section
+    """
+    def start_pcm_reader(self, plugin_name, plugin_config):
+        fifo_path = plugin_config.get('pcm_fifo', '')
+        if not fifo_path:
+            return
+
+        if not self.pcm_consumer:
+            log.warning(f'{plugin_name} has a PCM pipe configured but there is no PCM consumer')
+            return
+
+        try:
+            reader = PCMFifoReader(
+                self._thread_event,
+                plugin_name,
+                fifo_path,
+                self.pcm_consumer,
+                plugin_config.get('pcm_format', 's16le') or 's16le',
+                plugin_config.get('pcm_channels', 2) or 2
+                )
+        except ValueError as e:
+            log.error(f'Unable to read PCM from {plugin_name}: {e}')
+            return
+
+        reader.start()
+        self._threads[reader.name] = reader
+
+    """Read the output of a plugin process on the output multiplexer.
+    @param plugin_name: the plugin name
+    @param process: the plugin process
+    """
+    def monitor_output(self, plugin_name, process):
+        label = '{} Plugin'.format(plugin_name)
+        self.output_multiplexer.register(plugin_name, process.stdout, logging.INFO, label)
+        self.output_multiplexer.register(plugin_name, process.stderr, logging.ERROR, label)
+
+    """Reattach the output pipes of a restarted plugin to the output multiplexer.
+    @param attr: the ProcessAttributes of the plugin process
+    """
+    def _on_process_started(self, attr):
+        self.monitor_output(attr.name, attr.process)
+
+    """Get the recent output of a plugin for diagnostics.
+    @param plugin_name: the plugin name
+    @returns a list of (timestamp, log level, line) tuples, oldest first
+    """
+    def get_plugin_output(self, plugin_name):
+        return self.output_multiplexer.get_recent(plugin_name)
 
     """Run the plugins controller thread"""
     def run(self):
+        self.output_multiplexer.start()
+        self._threads[self.output_multiplexer.name] = self.output_multiplexer
+
         self._get_running_processes()
         plugins = self.audio_plugins_config.general.get('audio_plugins', list())
         for plugin in plugins:
@@ -39,6 +226,8 @@ class PluginCtrl(Controller, threading.Thread):
                     log.error('Plugin {} has not been configured'.format(plugin))
                     continue
 
+                self.start_pcm_reader(plugin_name, plugin_config)
+
                 plugin_args = list()
                 plugin_args.append(plugin_path)
 
@@ -63,28 +252,7 @@ class PluginCtrl(Controller, threading.Thread):
                 plugin_process_attributes.restore = plugin_restore
 
                 self._processes[plugin_name] = plugin_process_attributes
-        
-                output_monitors = [
-                    {
-                        'name': plugin_name + '_Output',
-                        'target': self.monitor_output, 
-                        'args': (plugin_name, plugin_process_attributes.process.stdout, logging.INFO)
-                    },
-                    {
-                        'name': plugin_name + '_Error',
-                        'target': self.monitor_output, 
-                        'args': (plugin_name, plugin_process_attributes.process.stderr, logging.ERROR)
-                    }
-                ]
-
-                for monitor in output_monitors:
-                    output_thread = threading.Thread(
-                        target=monitor['target'],
-                        args=monitor['args']
-                        )
-
-                    output_thread.start()
-                    self._threads[monitor['name']] = output_thread
+                self.monitor_output(plugin_name, plugin_process_attributes.process)
 
             except AttributeError as ae:
                 log.warning('Unable to load plugin {}: {}'.format(plugin, ae))
@@ -1,6 +1,9 @@
+import errno
 import glob
 import logging
 import os
+import random
+import selectors
 import signal
 import time
 
@@ -10,6 +13,14 @@ from lib.constants import ProcessAttributes
 
 log = logging.getLogger()
 
+# Delay before restarting an exited process, doubled for each consecutive failure up to the maximum
+RESTART_BACKOFF_BASE = 1
+RESTART_BACKOFF_MAX = 60
+# Seconds a process has to run for before its restart backoff is reset
+RESTART_STABLE_PERIOD = 60
+# Longest wait for process exits before the stop event and triggers are checked
+SUPERVISOR_WAIT = 1
+
 class Controller:
     """Base class for all controllers in the projectMAR system.
     @param thread_event: an event to signal the thread to stop
@@ -92,37 +103,153 @@ class Controller:
 
         return ProcessAttributes(name, process, path, expanded_args)
     
-    """Execute a monitored process.
-    @returns a boolean indicating whether the process execution failed
+    """Hook called after a managed process has been restarted (ie: to reattach its output pipes).
+    @param attr: the ProcessAttributes of the process
+    """
+    def _on_process_started(self, attr):
+        pass
+
+    """Watch a managed process for exit with a pidfd.
+    @param selector: the selector the pidfd is registered with
+    @param attr: the ProcessAttributes of the process
+    @returns whether the process is watched (otherwise it has to be polled)
+    """
+    def _watch_process(self, selector, attr):
+        if not hasattr(os, 'pidfd_open'):
+            return False
+
+        try:
+            attr.pidfd = os.pidfd_open(attr.process.pid)
+        except OSError as e:
+            # The process has already been reaped, or pidfds are not supported by the kernel
+            if e.errno != errno.ESRCH:
+                log.debug('Unable to open a pidfd for {}: {}'.format(attr.name, e))
+            return False
+
+        selector.register(attr.pidfd, selectors.EVENT_READ, attr)
+        return True
+
+    """Stop watching a managed process.
+    @param selector: the selector the pidfd is registered with
+    @param attr: the ProcessAttributes of the process
+    """
+    def _unwatch_process(self, selector, attr):
+        if attr.pidfd is not None:
+            selector.unregister(attr.pidfd)
+            os.close(attr.pidfd)
+            attr.pidfd = None
+
+    """Start a managed process again and watch it.
+    @param selector: the selector to register the process with
+    @param attr: the ProcessAttributes of the process
+    """
+    def _restart_process(self, selector, attr):
+        log.info('Starting {}...'.format(attr.args))
+        attr.process = self._execute(attr.name, attr.path, attr.args).process
+        attr.started = time.monotonic()
+        attr.restarts += 1
+
+        self._watch_process(selector, attr)
+        self._on_process_started(attr)
+
+    """Handle the exit of a managed process, scheduling a restart with exponential backoff and jitter.
+    @param attr: the ProcessAttributes of the process
+    """
+    def _process_exited(self, attr):
+        uptime = time.monotonic() - attr.started
+        attr.total_uptime += uptime
+        log.warning(
+            '{} has exited with return code {} after {:.1f} seconds ({} restarts)'.format(
+                attr.name, attr.process.returncode, uptime, attr.restarts
+                ))
+
+        if attr.halt_on_exit:
+            log.warning('Stopping ProjectMAR due to {} exit'.format(attr.name))
+            self._thread_event.set()
+
+        elif attr.restore and attr.process.returncode != 0:
+            attr.failures = 1 if uptime >= RESTART_STABLE_PERIOD else attr.failures + 1
+            delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * 2 ** (attr.failures - 1))
+            delay = random.uniform(delay / 2, delay)
+
+            log.info('Restarting {} in {:.1f} seconds'.format(attr.name, delay))
+            attr.restart_at = time.monotonic() + delay
+
+    """Get the restart and uptime counters of the managed processes"""
+    def get_process_stats(self):
+        now = time.monotonic()
+        stats = dict()
+        for process_name, attr in self._processes.items():
+            running = attr.process.returncode is None
+            uptime = now - attr.started if running else 0
+            stats[process_name] = {
+                'running': running,
+                'returncode': attr.process.returncode,
+                'restarts': attr.restarts,
+                'uptime': uptime,
+                'total_uptime': attr.total_uptime + uptime
+                }
+
+        return stats
+
+    """Supervise the managed processes.
+    Exits are signalled by each process's pidfd so they are handled as soon as they happen;
+    processes are only polled when pidfds are not available.
     """
     def _monitor_processes(self):
-        while not self._thread_event.is_set():
-            for process_name, attr in self._processes.items():
-                if attr.process.poll() != None:
-                    log.warning(
-                        '{} has exited with return code {}'.format(
-                            process_name, attr.process.returncode
-                            ))
-
-                    if attr.halt_on_exit:
-                        log.warning('Stopping ProjectMAR due to {} exit'.format(process_name))
-                        self._thread_event.set()
-
-                    elif attr.restore and attr.process.returncode != 0:
-                        log.info('Starting {}...'.format(attr.args))
-                        process = self._execute(attr.name, attr.path, attr.args)
-                        attr.process = process
-
-                elif attr.trigger:
-                    if attr.trigger.is_set():
+        selector = selectors.DefaultSelector()
+        polled = set()
+        for process_name, attr in self._processes.items():
+            if not self._watch_process(selector, attr):
+                polled.add(process_name)
+
+        try:
+            while not self._thread_event.is_set():
+                now = time.monotonic()
+                timeout = SUPERVISOR_WAIT
+                for attr in self._processes.values():
+                    if attr.restart_at is not None:
+                        timeout = min(timeout, max(attr.restart_at - now, 0))
+
+                for key, events in selector.select(timeout):
+                    attr = key.data
+                    self._unwatch_process(selector, attr)
+                    attr.process.wait()
+                    self._process_exited(attr)
+
+                for process_name in list(polled):
+                    attr = self._processes[process_name]
+                    if attr.process.poll() != None:
+                        polled.discard(process_name)
+                        self._process_exited(attr)
+
+                now = time.monotonic()
+                for process_name, attr in self._processes.items():
+                    if self._thread_event.is_set():
+                        break
+
+                    if attr.restart_at is not None and now >= attr.restart_at:
+                        attr.restart_at = None
+                        self._restart_process(selector, attr)
+                        if attr.pidfd is None:
+                            polled.add(process_name)
+
+                    elif attr.trigger and attr.trigger.is_set() and attr.process.returncode is None:
                         log.warning('Resetting {} due to resolution change'.format(attr.name))
+                        self._unwatch_process(selector, attr)
                         attr.process.kill()
+                        attr.process.wait()
+                        attr.total_uptime += time.monotonic() - attr.started
 
-                        process = self._execute(attr.name, attr.path, attr.args)
-                        attr.process = process
+                        self._restart_process(selector, attr)
+                        if attr.pidfd is None:
+                            polled.add(process_name)
                         attr.trigger.clear()
 
-            time.sleep(1)
+        finally:
+            for attr in self._processes.values():
+                self._unwatch_process(selector, attr)
+            selector.close()
 
     """Perform any controller exit operations"""
     def _close(self):
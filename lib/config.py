@@ -43,6 +43,8 @@ class Config:
                         value = config.get(section, name).split(",")
                     elif name == "card_profile_modes":
                         value = config.get(section, name).split(",")
+                    elif name == "capture_devices":
+                        value = [device.strip() for device in config.get(section, name).split(",") if device.strip()]
                     elif self._is_str_bool(str_value):
                         value = config.getboolean(section, name)
                     elif self._is_str_int(str_value):
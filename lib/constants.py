@@ -1,3 +1,5 @@
+import time
+
 class ProcessAttributes:
     """Attributes for a process that is managed by the system.
     @param name: the name of the process
@@ -14,6 +16,13 @@ class ProcessAttributes:
         self.halt_on_exit   = False
         self.trigger        = None
 
+        self.pidfd          = None
+        self.started        = time.monotonic()
+        self.total_uptime   = 0
+        self.restarts       = 0
+        self.failures       = 0
+        self.restart_at     = None
+
 class PluginDevice:
     """Attributes for a plugin device.
     @param device_name: the name of the plugin device
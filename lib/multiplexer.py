@@ -0,0 +1,228 @@
+import logging
+import os
+import selectors
+import threading
+import time
+
+from collections import deque
+
+log = logging.getLogger()
+
+# Longest line assembled from a stream before it is logged as is
+MAX_LINE_LENGTH = 4096
+
+class OutputSource:
+    """Rate limit and history of the output of a single process (shared by its stdout and stderr).
+    @param name: the process name
+    @param label: the prefix of logged lines
+    @param rate_limit: the number of lines per second logged on average
+    @param burst: the number of lines that may be logged at once before the rate limit applies
+    @param history: the number of recent lines kept for diagnostics
+    """
+    def __init__(self, name, label, rate_limit, burst, history):
+        self.name           = name
+        self.label          = label
+        self.rate_limit     = rate_limit
+        self.burst          = max(burst, 1)
+
+        self.lines          = 0
+        self.suppressed     = 0
+        self.recent         = deque(maxlen=history)
+
+        self._tokens        = self.burst
+        self._updated       = time.monotonic()
+
+    """Take a token from the bucket.
+    @returns whether the line may be logged
+    """
+    def _allow(self):
+        if self.rate_limit <= 0:
+            return True
+
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_limit)
+        self._updated = now
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    """Record and log a line of output.
+    @param line: the line of text
+    @param log_level: the level the line is logged at
+    """
+    def emit(self, line, log_level):
+        self.lines += 1
+        self.recent.append((time.time(), log_level, line))
+
+        if not self._allow():
+            self.suppressed += 1
+            return
+
+        if self.suppressed:
+            log.warning('{} Output: {} lines suppressed by the rate limit'.format(self.label, self.suppressed))
+            self.suppressed = 0
+
+        log.log(log_level, '{} Output: {}'.format(self.label, line))
+
+class OutputStream:
+    """Non-blocking line assembly for a process output pipe.
+    @param source: the OutputSource the lines belong to
+    @param stream: the pipe file object
+    @param log_level: the level lines are logged at
+    """
+    def __init__(self, source, stream, log_level):
+        self.source         = source
+        self.stream         = stream
+        self.log_level      = log_level
+
+        self._partial       = b''
+
+    """Split the data read from the pipe into lines, holding back an incomplete last line.
+    @param data: the bytes read from the pipe
+    """
+    def feed(self, data):
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) >= MAX_LINE_LENGTH:
+            lines.append(self._partial)
+            self._partial = b''
+
+        for line in lines:
+            self._emit(line)
+
+    """Emit any incomplete last line once the pipe has closed"""
+    def flush(self):
+        if self._partial:
+            self._emit(self._partial)
+            self._partial = b''
+
+    def _emit(self, line):
+        text = line.decode('utf-8', errors='replace').strip()
+        if text:
+            self.source.emit(text, self.log_level)
+
+class OutputMultiplexer(threading.Thread):
+    """Read the output pipes of every managed process on a single thread.
+    Pipes are made non-blocking and waited on with a selector, lines are assembled as data
+    arrives, each process is rate limited with a token bucket and a bounded history of its
+    recent output is kept in memory for diagnostics.
+    @param thread_event: an event to signal the thread to stop
+    @param rate_limit: the number of lines per second logged per process (0 disables the limit)
+    @param burst: the number of lines a process may log at once before the rate limit applies
+    @param history: the number of recent lines kept per process
+    """
+    def __init__(self, thread_event, rate_limit=20, burst=100, history=200):
+        threading.Thread.__init__(self, name='OutputMultiplexer', daemon=True)
+
+        self.rate_limit     = rate_limit
+        self.burst          = burst
+        self.history        = history
+
+        self.sources        = dict()
+
+        self._thread_event  = thread_event
+        self._selector      = selectors.DefaultSelector()
+        self._lock          = threading.Lock()
+        self._pending       = list()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+
+    """Wake the selector so pending registrations are applied"""
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b'\0')
+        except BlockingIOError:
+            pass
+
+    """Read the output of a process pipe.
+    @param name: the process name
+    @param stream: the pipe file object (ie: process.stdout)
+    @param log_level: the level lines are logged at
+    @param label: the prefix of logged lines (defaults to the process name)
+    """
+    def register(self, name, stream, log_level, label=None):
+        with self._lock:
+            source = self.sources.get(name)
+            if source is None:
+                source = OutputSource(name, label or name, self.rate_limit, self.burst, self.history)
+                self.sources[name] = source
+
+            os.set_blocking(stream.fileno(), False)
+            self._pending.append(OutputStream(source, stream, log_level))
+
+        self._wake()
+
+    """Get the recent output of a process.
+    @param name: the process name
+    @returns a list of (timestamp, log level, line) tuples, oldest first
+    """
+    def get_recent(self, name):
+        with self._lock:
+            source = self.sources.get(name)
+            return list(source.recent) if source else list()
+
+    """Get the line counters of every process"""
+    def get_stats(self):
+        with self._lock:
+            return {name: {'lines': source.lines, 'suppressed': source.suppressed} for name, source in self.sources.items()}
+
+    """Register the pipes queued by other threads"""
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, list()
+
+        for output in pending:
+            try:
+                self._selector.register(output.stream, selectors.EVENT_READ, output)
+            except (ValueError, OSError) as e:
+                log.warning('Unable to read {} output: {}'.format(output.source.name, e))
+
+    """Read the available data of a pipe, unregistering it once it has closed.
+    @param output: the OutputStream of the pipe
+    """
+    def _read(self, output):
+        try:
+            data = os.read(output.stream.fileno(), 65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log.warning('Failed to read {} output: {}'.format(output.source.name, e))
+            data = b''
+
+        if data:
+            with self._lock:
+                output.feed(data)
+            return
+
+        with self._lock:
+            output.flush()
+
+        self._selector.unregister(output.stream)
+        output.stream.close()
+
+    """Run the multiplexer thread"""
+    def run(self):
+        while not self._thread_event.is_set():
+            for key, events in self._selector.select(timeout=1):
+                if key.data is None:
+                    try:
+                        os.read(self._wake_read, 4096)
+                    except BlockingIOError:
+                        pass
+                    self._apply_pending()
+                else:
+                    self._read(key.data)
+
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                key.data.stream.close()
+
+        self._selector.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
@@ -4,14 +4,18 @@ import json
 import os
 import sys
 import threading
+import time
 
 from lib.config import Config, APP_ROOT
 from lib.common import get_environment
 from lib.log import log_init
 
-from core.controllers.Audio import AudioCtrl
+from core.controllers.Audio import AudioCtrl, PulseClient
 from core.controllers.Display import DisplayCtrl
+from core.PresetArchive import create_pack
+from core.PresetPlaylist import PRESET_EXTENSIONS
 from core.RenderingLoop import RenderingLoop
+from core.TexturePreprocessor import TexturePreprocessor
 
 log = logging.getLogger()
 
@@ -44,6 +48,85 @@ def get_diagnostics():
 
     display.close()
 
+"""Benchmark the PulseAudio calls made while handling a device hotplug, comparing a connection
+per call (the previous behavior) with the persistent connection
+@param iterations: the number of simulated hotplug events per mode
+"""
+def benchmark_pulse(iterations=20):
+    # The read-only calls made by pulse_event_handler/add_*_device/setup_combined_sink for a new device
+    hotplug_calls = ['card_list', 'sink_list', 'module_list', 'source_list', 'module_list', 'module_list', 'server_info']
+
+    results = dict()
+    for mode, persistent in (('per_call', False), ('persistent', True)):
+        pulse = PulseClient(f'ProjectMAR Benchmark {mode}', persistent=persistent)
+        timings = list()
+        for i in range(iterations):
+            start = time.perf_counter()
+            for func in hotplug_calls:
+                pulse.call(func)
+            timings.append((time.perf_counter() - start) * 1000)
+        pulse.close()
+
+        timings.sort()
+        results[mode] = {
+            'connects': pulse.connects,
+            'calls': pulse.calls,
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'median_ms': round(timings[len(timings) // 2], 2),
+            'max_ms': round(timings[-1], 2)
+            }
+        log.info(f'PulseAudio hotplug handling ({mode}): {results[mode]}')
+
+    speedup = results['per_call']['mean_ms'] / max(results['persistent']['mean_ms'], 0.001)
+    log.info(f'Persistent connection speedup: {speedup:.1f}x')
+    return results
+
+"""Build the downscaled texture mirror for the configured texture paths"""
+def preprocess_textures():
+    texture_paths = list()
+    texture_path_index = 0
+    while True:
+        config_key = 'projectm.texturepath'
+        if texture_path_index > 0:
+            config_key += '.{}'.format(texture_path_index)
+
+        if not config.projectm.get(config_key, None):
+            break
+
+        texture_paths.append(config.projectm.get(config_key))
+        texture_path_index += 1
+
+    TexturePreprocessor.from_config(config, texture_paths).run()
+
+"""Pack the presets from the configured preset directories into a single indexed preset pack.
+Presets are named by their path relative to their preset directory, prefixed with the directory name.
+@param pack_path: the pack file to create
+"""
+def pack_presets(pack_path):
+    presets = list()
+    preset_path_index = 0
+    while True:
+        config_key = 'projectm.presetpath'
+        if preset_path_index > 0:
+            config_key += '.{}'.format(preset_path_index)
+
+        preset_path = config.projectm.get(config_key, None)
+        if not preset_path:
+            break
+
+        if os.path.isdir(preset_path):
+            for root, dirs, files in os.walk(preset_path):
+                for name in files:
+                    if name.lower().endswith(PRESET_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        name = os.path.join(os.path.basename(os.path.normpath(preset_path)), os.path.relpath(path, preset_path))
+                        presets.append((name, path))
+
+        preset_path_index += 1
+
+    count = create_pack(presets, pack_path)
+    log.info(f'Packed {count} presets into {pack_path}')
+
 """Parse command line arguments for the projectMAR system control"""
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -55,6 +138,27 @@ def parse_args():
         help='Output diagnostics report for issue debugging'
         )
 
+    parser.add_argument(
+        '-t','--textures',
+        action='store_true',
+        dest='textures',
+        help='Preprocess the texture paths into the downscaled texture cache and exit'
+        )
+
+    parser.add_argument(
+        '-p','--pack',
+        dest='pack',
+        metavar='PACK_PATH',
+        help='Pack the preset paths into a single indexed preset pack and exit'
+        )
+
+    parser.add_argument(
+        '-b','--benchmark-pulse',
+        action='store_true',
+        dest='benchmark_pulse',
+        help='Benchmark PulseAudio hotplug handling with per-call and persistent connections and exit'
+        )
+
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -73,6 +177,15 @@ if __name__ == "__main__":
     if args.diag:
         get_diagnostics()
 
+    elif args.textures:
+        preprocess_textures()
+
+    elif args.pack:
+        pack_presets(args.pack)
+
+    elif args.benchmark_pulse:
+        benchmark_pulse()
+
     else:
         app = RenderingLoop(config, thread_event)
 
@@ -0,0 +1,69 @@
+import unittest
+
+from unittest import mock
+
+from core import TransitionPolicy
+
+class GPUFrameTimerTest(unittest.TestCase):
+    """Create a GL mock reporting the given timer query counter bits.
+    @param counter_bits: the GL_QUERY_COUNTER_BITS of GL_TIME_ELAPSED
+    """
+    def make_gl(self, counter_bits):
+        gl = mock.MagicMock()
+        gl.GLint = TransitionPolicy.GL.GLint
+        gl.GLuint64 = TransitionPolicy.GL.GLuint64
+
+        def get_query(target, pname, params):
+            params[0] = counter_bits
+
+        gl.glGetQueryiv.side_effect = get_query
+        gl.glGenQueries.return_value = [1, 2, 3, 4]
+        return gl
+
+    """Run frames until the timer takes a synchronized measurement.
+    @param timer: the GPU frame timer
+    """
+    def run_frames(self, timer):
+        for _ in range(timer.sync_interval):
+            timer.begin()
+            elapsed = timer.end()
+
+        return elapsed
+
+    def test_no_counter_bits_uses_glfinish(self):
+        gl = self.make_gl(0)
+        with mock.patch.object(TransitionPolicy, 'GL', gl):
+            timer = TransitionPolicy.GPUFrameTimer()
+            elapsed = self.run_frames(timer)
+
+        gl.glGenQueries.assert_not_called()
+        gl.glBeginQuery.assert_not_called()
+        self.assertIsNotNone(elapsed)
+        self.assertEqual(gl.glFinish.call_count, 2)
+
+    def test_failing_begin_query_falls_back(self):
+        gl = self.make_gl(64)
+        gl.glBeginQuery.side_effect = RuntimeError('GL_INVALID_ENUM')
+        with mock.patch.object(TransitionPolicy, 'GL', gl):
+            timer = TransitionPolicy.GPUFrameTimer()
+            elapsed = self.run_frames(timer)
+
+        gl.glBeginQuery.assert_called_once()
+        gl.glEndQuery.assert_not_called()
+        self.assertIsNotNone(elapsed)
+        self.assertEqual(gl.glFinish.call_count, 2)
+
+    def test_failing_end_query_falls_back(self):
+        gl = self.make_gl(64)
+        gl.glEndQuery.side_effect = RuntimeError('GL_INVALID_OPERATION')
+        with mock.patch.object(TransitionPolicy, 'GL', gl):
+            timer = TransitionPolicy.GPUFrameTimer()
+            elapsed = self.run_frames(timer)
+
+        gl.glBeginQuery.assert_called_once()
+        gl.glEndQuery.assert_called_once()
+        self.assertIsNotNone(elapsed)
+        self.assertEqual(gl.glFinish.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()